@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+批量节奏运镜
+处理目录、通配符或 JSONL 清单中的多个视频, 共享一个常驻进程池,
+跳过已是最新的输出, 并写出逐文件的结果与耗时汇总
+"""
+
+import os
+import io
+import sys
+import glob
+import json
+import time
+import inspect
+import argparse
+import traceback
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from rhythm_cam import (OutputTarget, RhythmCamPipeline, add_render_arguments,
+                        check_dependencies, default_output_path, process_video, render_kwargs)
+
+
+# 目录模式下识别为视频的扩展名
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.m4v', '.mkv', '.avi', '.webm'}
+# 汇总文件默认名
+SUMMARY_NAME = 'batch_summary.json'
+# 失败时在汇总中保留的日志行数
+LOG_TAIL_LINES = 20
+
+
+def allowed_overrides() -> set:
+    """清单中允许覆盖的参数 (process_video 的关键字参数)"""
+    params = inspect.signature(process_video).parameters
+    return set(params) - {'video_path', 'output_path', 'stats'}
+
+
+def _resolve_target(base_dir: str, target):
+    """把清单中输出目标 (字典或 "路径,键=值" 字符串) 的路径解析为相对于清单目录"""
+    if isinstance(target, dict) and target.get('path'):
+        return dict(target, path=os.path.join(base_dir, target['path']))
+    if isinstance(target, str):
+        path, sep, options = target.partition(',')
+        return os.path.join(base_dir, path) + sep + options
+    return target
+
+
+def load_manifest(manifest_path: str) -> List[dict]:
+    """
+    读取 JSONL 清单, 每行一个对象:
+    {"video": "a.mp4", "output": "a_out.mp4", "zoom_max": 1.5, ...}
+    相对路径 (包括 targets 中的输出路径) 相对于清单所在目录
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entry = json.loads(line)
+            if 'video' not in entry:
+                raise ValueError(f"清单第 {line_no} 行缺少 video 字段")
+            entry['video'] = os.path.join(base_dir, entry['video'])
+            if entry.get('output'):
+                entry['output'] = os.path.join(base_dir, entry['output'])
+            if entry.get('targets'):
+                entry['targets'] = [_resolve_target(base_dir, target) for target in entry['targets']]
+            entries.append(entry)
+    return entries
+
+
+def collect_tasks(source: str, output_dir: Optional[str], defaults: dict) -> List[dict]:
+    """
+    根据输入 (目录 / 通配符 / .jsonl 清单) 生成任务列表
+
+    Returns:
+        [{'video', 'output', 'params', 'error'}, ...]
+    """
+    if os.path.isdir(source):
+        entries = []
+        for name in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(name)
+            # 跳过本工具生成的输出文件
+            if ext.lower() in VIDEO_EXTENSIONS and not stem.endswith(('_rhythm', '_preview')):
+                entries.append({'video': os.path.join(source, name)})
+    elif source.endswith('.jsonl'):
+        entries = load_manifest(source)
+    else:
+        entries = [{'video': path} for path in sorted(glob.glob(source))]
+
+    allowed = allowed_overrides()
+    params_preview = defaults.get('preview', False)
+    tasks = []
+    for entry in entries:
+        video = os.path.abspath(entry.pop('video'))
+        output = entry.pop('output', None)
+        if not output:
+            output = default_output_path(video, params_preview)
+            if output_dir:
+                output = os.path.join(output_dir, os.path.basename(output))
+        unknown = sorted(set(entry) - allowed)
+        params = dict(defaults)
+        params.update({key: value for key, value in entry.items() if key in allowed})
+        tasks.append({
+            'video': video,
+            'output': os.path.abspath(output),
+            'params': params,
+            'error': f"未知参数: {', '.join(unknown)}" if unknown else None,
+        })
+    return tasks
+
+
+def task_outputs(task: dict) -> List[str]:
+    """
+    任务会写出的全部文件: 主输出、targets 中的各输出目标、导出的时间线和性能剖析文件
+
+    Raises:
+        ValueError: targets 格式错误
+    """
+    params = task['params']
+    outputs = [task['output']]
+    for target in params.get('targets') or ():
+        if isinstance(target, str):
+            target = OutputTarget.parse(target)
+        elif isinstance(target, dict):
+            target = OutputTarget.from_dict(target)
+        outputs.append(target.path)
+    outputs += [params[key] for key in ('export_timeline', 'profile') if params.get(key)]
+    return outputs
+
+
+def is_up_to_date(task: dict, previous: dict) -> bool:
+    """全部输出文件都存在且比输入 (视频和时间线文件) 新, 且上次成功处理时使用的参数相同"""
+    record = previous.get(task['output'])
+    if not record or record.get('status') != 'ok' or record.get('params') != task['params']:
+        return False
+    inputs = [task['video']] + ([task['params']['timeline']] if task['params'].get('timeline') else [])
+    try:
+        newest_input = max(os.path.getmtime(path) for path in inputs)
+        return all(os.path.getmtime(path) >= newest_input for path in task_outputs(task))
+    except (OSError, ValueError):
+        # 输出或时间线文件不存在、targets 格式错误: 重新处理 (由处理过程生成或报告错误)
+        return False
+
+
+def _warm_up() -> None:
+    """进程池初始化: 预先导入重量级依赖并完成 JIT 编译, 之后的任务复用已加载的模块"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            RhythmCamPipeline().warm_up()
+        except Exception:
+            # 预热失败不影响任务本身, 错误会在处理时报告
+            pass
+
+
+def _run_task(task: dict, verbose: bool, started=None) -> dict:
+    """
+    进程池任务: 处理一个视频, 捕获所有异常, 返回结果记录
+
+    started 为共享字典, 开始处理前登记 (用于在工作进程崩溃后找出当时正在运行的任务)
+    """
+    if started is not None:
+        started[task['output']] = os.getpid()
+    log = io.StringIO()
+    stats = {}
+    t_start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(task['output']) or '.', exist_ok=True)
+        if verbose:
+            success = process_video(task['video'], task['output'], stats=stats, **task['params'])
+        else:
+            with contextlib.redirect_stdout(log):
+                success = process_video(task['video'], task['output'], stats=stats, **task['params'])
+        error = None if success else '处理失败'
+    except Exception as e:
+        success = False
+        error = f"{type(e).__name__}: {e}"
+        log.write(traceback.format_exc())
+
+    record = {
+        'video': task['video'],
+        'output': task['output'],
+        'params': task['params'],
+        'status': 'ok' if success else 'failed',
+        'wall_seconds': round(time.perf_counter() - t_start, 3),
+        'frames': stats.get('frames', 0),
+        'stages': {name: round(seconds, 4) for name, seconds in stats.get('stages', {}).items()},
+    }
+    if error:
+        record['error'] = error
+        record['log_tail'] = log.getvalue().splitlines()[-LOG_TAIL_LINES:]
+    return record
+
+
+def outcome(record: dict) -> str:
+    """
+    本次运行中该文件的结果: ok / failed / skipped
+
+    跳过的文件沿用上次的成功记录 (status 仍为 ok, 下次运行时仍视为最新), 只加上 skipped 标记
+    """
+    return 'skipped' if record.get('skipped') else record['status']
+
+
+def _failed_record(task: dict, error: str) -> dict:
+    return {'video': task['video'], 'output': task['output'],
+            'params': task['params'], 'status': 'failed', 'error': error}
+
+
+def run_tasks(tasks: List[dict], jobs: int, verbose: bool) -> Iterator[Tuple[dict, dict]]:
+    """
+    在进程池中处理任务, 按完成顺序产出 (任务, 结果记录)
+
+    工作进程崩溃 (段错误、被 OOM 终止) 时 ProcessPoolExecutor 会让所有未完成的任务都失败。
+    此时重建进程池: 还没开始的任务照常重新提交; 崩溃时正在运行的任务无法区分是哪一个
+    导致的, 逐个在单进程池中重跑, 单独运行仍然崩溃的才记为失败。
+    """
+    queued = list(tasks)
+    suspects = []
+    with multiprocessing.Manager() as manager:
+        started = manager.dict()
+        while queued or suspects:
+            if suspects:
+                batch, workers = [suspects.pop(0)], 1
+            else:
+                batch, workers, queued = queued, max(jobs, 1), []
+            started.clear()
+            unfinished = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up) as pool:
+                futures = {pool.submit(_run_task, task, verbose, started): task for task in batch}
+                for future in as_completed(futures):
+                    task = futures[future]
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool:
+                        unfinished.append(task)
+                        continue
+                    except Exception as e:
+                        record = _failed_record(task, f"{type(e).__name__}: {e}")
+                    yield task, record
+
+            for task in unfinished:
+                if task['output'] not in started:
+                    queued.append(task)
+                elif workers == 1:
+                    # 单进程池中只有这一个任务在运行, 就是它导致的崩溃
+                    yield task, _failed_record(task, "工作进程异常退出 (可能是段错误或内存不足被终止)")
+                else:
+                    suspects.append(task)
+
+
+def write_summary(path: str, source: str, records: List[dict], started: str) -> None:
+    """写出汇总 (原子替换, 每完成一个文件更新一次)"""
+    totals = {'ok': 0, 'failed': 0, 'skipped': 0}
+    for record in records:
+        totals[outcome(record)] = totals.get(outcome(record), 0) + 1
+    summary = {
+        'started': started,
+        'updated': datetime.now(timezone.utc).isoformat(),
+        'source': source,
+        'totals': totals,
+        'files': records,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_previous_summary(path: str) -> dict:
+    """读取上次的汇总, 返回 {输出路径: 记录}"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {record['output']: record for record in summary.get('files', [])}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='批量为视频添加跟随音乐节奏的缩放运镜效果'
+    )
+    parser.add_argument('source', help='输入目录、通配符 (如 "videos/*.mp4") 或 JSONL 清单')
+    parser.add_argument('--output-dir', help='输出目录 (默认: 与输入文件相同的目录)')
+    parser.add_argument('-j', '--jobs', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                       help='同时处理的文件数 (进程池大小, 默认: CPU 核数的一半, '
+                            '每个文件另有 ffmpeg 解码、编码进程和缩放线程)')
+    parser.add_argument('--summary', help=f'汇总 JSON 路径 (默认: <输出目录>/{SUMMARY_NAME})')
+    parser.add_argument('--force', action='store_true',
+                       help='即使输出已是最新也重新处理')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='显示每个文件的处理日志')
+    add_render_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 检查依赖
+    if not check_dependencies():
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    defaults = render_kwargs(args)
+
+    try:
+        tasks = collect_tasks(args.source, args.output_dir, defaults)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法读取输入: {e}")
+        return 1
+    if not tasks:
+        print("❌ 没有找到要处理的视频")
+        return 1
+
+    summary_dir = args.output_dir or (args.source if os.path.isdir(args.source) else
+                                      os.path.dirname(os.path.abspath(args.source)))
+    summary_path = args.summary or os.path.join(summary_dir, SUMMARY_NAME)
+    previous = load_previous_summary(summary_path)
+    started = datetime.now(timezone.utc).isoformat()
+
+    records = []
+    pending = []
+    for task in tasks:
+        if task['error']:
+            records.append(_failed_record(task, task['error']))
+        elif not args.force and is_up_to_date(task, previous):
+            records.append(dict(previous[task['output']], skipped=True))
+        else:
+            pending.append(task)
+
+    skipped = sum(1 for record in records if outcome(record) == 'skipped')
+    print(f"🎬 共 {len(tasks)} 个视频, 待处理 {len(pending)} 个, "
+          f"跳过 {skipped} 个, 并行数 {args.jobs}")
+    for record in records:
+        if record['status'] == 'failed':
+            print(f"❌ {os.path.basename(record['video'])}: {record['error']}")
+
+    if pending:
+        for done, (task, record) in enumerate(run_tasks(pending, args.jobs, args.verbose), 1):
+            records.append(record)
+            mark = '✅' if record['status'] == 'ok' else '❌'
+            print(f"{mark} [{done}/{len(pending)}] {os.path.basename(task['video'])} "
+                  f"({record.get('wall_seconds', 0):.1f}s) {record.get('error', '')}")
+            write_summary(summary_path, args.source, records, started)
+
+    write_summary(summary_path, args.source, records, started)
+    failed = sum(1 for record in records if record['status'] == 'failed')
+    print(f"\n📋 汇总已写入: {summary_path}")
+    print(f"   成功 {sum(1 for r in records if outcome(r) == 'ok')}, "
+          f"失败 {failed}, 跳过 {skipped}")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
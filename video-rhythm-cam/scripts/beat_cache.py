@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+节拍分析结果的磁盘缓存
+以解码后的音频内容 (或整个媒体文件) 和分析参数的哈希为键, 按总大小做 LRU 淘汰
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import functools
+import numpy as np
+from typing import Optional
+
+
+# 缓存格式版本, 分析算法变化时递增以使旧缓存失效
+CACHE_VERSION = 2
+# 计算文件内容哈希时每次读取的字节数
+FILE_HASH_BLOCK = 4 * 1024 * 1024
+# 默认缓存上限 (字节)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=32)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(FILE_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """
+    文件内容的哈希; 同一进程内按 (路径, 大小, 修改时间) 记住结果,
+    同一个源文件的多种缓存 (主体跟踪、解码帧) 只读取一遍
+    """
+    stat = os.stat(path)
+    return _file_digest(os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def default_cache_dir() -> str:
+    """默认缓存目录: $XDG_CACHE_HOME/video-rhythm-cam (缺省为 ~/.cache)"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'video-rhythm-cam')
+
+
+class BeatCache:
+    """
+    节拍分析缓存
+
+    每个条目是一个 .npz 文件, 命中时刷新修改时间;
+    写入后若总大小超过上限, 按修改时间从旧到新删除条目。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: 缓存根目录 (条目存放在其下的 beats/ 子目录)
+            max_bytes: 缓存总大小上限
+        """
+        self.directory = os.path.join(cache_dir, 'beats')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key_hasher(sr: int, params: dict):
+        """
+        创建增量计算缓存键的哈希对象, 可逐块 update 音频采样 (float32)
+        后用 hexdigest() 得到与 make_key 相同规则的键
+
+        Args:
+            sr: 采样率
+            params: 影响分析结果的参数
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        header = {'version': CACHE_VERSION, 'sr': int(sr), 'params': params}
+        digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+        return digest
+
+    @classmethod
+    def make_key(cls, y: np.ndarray, sr: int, params: dict) -> str:
+        """
+        计算缓存键
+
+        Args:
+            y: 解码后的音频采样
+            sr: 采样率
+            params: 影响分析结果的参数
+        """
+        digest = cls.key_hasher(sr, params)
+        digest.update(np.ascontiguousarray(y, dtype=np.float32).data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_file_key(path: str, params: dict) -> str:
+        """
+        按媒体文件的完整内容计算缓存键 (用于需要解码视频画面的结果, 如主体跟踪、解码帧);
+        读取文件比解码快得多, 命中时省去解码
+
+        Args:
+            path: 媒体文件路径
+            params: 影响分析结果的参数
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        header = {'version': CACHE_VERSION, 'file': file_digest(path), 'params': params}
+        digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[dict]:
+        """读取缓存条目, 未命中或条目损坏时返回 None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 损坏的条目直接丢弃
+            self._remove(path)
+            return None
+
+        # 刷新修改时间, 作为 LRU 的访问记录
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """写入缓存条目 (原子替换), 然后按上限淘汰旧条目"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **entry)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """按最近使用时间淘汰条目, 直到总大小不超过上限"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
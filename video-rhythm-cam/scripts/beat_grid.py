@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+自适应速度的节拍网格
+在 onset 包络上用加窗的自相关/傅里叶速度图跟踪随时间变化的速度, 合成局部主脉冲 (PLP) 定位节拍,
+按小节相位找出每小节的第一拍 (重拍), 并用滑动窗口内的排名给出每个节拍的重音等级。
+全部为向量化的 NumPy 运算, 长达数小时、速度漂移的 DJ 混音也只需遍历一次包络。
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Optional, Tuple
+
+
+# 算法版本, 节拍网格的结果改变时递增 (写入节拍缓存的键, 使自适应模式的旧缓存失效)
+GRID_VERSION = 2
+# 速度搜索范围 (BPM)
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+# 速度先验: 以 120 BPM 为中心、标准差为一个八度的对数正态分布
+PRIOR_BPM = 120.0
+PRIOR_OCTAVES = 1.0
+# 速度图的窗长与步长(秒)
+TEMPO_WINDOW_SECONDS = 8.0
+TEMPO_STEP_SECONDS = 1.0
+# 速度路径平滑: 相邻窗口之间速度每变化一个八度的代价
+TEMPO_CHANGE_PENALTY = 20.0
+# 速度显著性中自相关所占的权重 (与傅里叶幅度几何加权)
+ACF_WEIGHT = 0.9
+# 选定速度路径后在其附近搜索傅里叶峰值的相对范围
+TEMPO_REFINE_RATIO = 0.03
+# 速度图的 FFT 点数 (频率分辨率约 0.6 BPM @ 43 帧/秒)
+TEMPO_FFT_SIZE = 4096
+# 每次处理的窗口数 (限制峰值内存)
+TEMPO_BLOCK_WINDOWS = 256
+# 低于该值 (相对最大值) 的脉冲峰不算节拍
+PULSE_PEAK_THRESHOLD = 0.2
+# 节拍对齐到 onset 峰值时的搜索半径 (帧)
+ONSET_SNAP_FRAMES = 2
+# 每小节拍数
+BEATS_PER_BAR = 4
+# 判断重拍时累加低频 onset 的范围 (节拍前后各多少帧)
+DOWNBEAT_RISE_FRAMES = 2
+# 小节相位跳变的代价 (约相当于 8 个小节第一拍的重音证据)
+DOWNBEAT_SWITCH_PENALTY = 4.0
+# 重音等级的归一化窗口 (节拍数)
+ACCENT_WINDOW_BEATS = 32
+
+
+@dataclass
+class BeatGrid:
+    """
+    自适应节拍网格
+
+    Attributes:
+        beat_frames: 节拍所在的包络帧号
+        beat_strengths: 节拍处的 onset 强度原始值
+        downbeats: 每个节拍是否为小节第一拍
+        tempo_frames: 速度曲线采样点的帧号
+        tempo_bpm: 各采样点的局部速度 (BPM)
+    """
+    beat_frames: np.ndarray
+    beat_strengths: np.ndarray
+    downbeats: np.ndarray
+    tempo_frames: np.ndarray
+    tempo_bpm: np.ndarray
+
+
+def _tempo_bins(frame_rate: float) -> Tuple[np.ndarray, np.ndarray]:
+    """速度图中落在搜索范围内的 FFT 频点及对应的 BPM"""
+    bpm = np.fft.rfftfreq(TEMPO_FFT_SIZE) * frame_rate * 60.0
+    bins = np.flatnonzero((bpm >= MIN_BPM) & (bpm <= MAX_BPM))
+    return bins, bpm[bins]
+
+
+def _window_geometry(frame_rate: float) -> Tuple[int, int]:
+    """速度图的窗长与步长 (帧)"""
+    win = max(int(round(TEMPO_WINDOW_SECONDS * frame_rate)), 4)
+    step = max(int(round(TEMPO_STEP_SECONDS * frame_rate)), 1)
+    return win, step
+
+
+def _windowed_frames(env: np.ndarray, win: int, step: int) -> Tuple[np.ndarray, np.ndarray]:
+    """以每个采样点为中心切出加窗前的包络片段, 返回 (片段, 片段起始帧号)"""
+    padded = np.pad(env, (win // 2, win - win // 2))
+    frames = sliding_window_view(padded, win)[::step][:(len(env) + step - 1) // step]
+    starts = np.arange(len(frames)) * step - win // 2
+    return frames, starts
+
+
+def track_tempo(onset_env: np.ndarray, frame_rate: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    跟踪局部速度
+
+    每个窗口的速度显著性为自相关与傅里叶幅度的几何加权: 傅里叶速度图偏向倍速
+    (反拍会在 2 倍频处产生强峰), 自相关偏向半速, 两者结合后乘以速度先验,
+    用 Viterbi 找出一条平滑的速度路径 (抑制倍频/半频跳变);
+    最后在路径附近取傅里叶幅度的峰值并用抛物线插值细化频率。
+
+    Returns:
+        (采样点帧号, 局部速度 BPM, 局部脉冲频率 周期/帧)
+    """
+    win, step = _window_geometry(frame_rate)
+    frames, starts = _windowed_frames(onset_env.astype(np.float64), win, step)
+    window = np.hanning(win)
+    bins, bpm = _tempo_bins(frame_rate)
+    # 各候选速度对应的自相关延迟 (帧, 非整数时线性插值)
+    lags = 60.0 * frame_rate / bpm
+    lag_floor = np.floor(lags).astype(np.int64)
+    lag_frac = lags - lag_floor
+
+    # 分块计算速度图 (n_windows, n_bins): 自相关由功率谱逆变换得到, 与傅里叶幅度共用一次 FFT
+    magnitude = np.empty((len(frames), len(bins)))
+    salience = np.empty((len(frames), len(bins)))
+    for block in range(0, len(frames), TEMPO_BLOCK_WINDOWS):
+        chunk = frames[block:block + TEMPO_BLOCK_WINDOWS]
+        chunk = (chunk - chunk.mean(axis=1, keepdims=True)) * window
+        spectrum = np.abs(np.fft.rfft(chunk, n=TEMPO_FFT_SIZE, axis=1))
+        acf = np.fft.irfft(spectrum ** 2, n=TEMPO_FFT_SIZE, axis=1)[:, :lag_floor.max() + 2]
+        acf = np.maximum(acf / (acf[:, :1] + 1e-12), 0.0)
+        acf = acf[:, lag_floor] * (1 - lag_frac) + acf[:, lag_floor + 1] * lag_frac
+        fourier = spectrum[:, bins]
+        magnitude[block:block + TEMPO_BLOCK_WINDOWS] = fourier
+        fourier = fourier / (fourier.max(axis=1, keepdims=True) + 1e-12)
+        salience[block:block + TEMPO_BLOCK_WINDOWS] = acf ** ACF_WEIGHT * fourier ** (1 - ACF_WEIGHT)
+
+    # 观测得分: 每个窗口内归一化的对数显著性 + 对数先验
+    log_prior = -0.5 * (np.log2(bpm / PRIOR_BPM) / PRIOR_OCTAVES) ** 2
+    observation = np.log(salience / (salience.max(axis=1, keepdims=True) + 1e-12) + 1e-6)
+    observation += log_prior
+    octaves = np.log2(bpm)
+    transition = TEMPO_CHANGE_PENALTY * np.abs(octaves[:, None] - octaves[None, :])
+
+    # Viterbi: 每一步在所有频点上向量化求最大值
+    score = observation[0].copy()
+    backpointer = np.empty((len(frames), len(bins)), dtype=np.int32)
+    for k in range(1, len(frames)):
+        candidates = score[:, None] - transition
+        backpointer[k] = candidates.argmax(axis=0)
+        score = candidates[backpointer[k], np.arange(len(bins))] + observation[k]
+    path = np.empty(len(frames), dtype=np.int64)
+    path[-1] = score.argmax()
+    for k in range(len(frames) - 1, 0, -1):
+        path[k - 1] = backpointer[k, path[k]]
+
+    # 自相关峰较宽, 在路径附近 (±TEMPO_REFINE_RATIO) 取傅里叶幅度的峰值
+    rows = np.arange(len(frames))
+    bin_bpm = bpm[1] - bpm[0] if len(bpm) > 1 else 1.0
+    reach = np.ceil(TEMPO_REFINE_RATIO * bpm[path] / bin_bpm).astype(np.int64)
+    offsets = np.arange(-reach.max(), reach.max() + 1)
+    neighbours = np.clip(path[:, None] + offsets, 0, len(bins) - 1)
+    local = np.where(np.abs(offsets) <= reach[:, None], magnitude[rows[:, None], neighbours], -np.inf)
+    path = neighbours[rows, local.argmax(axis=1)]
+
+    # 抛物线插值细化峰值位置
+    left = magnitude[rows, np.maximum(path - 1, 0)]
+    center = magnitude[rows, path]
+    right = magnitude[rows, np.minimum(path + 1, len(bins) - 1)]
+    denominator = left - 2 * center + right
+    offset = np.where(np.abs(denominator) > 1e-12, 0.5 * (left - right) / denominator, 0.0)
+    offset = np.clip(offset, -0.5, 0.5)
+    frequency = (bins[path] + offset) / TEMPO_FFT_SIZE
+    return starts + win // 2, frequency * frame_rate * 60.0, frequency
+
+
+def predominant_pulse(onset_env: np.ndarray, frame_rate: float,
+                      frequency: np.ndarray) -> np.ndarray:
+    """
+    合成局部主脉冲曲线 (PLP)
+
+    每个窗口按其局部频率求出包络的相位, 合成加窗余弦后重叠相加并按窗口权重归一化;
+    峰值即为与 onset 能量同相的节拍位置。
+    """
+    n = len(onset_env)
+    win, step = _window_geometry(frame_rate)
+    frames, starts = _windowed_frames(onset_env.astype(np.float64), win, step)
+    window = np.hanning(win)
+
+    pulse = np.zeros(n)
+    weight = np.zeros(n)
+    offsets = np.arange(win)
+    for block in range(0, len(frames), TEMPO_BLOCK_WINDOWS):
+        chunk = frames[block:block + TEMPO_BLOCK_WINDOWS]
+        chunk = (chunk - chunk.mean(axis=1, keepdims=True)) * window
+        index = starts[block:block + TEMPO_BLOCK_WINDOWS, None] + offsets
+        phase = 2 * np.pi * frequency[block:block + TEMPO_BLOCK_WINDOWS, None] * index
+        # 以绝对帧号为相位参考, 相邻窗口的合成信号可以直接相加
+        coefficient = (chunk * np.exp(-1j * phase)).sum(axis=1)
+        synthesis = window * np.cos(phase + np.angle(coefficient)[:, None])
+        valid = (index >= 0) & (index < n)
+        np.add.at(pulse, index[valid], synthesis[valid])
+        np.add.at(weight, index[valid], np.broadcast_to(window, index.shape)[valid])
+    return np.maximum(pulse / np.maximum(weight, 1e-6), 0.0)
+
+
+def pick_pulse_peaks(pulse: np.ndarray, onset_env: np.ndarray) -> np.ndarray:
+    """脉冲曲线的局部最大值作为节拍, 并在小范围内对齐到 onset 包络的峰值"""
+    if len(pulse) < 3 or pulse.max() <= 0:
+        return np.zeros(0, dtype=np.int64)
+    peaks = np.flatnonzero((pulse[1:-1] > pulse[:-2]) & (pulse[1:-1] >= pulse[2:])) + 1
+    peaks = peaks[pulse[peaks] >= PULSE_PEAK_THRESHOLD * pulse.max()]
+    if len(peaks) == 0:
+        return peaks.astype(np.int64)
+    radius = ONSET_SNAP_FRAMES
+    padded = np.pad(onset_env, radius, constant_values=-np.inf)
+    neighbourhood = sliding_window_view(padded, 2 * radius + 1)[peaks]
+    return np.unique(peaks + neighbourhood.argmax(axis=1) - radius).astype(np.int64)
+
+
+def accent_levels(strengths: np.ndarray, window: int = ACCENT_WINDOW_BEATS) -> np.ndarray:
+    """
+    稳健的重音等级 (0-1): 每个节拍强度在前后 window 个节拍中的排名
+
+    只取决于局部的相对大小, 单个极响的节拍不会把其他节拍都压到接近 0,
+    整体音量随时间变化 (如混音中的曲目切换) 也不影响等级。
+    """
+    strengths = np.asarray(strengths, dtype=np.float64)
+    n = len(strengths)
+    if n < 2:
+        return np.ones(n)
+    half = max(min(window, n - 1) // 2, 1)
+    neighbours = sliding_window_view(np.pad(strengths, half, mode='symmetric'), 2 * half + 1)
+    below = (neighbours < strengths[:, None]).sum(axis=1)
+    equal = (neighbours == strengths[:, None]).sum(axis=1) - 1
+    return np.clip((below + 0.5 * equal) / (2 * half), 0.0, 1.0)
+
+
+def find_downbeats(strengths: np.ndarray, beats_per_bar: int = BEATS_PER_BAR,
+                   switch_penalty: float = DOWNBEAT_SWITCH_PENALTY) -> np.ndarray:
+    """
+    找出每小节的第一拍
+
+    状态为每个节拍在小节中的位置, 正常情况下逐拍加一; 重音等级高的节拍倾向于位置 0。
+    用 Viterbi 求最优位置序列, 位置跳变 (如曲目切换后小节错位) 需要付出
+    switch_penalty 的代价, 因此重拍间隔总是整小节, 只在证据充分时才改变相位。
+    """
+    n = len(strengths)
+    if n < beats_per_bar:
+        return np.zeros(n, dtype=bool)
+    accents = accent_levels(strengths)
+    # 位置 0 的得分为重音等级减去平均值, 其余位置为 0
+    observation = np.zeros((n, beats_per_bar))
+    observation[:, 0] = accents - 0.5
+    positions = np.arange(beats_per_bar)
+    transition = np.where(positions[None, :] == (positions[:, None] + 1) % beats_per_bar,
+                          0.0, -switch_penalty)
+
+    score = observation[0].copy()
+    backpointer = np.empty((n, beats_per_bar), dtype=np.int8)
+    for k in range(1, n):
+        candidates = score[:, None] + transition
+        backpointer[k] = candidates.argmax(axis=0)
+        score = candidates[backpointer[k], positions] + observation[k]
+    state = np.empty(n, dtype=np.int64)
+    state[-1] = score.argmax()
+    for k in range(n - 1, 0, -1):
+        state[k - 1] = backpointer[k, state[k]]
+    return state == 0
+
+
+def analyze_beat_grid(onset_env: np.ndarray, frame_rate: float,
+                      bass_env: Optional[np.ndarray] = None) -> BeatGrid:
+    """
+    在 onset 包络上一次性计算自适应节拍网格
+
+    Args:
+        onset_env: onset 强度包络
+        frame_rate: 包络帧率 (帧/秒)
+        bass_env: 低频段的 onset 包络, 用于判断重拍 (底鼓通常落在小节第一拍),
+            None 表示使用 onset_env
+
+    Returns:
+        BeatGrid
+    """
+    onset_env = np.asarray(onset_env, dtype=np.float64)
+    if len(onset_env) < 4 or onset_env.max() <= 0:
+        empty = np.zeros(0)
+        return BeatGrid(empty.astype(np.int64), empty, empty.astype(bool),
+                        empty.astype(np.int64), empty)
+
+    tempo_frames, tempo_bpm, frequency = track_tempo(onset_env, frame_rate)
+    pulse = predominant_pulse(onset_env, frame_rate, frequency)
+    beat_frames = pick_pulse_peaks(pulse, onset_env)
+    strengths = onset_env[beat_frames]
+    # 重拍证据取节拍附近低频 onset 之和 (即整个起音的能量上升): 起音跨越多个分析帧,
+    # 单帧的值取决于起音落在帧内的位置, 会掩盖第一拍与第三拍之间的音量差别
+    salience_env = onset_env if bass_env is None else np.asarray(bass_env, dtype=np.float64)
+    radius = DOWNBEAT_RISE_FRAMES
+    padded = np.pad(salience_env, radius)
+    salience = sliding_window_view(padded, 2 * radius + 1)[beat_frames].sum(axis=1)
+    return BeatGrid(
+        beat_frames=beat_frames,
+        beat_strengths=strengths,
+        downbeats=find_downbeats(salience),
+        tempo_frames=tempo_frames,
+        tempo_bpm=tempo_bpm,
+    )
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+渲染性能基准测试
+用 generate_test_video.py 的快速模式生成确定性的测试素材, 分阶段计时 process_video,
+以 JSON 输出帧率、峰值内存和各阶段耗时, 便于跨版本对比、发现性能退化
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from profiler import peak_rss_mb, run_isolated
+
+
+# 分辨率预设
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+# 测试素材帧率
+BENCH_FPS = 30
+# process_video 统计的处理阶段
+STAGES = ['audio_extract', 'beat_detection', 'decode', 'frame_transform', 'encode', 'mux']
+# 对比时忽略小于该值(秒)的阶段耗时波动
+MIN_STAGE_SECONDS = 0.05
+
+
+def prepare_input(workdir: str, resolution: str, duration: float, bpm: int) -> str:
+    """
+    生成测试视频 (已存在时直接复用), 节拍真值写在同名的 .beats.json 中
+
+    Returns:
+        测试视频路径
+    """
+    from generate_test_video import create_fast_test_media
+
+    width, height = RESOLUTIONS[resolution]
+    path = os.path.join(workdir, f'bench_{resolution}_{duration:g}s_{bpm}bpm.mp4')
+    if os.path.exists(path):
+        return path
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        partial_path = os.path.join(tmpdir, 'bench.mp4')
+        create_fast_test_media(partial_path, duration, bpm, fps=BENCH_FPS,
+                               width=width, height=height, workers=os.cpu_count() or 1,
+                               beats_path=f"{os.path.splitext(path)[0]}.beats.json")
+        os.replace(partial_path, path)
+    return path
+
+
+def run_case_in_process(case: dict) -> dict:
+    """在当前进程中运行一个测试用例 (由 run_case 在独立子进程中调用)"""
+    from rhythm_cam import process_video
+
+    stats = {}
+    t_start = time.perf_counter()
+    success = process_video(
+        case['input'], case['output'],
+        workers=case['workers'],
+        quality=case['quality'],
+        cache_dir=None,
+        stats=stats,
+    )
+    wall = time.perf_counter() - t_start
+
+    frames = stats.get('frames', 0)
+    stages = stats.get('stages', {})
+    return {
+        'success': bool(success),
+        'frames': frames,
+        'wall_seconds': round(wall, 4),
+        'frames_per_second': round(frames / wall, 3) if wall > 0 else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_child_rss_mb': round(peak_rss_mb(children=True), 1),
+        'stages': {name: round(stages.get(name, 0.0), 4) for name in STAGES},
+    }
+
+
+def run_case(case: dict) -> dict:
+    """在独立的 Python 子进程中运行一个测试用例, 保证峰值内存互不影响"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        result = run_isolated(run_case_in_process,
+                              dict(case, output=os.path.join(tmpdir, 'output.mp4')),
+                              quiet=not case.get('verbose'))
+    if 'error' in result:
+        return {'success': False, 'error': result['error']}
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """
+    与基线结果对比, 找出帧率下降或阶段耗时上升超过容差的用例
+
+    Returns:
+        退化列表 [{'case', 'metric', 'baseline', 'current', 'change'}, ...]
+    """
+    baseline_cases = {case['id']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in current.get('cases', []):
+        base = baseline_cases.get(case['id'])
+        if base is None or not case.get('success') or not base.get('success'):
+            continue
+
+        base_fps = base.get('frames_per_second', 0.0)
+        fps = case.get('frames_per_second', 0.0)
+        if base_fps > 0 and fps < base_fps * (1 - tolerance):
+            regressions.append({'case': case['id'], 'metric': 'frames_per_second',
+                                'baseline': base_fps, 'current': fps,
+                                'change': round(fps / base_fps - 1, 4)})
+
+        for name in STAGES:
+            base_t = base.get('stages', {}).get(name, 0.0)
+            cur_t = case.get('stages', {}).get(name, 0.0)
+            if cur_t - base_t > MIN_STAGE_SECONDS and cur_t > base_t * (1 + tolerance):
+                regressions.append({'case': case['id'], 'metric': f'stages.{name}',
+                                    'baseline': base_t, 'current': cur_t,
+                                    'change': round(cur_t / base_t - 1, 4) if base_t > 0 else None})
+    return regressions
+
+
+def parse_list(value: str, cast=str) -> list:
+    """解析逗号分隔的命令行列表, 每项用 cast 转换 (格式错误时抛出 ValueError)"""
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='节奏运镜渲染性能基准测试')
+    parser.add_argument('--resolutions', default='720p,1080p',
+                       help=f'分辨率列表, 可选 {",".join(RESOLUTIONS)} (默认: 720p,1080p)')
+    parser.add_argument('--durations', default='10',
+                       help='测试素材时长列表(秒) (默认: 10)')
+    parser.add_argument('--bpms', default='120',
+                       help='测试素材节奏列表 (默认: 120)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='渲染进程数 (默认: 1)')
+    parser.add_argument('--quality', default='best',
+                       help='缩放插值质量 (默认: best)')
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='每个用例重复次数, 取耗时中位的一次 (默认: 1)')
+    parser.add_argument('--workdir', default='bench_inputs',
+                       help='测试素材目录, 已生成的素材会被复用 (默认: bench_inputs)')
+    parser.add_argument('-o', '--output', help='结果 JSON 路径 (默认: 输出到标准输出)')
+    parser.add_argument('--compare', help='基线结果 JSON, 对比并报告性能退化')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                       help='判定退化的相对容差 (默认: 0.10)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='显示 process_video 的输出')
+
+    args = parser.parse_args()
+
+    resolutions = parse_list(args.resolutions)
+    for resolution in resolutions:
+        if resolution not in RESOLUTIONS:
+            print(f"❌ 未知分辨率: {resolution}", file=sys.stderr)
+            return 1
+    durations = parse_list(args.durations, float)
+    bpms = parse_list(args.bpms, int)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {
+        'schema': 1,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': [],
+    }
+
+    for resolution in resolutions:
+        for duration in durations:
+            for bpm in bpms:
+                case_id = f'{resolution}-{duration:g}s-{bpm}bpm-w{args.workers}-{args.quality}'
+                print(f"⏱️  {case_id}", file=sys.stderr)
+                input_path = prepare_input(args.workdir, resolution, duration, bpm)
+                case = {
+                    'input': os.path.abspath(input_path),
+                    'workers': args.workers,
+                    'quality': args.quality,
+                    'verbose': args.verbose,
+                }
+
+                runs = [run_case(case) for _ in range(max(args.repeat, 1))]
+                ok_runs = sorted((r for r in runs if r.get('success')),
+                                 key=lambda r: r['wall_seconds'])
+                result = ok_runs[len(ok_runs) // 2] if ok_runs else runs[0]
+
+                width, height = RESOLUTIONS[resolution]
+                report['cases'].append(dict({
+                    'id': case_id,
+                    'resolution': resolution,
+                    'width': width,
+                    'height': height,
+                    'duration': duration,
+                    'bpm': bpm,
+                    'fps': BENCH_FPS,
+                    'workers': args.workers,
+                    'quality': args.quality,
+                    'runs': len(runs),
+                }, **result))
+                if result.get('success'):
+                    print(f"   {result['frames_per_second']:.1f} 帧/秒, "
+                          f"峰值内存 {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+                else:
+                    print(f"   ❌ 失败: {result.get('error', '')}", file=sys.stderr)
+
+    exit_code = 0 if all(case.get('success') for case in report['cases']) else 1
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline_commit'] = baseline.get('git_commit')
+        report['regressions'] = compare_results(report, baseline, args.tolerance)
+        for item in report['regressions']:
+            print(f"⚠️  性能退化 {item['case']} {item['metric']}: "
+                  f"{item['baseline']} → {item['current']}", file=sys.stderr)
+        if report['regressions']:
+            exit_code = 1
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✅ 结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
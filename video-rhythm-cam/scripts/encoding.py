@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+输出编码配置
+把命名的编码档案 (archive / social / fast / draft) 映射为
+libx264 / libx265 / libvpx-vp9 的一致参数 (速度预设、质量、码率上限、线程)
+"""
+
+import math
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+# 编码格式 → ffmpeg 软件编码器
+CODEC_ENCODERS = {
+    'h264': 'libx264',
+    'h265': 'libx265',
+    'vp9': 'libvpx-vp9',
+}
+
+# 各编码格式的速度档位, 从最慢 (压缩率最高) 到最快;
+# VP9 的档位为 "deadline:cpu-used"
+_X26X_PRESETS = ['veryslow', 'slower', 'slow', 'medium', 'fast',
+                 'faster', 'veryfast', 'superfast', 'ultrafast']
+SPEED_PRESETS = {
+    'h264': _X26X_PRESETS,
+    'h265': _X26X_PRESETS,
+    'vp9': [f'good:{n}' for n in range(6)] + [f'realtime:{n}' for n in range(6, 9)],
+}
+
+# 容器可直接复制(不重新编码)的音频编码
+MP4_COPY_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3'}
+WEBM_COPY_AUDIO_CODECS = {'opus', 'vorbis'}
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    命名编码档案: 每种编码格式的默认速度预设和恒定质量值 (CRF),
+    以及可选的码率上限与最大关键帧间隔
+    """
+    name: str
+    description: str
+    presets: Dict[str, str]
+    crf: Dict[str, int]
+    # 码率上限 (kbit/s, VBV), 用于有上传码率限制的平台
+    maxrate_kbps: Optional[int] = None
+    # 最大关键帧间隔(秒), 便于平台转码和拖动进度
+    keyint_seconds: Optional[float] = None
+
+
+ENCODING_PROFILES = {
+    'archive': EncodingProfile(
+        'archive', '高质量存档',
+        presets={'h264': 'slow', 'h265': 'slow', 'vp9': 'good:1'},
+        crf={'h264': 18, 'h265': 20, 'vp9': 24},
+    ),
+    'social': EncodingProfile(
+        'social', '社交平台上传: 限制码率, 2 秒关键帧间隔',
+        presets={'h264': 'medium', 'h265': 'medium', 'vp9': 'good:2'},
+        crf={'h264': 20, 'h265': 23, 'vp9': 31},
+        maxrate_kbps=8000,
+        keyint_seconds=2.0,
+    ),
+    'fast': EncodingProfile(
+        'fast', '快速出片, 画质略低于存档',
+        presets={'h264': 'veryfast', 'h265': 'veryfast', 'vp9': 'realtime:6'},
+        crf={'h264': 21, 'h265': 24, 'vp9': 33},
+    ),
+    'draft': EncodingProfile(
+        'draft', '草稿/预览: 最快速度, 画质够用即可',
+        presets={'h264': 'ultrafast', 'h265': 'ultrafast', 'vp9': 'realtime:8'},
+        crf={'h264': 28, 'h265': 30, 'vp9': 40},
+    ),
+}
+DEFAULT_ENCODING = 'archive'
+DEFAULT_CODEC = 'h264'
+
+
+def container_for(output_path: str) -> str:
+    """根据输出文件扩展名判断容器: webm / matroska / mp4"""
+    path = output_path.lower()
+    if path.endswith('.webm'):
+        return 'webm'
+    if path.endswith('.mkv'):
+        return 'matroska'
+    return 'mp4'
+
+
+def audio_codec_params(audio_codec: Optional[str], container: str = 'mp4') -> List[str]:
+    """混入原音轨时的音频编码参数: 容器兼容时直接复制, 否则转码 (MP4 为 AAC, WebM 为 Opus)"""
+    if container == 'webm':
+        return ['-c:a', 'copy'] if audio_codec in WEBM_COPY_AUDIO_CODECS else ['-c:a', 'libopus']
+    if container == 'matroska' or audio_codec in MP4_COPY_AUDIO_CODECS:
+        return ['-c:a', 'copy']
+    return ['-c:a', 'aac']
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """
+    一次输出使用的编码设置: 档案 + 编码格式 (+ 覆盖档案默认值的速度预设)
+
+    Raises:
+        ValueError: 档案、编码格式或速度预设未知
+    """
+    profile: str = DEFAULT_ENCODING
+    codec: str = DEFAULT_CODEC
+    preset: Optional[str] = None
+
+    def __post_init__(self):
+        if self.profile not in ENCODING_PROFILES:
+            raise ValueError(f"未知的编码档案: {self.profile} "
+                             f"(可选: {', '.join(ENCODING_PROFILES)})")
+        if self.codec not in CODEC_ENCODERS:
+            raise ValueError(f"未知的编码格式: {self.codec} (可选: {', '.join(CODEC_ENCODERS)})")
+        if self.preset is not None and self.preset not in SPEED_PRESETS[self.codec]:
+            raise ValueError(f"{self.codec} 不支持速度预设: {self.preset}")
+
+    @property
+    def encoder(self) -> str:
+        return CODEC_ENCODERS[self.codec]
+
+    @property
+    def speed_presets(self) -> List[str]:
+        """该编码格式的速度档位 (从慢到快)"""
+        return SPEED_PRESETS[self.codec]
+
+    @property
+    def effective_preset(self) -> str:
+        return self.preset or ENCODING_PROFILES[self.profile].presets[self.codec]
+
+    def with_preset(self, preset: str) -> 'EncoderSettings':
+        return dataclasses.replace(self, preset=preset)
+
+    def check_container(self, container: str) -> None:
+        """WebM 只能封装 VP9"""
+        if container == 'webm' and self.codec != 'vp9':
+            raise ValueError(f"WebM 容器只支持 vp9 编码, 当前为 {self.codec}")
+
+    def container_params(self, container: str = 'mp4') -> List[str]:
+        """与编码器无关的封装参数 (编码和无损拼接时都需要)"""
+        params = []
+        if self.codec == 'h265' and container == 'mp4':
+            # Apple 设备只识别 hvc1 标签
+            params += ['-tag:v', 'hvc1']
+        if container == 'mp4':
+            params += ['-movflags', '+faststart']  # 优化网络播放
+        return params
+
+    def video_params(self, size: Optional[Tuple[int, int]] = None,
+                     fps: Optional[float] = None,
+                     threads: Optional[int] = None,
+                     container: Optional[str] = 'mp4') -> List[str]:
+        """
+        生成 ffmpeg 输出端的视频编码参数
+
+        Args:
+            size: 画面尺寸 (w, h), VP9 据此设置并行的 tile 列数
+            fps: 帧率, 档案限制关键帧间隔时需要
+            threads: 编码线程数, None 表示由编码器自动决定
+            container: 输出容器, None 表示不添加封装参数 (如输出到空设备)
+        """
+        profile = ENCODING_PROFILES[self.profile]
+        preset = self.effective_preset
+        crf = str(profile.crf[self.codec])
+        params = ['-c:v', self.encoder]
+
+        if self.codec == 'vp9':
+            deadline, cpu_used = preset.split(':')
+            params += ['-deadline', deadline, '-cpu-used', cpu_used, '-crf', crf]
+            # 受限质量模式: -b:v 为码率上限, 0 表示纯恒定质量
+            params += ['-b:v', f'{profile.maxrate_kbps}k' if profile.maxrate_kbps else '0']
+            params += ['-row-mt', '1']
+            if size is not None:
+                # 每个 tile 列至少 256 像素宽
+                params += ['-tile-columns', str(min(int(math.log2(max(size[0] // 256, 1))), 6))]
+            if threads is not None:
+                params += ['-threads', str(threads)]
+        else:
+            params += ['-preset', preset, '-crf', crf]
+            if profile.maxrate_kbps:
+                params += ['-maxrate', f'{profile.maxrate_kbps}k',
+                           '-bufsize', f'{profile.maxrate_kbps * 2}k']
+            if self.codec == 'h265':
+                # libx265 不读取 -threads, 用线程池参数控制
+                x265_params = 'log-level=error'
+                if threads is not None:
+                    x265_params += f':pools={threads}:frame-threads={min(threads, 4)}'
+                params += ['-x265-params', x265_params]
+            elif threads is not None:
+                params += ['-threads', str(threads)]
+
+        if profile.keyint_seconds and fps:
+            params += ['-g', str(max(int(round(profile.keyint_seconds * fps)), 1))]
+        params += ['-pix_fmt', 'yuv420p', '-colorspace', 'bt709']
+        if container is not None:
+            params += self.container_params(container)
+        return params
+
+    def describe(self) -> str:
+        return f"{self.profile} / {self.encoder} {self.effective_preset}"
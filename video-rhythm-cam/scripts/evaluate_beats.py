@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+节拍检测准确率与速度评测
+在已知节拍真值的语料 (generate_test_video.py 生成的多种 BPM 音轨, 或自带 .beats.json 的素材) 上
+运行不同分析参数组合, 报告 F 值、速度误差、重拍/弱拍分类准确率以及分析耗时和峰值内存,
+并找出满足准确率预算的最快参数
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+
+from benchmark import parse_list
+from profiler import peak_rss_mb, run_isolated
+
+
+# 节拍命中容差(秒), 与 MIREX 节拍跟踪评测一致
+MATCH_TOLERANCE = 0.07
+# 自动生成语料时使用的媒体扩展名
+TRACK_EXTENSION = '.wav'
+# --corpus 目录中识别为媒体的扩展名
+MEDIA_EXTENSIONS = {'.wav', '.flac', '.mp3', '.m4a', '.mp4', '.mov', '.mkv', '.webm'}
+# 真值文件后缀
+GROUND_TRUTH_SUFFIX = '.beats.json'
+
+
+def beat_f_measure(detected: np.ndarray, reference: np.ndarray,
+                   tolerance: float = MATCH_TOLERANCE) -> dict:
+    """
+    节拍 F 值: 每个真值节拍最多匹配一个检测到的节拍 (取容差内最近者)
+
+    Returns:
+        {'f_measure', 'precision', 'recall', 'matches': (检测序号, 真值序号) 数组}
+    """
+    detected = np.asarray(detected, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    if len(detected) == 0 or len(reference) == 0:
+        return {'f_measure': 0.0, 'precision': 0.0, 'recall': 0.0,
+                'matches': np.zeros((0, 2), dtype=np.int64)}
+
+    right = np.minimum(np.searchsorted(reference, detected), len(reference) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(detected - reference[left]) <= np.abs(detected - reference[right]),
+                       left, right)
+    error = np.abs(detected - reference[nearest])
+    hit = np.flatnonzero(error <= tolerance)
+    # 多个检测节拍落到同一个真值节拍时只保留误差最小的
+    order = hit[np.lexsort((error[hit], nearest[hit]))]
+    _, first = np.unique(nearest[order], return_index=True)
+    matched = order[first]
+    matches = np.stack([matched, nearest[matched]], axis=1)
+
+    precision = len(matched) / len(detected)
+    recall = len(matched) / len(reference)
+    f_measure = 2 * precision * recall / (precision + recall) if len(matched) else 0.0
+    return {'f_measure': f_measure, 'precision': precision, 'recall': recall, 'matches': matches}
+
+
+def build_corpus(workdir: str, bpms: List[float], duration: float,
+                 ramp: float, swing: float) -> List[dict]:
+    """
+    生成评测语料 (已存在时直接复用): 每个 BPM 一条音轨及其真值
+
+    Args:
+        ramp: 速度在整段内的相对变化量, 如 0.1 表示从 bpm 线性变化到 1.1 * bpm
+    """
+    from generate_test_video import create_test_track
+
+    os.makedirs(workdir, exist_ok=True)
+    tracks = []
+    for bpm in bpms:
+        stem = f'track_{bpm:g}bpm_{duration:g}s_ramp{ramp:g}_swing{swing:g}'
+        audio_path = os.path.join(workdir, stem + TRACK_EXTENSION)
+        beats_path = os.path.join(workdir, stem + GROUND_TRUTH_SUFFIX)
+        if not (os.path.exists(audio_path) and os.path.exists(beats_path)):
+            create_test_track(audio_path, duration, bpm, bpm * (1 + ramp), swing,
+                              beats_path=beats_path)
+        tracks.append({'id': stem, 'media': os.path.abspath(audio_path),
+                       'ground_truth': os.path.abspath(beats_path)})
+    return tracks
+
+
+def find_corpus(corpus_dir: str) -> List[dict]:
+    """收集目录中带有同名 .beats.json 真值文件的媒体"""
+    tracks = []
+    for name in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(name)
+        beats_path = os.path.join(corpus_dir, stem + GROUND_TRUTH_SUFFIX)
+        if ext.lower() in MEDIA_EXTENSIONS and os.path.exists(beats_path):
+            tracks.append({'id': stem, 'media': os.path.abspath(os.path.join(corpus_dir, name)),
+                           'ground_truth': os.path.abspath(beats_path)})
+    return tracks
+
+
+def run_config_in_process(job: dict) -> dict:
+    """在当前进程中用一组分析参数分析全部音轨 (由 run_config 在独立子进程中调用)"""
+    from rhythm_cam import RhythmCamPipeline
+
+    config = job['config']
+    # 灵敏度为 1 时保留全部节拍, 重拍即峰值缩放为 zoom_max 的节拍
+    pipeline = RhythmCamPipeline(sensitivity=1.0, cache_dir=None,
+                                 analysis_sr=config['sr'], hop_length=config['hop_length'],
+                                 chunked=config['chunked'], tempo=config['tempo'])
+    pipeline.warm_up()
+
+    tracks = []
+    for track in job['tracks']:
+        t_start = time.perf_counter()
+        try:
+            analysis = pipeline.detect_beats(track['media'])
+            wall = time.perf_counter() - t_start
+            timeline = pipeline.build_timeline(analysis)
+        except Exception as e:
+            tracks.append({'id': track['id'], 'error': f"{type(e).__name__}: {e}"})
+            continue
+        tracks.append({
+            'id': track['id'],
+            'wall_seconds': wall,
+            'duration': analysis.duration,
+            'tempo': analysis.tempo,
+            'beat_times': timeline.beat_times.tolist(),
+            'strong': (timeline.beat_peaks >= pipeline.zoom_max).tolist(),
+        })
+    return {
+        'tracks': tracks,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_config(config: dict, tracks: List[dict]) -> dict:
+    """在独立的 Python 子进程中评测一组参数, 保证峰值内存互不影响"""
+    result = run_isolated(run_config_in_process, {'config': config, 'tracks': tracks}, quiet=True)
+    result.setdefault('tracks', [])
+    return result
+
+
+def score_config(result: dict, tracks: List[dict], tolerance: float) -> dict:
+    """把一组参数的检测结果与真值对比, 汇总各项指标"""
+    from generate_test_video import load_ground_truth
+
+    truth = {track['id']: load_ground_truth(track['ground_truth']) for track in tracks}
+    per_track = []
+    for detection in result.get('tracks', []):
+        if 'error' in detection:
+            per_track.append({'id': detection['id'], 'error': detection['error']})
+            continue
+        reference = truth[detection['id']]
+        scores = beat_f_measure(np.asarray(detection['beat_times']), reference['times'], tolerance)
+        matches = scores['matches']
+        strong = np.asarray(detection['strong'], dtype=bool)
+        strong_accuracy = (float(np.mean(strong[matches[:, 0]] == reference['strong'][matches[:, 1]]))
+                           if len(matches) else 0.0)
+        reference_tempo = float(np.median(reference['tempo']))
+        per_track.append({
+            'id': detection['id'],
+            'f_measure': round(scores['f_measure'], 4),
+            'precision': round(scores['precision'], 4),
+            'recall': round(scores['recall'], 4),
+            'tempo': round(detection['tempo'], 2),
+            'reference_tempo': round(reference_tempo, 2),
+            'tempo_error': round(abs(detection['tempo'] - reference_tempo) / reference_tempo, 4),
+            'strong_accuracy': round(strong_accuracy, 4),
+            'wall_seconds': round(detection['wall_seconds'], 4),
+            'realtime_factor': round(detection['duration'] / detection['wall_seconds'], 1)
+            if detection['wall_seconds'] > 0 else None,
+        })
+
+    scored = [track for track in per_track if 'error' not in track]
+    summary = {'failed': len(per_track) - len(scored)}
+    if scored:
+        summary.update({
+            metric: round(float(np.mean([track[metric] for track in scored])), 4)
+            for metric in ('f_measure', 'tempo_error', 'strong_accuracy')
+        })
+        summary['wall_seconds'] = round(sum(track['wall_seconds'] for track in scored), 4)
+    summary['peak_rss_mb'] = result.get('peak_rss_mb')
+    return {'summary': summary, 'tracks': per_track}
+
+
+def config_id(config: dict) -> str:
+    mode = 'chunked' if config['chunked'] else 'full'
+    return f"sr{config['sr']}-hop{config['hop_length']}-{mode}-{config['tempo']}"
+
+
+def within_budget(summary: dict, args: argparse.Namespace) -> bool:
+    return (summary.get('failed', 1) == 0 and 'f_measure' in summary
+            and summary['f_measure'] >= args.min_f_measure
+            and summary['tempo_error'] <= args.max_tempo_error
+            and summary['strong_accuracy'] >= args.min_strong_accuracy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='节拍检测准确率与速度评测')
+    parser.add_argument('--corpus', help='语料目录: 评测其中带有同名 .beats.json 真值的媒体 '
+                                         '(默认: 用 generate_test_video.py 生成合成音轨)')
+    parser.add_argument('--workdir', default='eval_inputs',
+                       help='合成语料目录, 已生成的音轨会被复用 (默认: eval_inputs)')
+    parser.add_argument('--bpms', default='70,90,110,128,150,174',
+                       help='合成音轨的 BPM 列表 (默认: 70,90,110,128,150,174)')
+    parser.add_argument('--duration', type=float, default=60,
+                       help='合成音轨时长(秒) (默认: 60)')
+    parser.add_argument('--ramp', type=float, default=0.0,
+                       help='合成音轨速度在整段内的相对变化量, 如 0.1 (默认: 0, 恒定速度)')
+    parser.add_argument('--swing', type=float, default=0.0,
+                       help='合成音轨的摇摆程度 0-1 (默认: 0)')
+    parser.add_argument('--srs', default='22050,11025',
+                       help='分析采样率列表 (默认: 22050,11025)')
+    parser.add_argument('--hops', default='512,1024',
+                       help='分析帧移列表 (默认: 512,1024)')
+    parser.add_argument('--modes', default='full,chunked',
+                       help='分析方式列表 full / chunked (默认: full,chunked)')
+    parser.add_argument('--tempos', default='global,adaptive',
+                       help='速度模式列表 global / adaptive (默认: global,adaptive)')
+    parser.add_argument('--tolerance', type=float, default=MATCH_TOLERANCE,
+                       help=f'节拍命中容差(秒) (默认: {MATCH_TOLERANCE})')
+    parser.add_argument('--min-f-measure', type=float, default=0.9,
+                       help='准确率预算: 平均 F 值下限 (默认: 0.9)')
+    parser.add_argument('--max-tempo-error', type=float, default=0.05,
+                       help='准确率预算: 平均相对速度误差上限 (默认: 0.05)')
+    parser.add_argument('--min-strong-accuracy', type=float, default=0.0,
+                       help='准确率预算: 重拍/弱拍分类准确率下限 (默认: 0, 不限制)')
+    parser.add_argument('-o', '--output', help='结果 JSON 路径 (默认: 输出到标准输出)')
+
+    args = parser.parse_args()
+
+    try:
+        modes = parse_list(args.modes)
+        tempos = parse_list(args.tempos)
+        configs = [{'sr': sr, 'hop_length': hop, 'chunked': mode == 'chunked', 'tempo': tempo}
+                   for sr, hop, mode, tempo in itertools.product(
+                       parse_list(args.srs, int), parse_list(args.hops, int), modes, tempos)]
+    except ValueError as e:
+        print(f"❌ 参数格式错误: {e}", file=sys.stderr)
+        return 1
+    unknown = sorted(set(modes) - {'full', 'chunked'}) + sorted(set(tempos) - {'global', 'adaptive'})
+    if unknown:
+        print(f"❌ 未知的分析方式或速度模式: {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    if args.corpus:
+        tracks = find_corpus(args.corpus)
+    else:
+        print("🎵 正在准备合成语料...", file=sys.stderr)
+        tracks = build_corpus(args.workdir, parse_list(args.bpms, float),
+                              args.duration, args.ramp, args.swing)
+    if not tracks:
+        print("❌ 没有找到带节拍真值的媒体", file=sys.stderr)
+        return 1
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tolerance': args.tolerance,
+        'budget': {'min_f_measure': args.min_f_measure,
+                   'max_tempo_error': args.max_tempo_error,
+                   'min_strong_accuracy': args.min_strong_accuracy},
+        'corpus': [track['id'] for track in tracks],
+        'configs': [],
+    }
+
+    print(f"{'参数':<32} {'F值':>6} {'速度误差':>8} {'重拍准确率':>10} {'耗时(s)':>8} {'内存(MB)':>9}",
+          file=sys.stderr)
+    for config in configs:
+        scores = score_config(run_config(config, tracks), tracks, args.tolerance)
+        summary = scores['summary']
+        entry = dict(id=config_id(config), config=config, **scores)
+        entry['within_budget'] = within_budget(summary, args)
+        report['configs'].append(entry)
+        if 'f_measure' in summary:
+            print(f"{entry['id']:<32} {summary['f_measure']:>6.3f} {summary['tempo_error']:>8.3f} "
+                  f"{summary['strong_accuracy']:>10.3f} {summary['wall_seconds']:>8.2f} "
+                  f"{summary['peak_rss_mb'] or 0:>9.0f}{'' if entry['within_budget'] else '  ✗'}",
+                  file=sys.stderr)
+        else:
+            print(f"{entry['id']:<32} ❌ 分析失败", file=sys.stderr)
+
+    candidates = [entry for entry in report['configs'] if entry['within_budget']]
+    best = min(candidates, key=lambda entry: entry['summary']['wall_seconds'], default=None)
+    report['recommended'] = best['id'] if best else None
+    if best:
+        print(f"\n✅ 满足预算的最快参数: {best['id']}", file=sys.stderr)
+    else:
+        print("\n⚠️  没有参数组合满足准确率预算", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✅ 结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0 if best else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+解码帧的磁盘缓存
+同一个源视频渲染多个版本 (不同缩放范围、不同平台) 时, 第一次渲染顺带把解码后的
+RGB 帧写成原始帧文件, 之后的渲染以只读内存映射直接切片读取, 不再解码。
+以源文件内容和解码参数 (画面尺寸、解码端滤镜) 的哈希为键, 按总大小做 LRU 淘汰;
+多个渲染进程可以同时读取同一条目 (共享操作系统的页缓存)。
+"""
+
+import os
+import json
+import shutil
+import time
+import numpy as np
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from beat_cache import BeatCache
+
+
+# 默认缓存上限 (字节); 原始帧很大, 1080p30 每分钟约 11 GB
+DEFAULT_MAX_BYTES = 32 * 1024 ** 3
+# 条目目录中的文件
+META_FILE = 'meta.json'
+PID_FILE = 'writer.pid'
+# 正在写入的条目目录后缀
+PARTIAL_SUFFIX = '.partial'
+# 还没有写入进程号的暂存目录, 超过该时间(秒)才视为中断
+STALE_SECONDS = 60.0
+
+
+def _chunk_paths(directory: str, index: int) -> Tuple[str, str]:
+    """第 index 段的 (原始帧文件, 时间戳文件) 路径"""
+    return (os.path.join(directory, f'{index:04d}.rgb'),
+            os.path.join(directory, f'{index:04d}.times.npy'))
+
+
+def _directory_bytes(directory: str) -> int:
+    total = 0
+    for name in os.listdir(directory):
+        try:
+            total += os.stat(os.path.join(directory, name)).st_size
+        except OSError:
+            pass
+    return total
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CachedFrames:
+    """
+    一个缓存条目中的帧 (只读内存映射)
+
+    条目由若干段组成 (并行渲染时每个片段写一段), 各段按时间顺序排列、互不重叠。
+    产出的帧是内存映射的视图, 不复制; 条目被淘汰后已打开的映射仍然有效。
+    """
+
+    def __init__(self, directory: str):
+        """
+        Raises:
+            OSError / ValueError / KeyError: 条目不完整或已损坏
+        """
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        w, h = meta['size']
+        self.size = (int(w), int(h))
+        self._chunks = []
+        for index in range(int(meta['chunks'])):
+            frames_path, times_path = _chunk_paths(directory, index)
+            times = np.load(times_path)
+            if len(times) == 0:
+                continue
+            frames = np.memmap(frames_path, dtype=np.uint8, mode='r',
+                               shape=(len(times), h, w, 3))
+            self._chunks.append((times, frames))
+
+    def __len__(self) -> int:
+        return sum(len(times) for times, _ in self._chunks)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(frames.nbytes for _, frames in self._chunks)
+
+    def iter_frames(self, start: float = 0.0,
+                    end: Optional[float] = None) -> Iterator[Tuple[float, np.ndarray]]:
+        """按时间顺序产出 [start, end) 内的 (时间戳, (h, w, 3) RGB 帧视图)"""
+        for times, frames in self._chunks:
+            lo = int(np.searchsorted(times, start, side='left'))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+            for i in range(lo, hi):
+                yield float(times[i]), frames[i]
+
+
+class FrameRecorder:
+    """
+    把渲染时解码出的帧顺序写入暂存目录中的一段 (逐帧追加, 不占额外内存)
+
+    close() 写出时间戳文件, 表示该段完整; 未正常关闭的段不会被提交。
+    """
+
+    def __init__(self, staging: str, index: int):
+        """
+        Args:
+            staging: FrameCache.begin 返回的暂存目录
+            index: 段序号 (按时间顺序)
+        """
+        self._frames_path, self._times_path = _chunk_paths(staging, index)
+        self._file = open(self._frames_path, 'wb')
+        self._times: List[float] = []
+
+    def write(self, t: float, frame: np.ndarray) -> None:
+        """追加一帧 (只在调用期间读取, 可复用缓冲区)"""
+        self._file.write(np.ascontiguousarray(frame).data)
+        self._times.append(t)
+
+    def close(self) -> None:
+        self._file.close()
+        np.save(self._times_path, np.asarray(self._times, dtype=np.float64))
+
+
+class FrameCache:
+    """
+    解码帧缓存
+
+    每个条目是一个目录 (元数据 + 各段原始帧和时间戳文件), 命中时刷新元数据的修改时间;
+    写入时先写到 <键>.partial 暂存目录, 全部完成后改名提交, 读取方不会看到写了一半的条目。
+    暂存目录同时起到锁的作用: 同一条目同时只有一个进程写入, 其他进程直接从源视频解码。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: 缓存根目录 (条目存放在其下的 frames/ 子目录)
+            max_bytes: 缓存总大小上限
+        """
+        self.directory = os.path.join(cache_dir, 'frames')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(video_path: str, size: Tuple[int, int], filters: Sequence[str] = ()) -> str:
+        """
+        计算缓存键
+
+        Args:
+            video_path: 源视频路径
+            size: 解码后的画面尺寸 (w, h)
+            filters: 解码端的 ffmpeg 滤镜 (预览模式的缩小画面、降低帧率)
+        """
+        return BeatCache.make_file_key(video_path, {'mode': 'frames', 'size': list(size),
+                                                    'filters': list(filters)})
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[CachedFrames]:
+        """打开缓存条目, 未命中或条目损坏时返回 None"""
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            entry = CachedFrames(path)
+        except (OSError, ValueError, KeyError):
+            # 损坏的条目直接丢弃
+            self._remove(path)
+            return None
+
+        # 刷新修改时间, 作为 LRU 的访问记录
+        try:
+            os.utime(os.path.join(path, META_FILE))
+        except OSError:
+            pass
+        return entry
+
+    def begin(self, key: str, expected_bytes: int) -> Optional[str]:
+        """
+        开始写入一个条目: 先淘汰旧条目腾出空间, 再创建暂存目录
+
+        Args:
+            key: 缓存键
+            expected_bytes: 预计的条目大小
+
+        Returns:
+            暂存目录; 超过缓存上限或其他进程正在写入同一条目时返回 None
+        """
+        if expected_bytes > self.max_bytes:
+            return None
+        staging = self._path(key) + PARTIAL_SUFFIX
+        try:
+            os.mkdir(staging)
+        except FileExistsError:
+            if not self._stale(staging):
+                return None
+            self._remove(staging)
+            try:
+                os.mkdir(staging)
+            except FileExistsError:
+                return None
+        with open(os.path.join(staging, PID_FILE), 'w') as f:
+            f.write(str(os.getpid()))
+        self.evict(self.max_bytes - expected_bytes)
+        return staging
+
+    def commit(self, key: str, staging: str, size: Tuple[int, int]) -> bool:
+        """
+        把暂存目录中已写完的各段提交为正式条目 (渲染成功后调用)
+
+        Returns:
+            是否提交成功 (段序号不连续或条目已存在时丢弃暂存目录)
+        """
+        chunks = sum(1 for name in os.listdir(staging) if name.endswith('.times.npy'))
+        complete = chunks > 0 and all(os.path.exists(_chunk_paths(staging, index)[1])
+                                      for index in range(chunks))
+        path = self._path(key)
+        if not complete or os.path.exists(path):
+            self._remove(staging)
+            return False
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'size': list(size), 'chunks': chunks}, f)
+        os.remove(os.path.join(staging, PID_FILE))
+        try:
+            os.rename(staging, path)
+        except OSError:
+            self._remove(staging)
+            return False
+        self.evict()
+        return True
+
+    def abort(self, staging: str) -> None:
+        """放弃暂存目录 (渲染失败时)"""
+        self._remove(staging)
+
+    def evict(self, limit: Optional[int] = None) -> None:
+        """按最近使用时间淘汰条目, 直到总大小不超过 limit (默认为缓存上限); 顺带清理中断的暂存目录"""
+        limit = self.max_bytes if limit is None else limit
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(PARTIAL_SUFFIX):
+                if self._stale(path):
+                    self._remove(path)
+                continue
+            try:
+                mtime = os.stat(os.path.join(path, META_FILE)).st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, _directory_bytes(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _stale(staging: str) -> bool:
+        """写入暂存目录的进程已经不存在"""
+        try:
+            with open(os.path.join(staging, PID_FILE), 'r') as f:
+                pid = int(f.read().strip())
+        except FileNotFoundError:
+            try:
+                return time.time() - os.stat(staging).st_mtime > STALE_SECONDS
+            except OSError:
+                return False
+        except (OSError, ValueError):
+            return False
+        return not _process_alive(pid)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        shutil.rmtree(path, ignore_errors=True)
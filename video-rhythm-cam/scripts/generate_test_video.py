@@ -9,6 +9,48 @@ from moviepy import VideoFileClip, AudioFileClip
 import soundfile as sf
 import tempfile
 import os
+import json
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Sequence
+
+
+# 快速模式的音频采样率
+FAST_SAMPLE_RATE = 44100
+# 快速模式每次合成的音频块长度(秒)
+AUDIO_BLOCK_SECONDS = 10.0
+# 默认重音模式: 每小节各拍的重音等级 (第一拍最重)
+DEFAULT_ACCENTS = (1.0, 0.5, 0.8, 0.5)
+# 重音等级不低于该值的节拍在真值文件中记为重拍
+STRONG_ACCENT_LEVEL = 0.75
+# 反拍(八分音符)的音量, 相对于重音等级 1 的节拍
+OFFBEAT_LEVEL = 0.5
+# 每个渲染任务的帧数据上限 (字节), 决定任务包含的帧数
+FRAME_TASK_BYTES = 64 * 1024 * 1024
+# 节拍指示方块从节拍开始到熄灭的时长(秒)
+INDICATOR_DECAY_SECONDS = 0.15
+
+
+@dataclass
+class SyntheticBeats:
+    """
+    合成音轨的节拍真值
+
+    Attributes:
+        times: 节拍时间(秒)
+        accents: 每个节拍的重音等级 (0-1)
+        downbeats: 每个节拍是否为小节第一拍
+        tempo: 每个节拍处的瞬时速度 (BPM)
+        offbeat_times: 反拍 (两拍之间的八分音符, 含摇摆偏移) 时间(秒)
+    """
+    times: np.ndarray
+    accents: np.ndarray
+    downbeats: np.ndarray
+    tempo: np.ndarray
+    offbeat_times: np.ndarray
 
 
 def create_test_audio(audio_path, duration=10, bpm=120):
@@ -65,7 +107,325 @@ def create_test_audio(audio_path, duration=10, bpm=120):
     print(f"✅ 音频已生成: {audio_path}")
 
 
-def create_test_video(video_path, duration=10, fps=30):
+def _phase_to_time(phase: np.ndarray, bpm: float, bpm_end: float, duration: float) -> np.ndarray:
+    """
+    速度从 bpm 线性变化到 bpm_end 时, 第 phase 拍 (可为小数) 所在的时间
+
+    节拍相位 phase(t) = (bpm * t + (bpm_end - bpm) * t^2 / (2 * duration)) / 60,
+    对二次方程取数值稳定的求根公式, 整个数组一次求解。
+    """
+    a = (bpm_end - bpm) / (2.0 * duration * 60.0)
+    b = bpm / 60.0
+    return 2.0 * phase / (b + np.sqrt(b * b + 4.0 * a * phase))
+
+
+def generate_beat_track(duration: float, bpm: float = 120, bpm_end: Optional[float] = None,
+                        swing: float = 0.0,
+                        accents: Sequence[float] = DEFAULT_ACCENTS) -> SyntheticBeats:
+    """
+    计算合成音轨的节拍时间、重音和反拍位置
+
+    Args:
+        duration: 时长(秒)
+        bpm: 起始速度
+        bpm_end: 结束速度, 在整段时长内线性变化; None 表示恒定速度
+        swing: 摇摆程度 (0-1), 0 为平均八分音符, 1 时反拍推迟到三连音位置 (拍长的 2/3)
+        accents: 每小节各拍的重音等级, 长度即每小节拍数, 第一个为小节第一拍
+
+    Returns:
+        SyntheticBeats
+    """
+    bpm_end = bpm if bpm_end is None else bpm_end
+    end_phase = (bpm + bpm_end) / 2.0 * duration / 60.0
+    phases = np.arange(int(np.floor(end_phase)) + 1, dtype=np.float64)
+    times = _phase_to_time(phases, bpm, bpm_end, duration)
+    times = times[times < duration]
+
+    offbeat_phases = phases[:len(times)] + 0.5 + swing / 6.0
+    offbeat_times = _phase_to_time(offbeat_phases, bpm, bpm_end, duration)
+
+    accents = np.asarray(accents, dtype=np.float64)
+    position = np.arange(len(times)) % len(accents)
+    return SyntheticBeats(
+        times=times,
+        accents=accents[position],
+        downbeats=position == 0,
+        tempo=bpm + (bpm_end - bpm) * times / duration,
+        offbeat_times=offbeat_times[offbeat_times < duration],
+    )
+
+
+def _decaying_tone(frequency: float, length: float, decay: float,
+                   sample_rate: int) -> np.ndarray:
+    """单个音符的波形模板: 正弦波乘以指数衰减包络"""
+    n = int(length * sample_rate)
+    phase = np.linspace(0, length, n)
+    return (np.sin(2 * np.pi * frequency * phase) * np.exp(-np.linspace(0, decay, n))).astype(np.float32)
+
+
+def _place_events(block: np.ndarray, block_start: int, starts: np.ndarray,
+                  gains: np.ndarray, template: np.ndarray) -> None:
+    """把与当前音频块重叠的事件按各自增益叠加到块中 (向量化, 模板可跨块)"""
+    lo = np.searchsorted(starts, block_start - len(template), side='right')
+    hi = np.searchsorted(starts, block_start + len(block), side='left')
+    if hi <= lo:
+        return
+    index = (starts[lo:hi, None] - block_start) + np.arange(len(template))
+    valid = (index >= 0) & (index < len(block))
+    values = gains[lo:hi, None] * template
+    np.add.at(block, index[valid], values[valid])
+
+
+def synthesize_audio(audio_path: str, beats: SyntheticBeats, duration: float,
+                     sample_rate: int = FAST_SAMPLE_RATE) -> None:
+    """
+    合成节拍音轨并写入 WAV (分块写出, 内存占用与时长无关)
+
+    每个节拍为 440Hz 音调加 80Hz 底鼓, 音量随重音等级变化;
+    反拍只有较轻的底鼓。音色模板只生成一次, 按节拍位置向量化叠加。
+    """
+    tone = 0.3 * _decaying_tone(440, 0.1, 10, sample_rate)
+    kick = 0.2 * _decaying_tone(80, 0.05, 8, sample_rate)
+    # 固定增益代替逐段归一化: 最大值出现在重音等级 1 的节拍处
+    gain = 0.9 / (np.abs(tone).max() + np.abs(kick).max())
+
+    beat_starts = np.round(beats.times * sample_rate).astype(np.int64)
+    offbeat_starts = np.round(beats.offbeat_times * sample_rate).astype(np.int64)
+    beat_gains = beats.accents.astype(np.float32) * gain
+    offbeat_gains = np.full(len(offbeat_starts), OFFBEAT_LEVEL * gain, dtype=np.float32)
+
+    total = int(duration * sample_rate)
+    block_size = int(AUDIO_BLOCK_SECONDS * sample_rate)
+    with sf.SoundFile(audio_path, 'w', samplerate=sample_rate, channels=1,
+                      subtype='PCM_16') as f:
+        for block_start in range(0, total, block_size):
+            block = np.zeros(min(block_size, total - block_start), dtype=np.float32)
+            _place_events(block, block_start, beat_starts, beat_gains, tone)
+            _place_events(block, block_start, beat_starts, beat_gains, kick)
+            _place_events(block, block_start, offbeat_starts, offbeat_gains, kick)
+            f.write(block)
+
+
+def write_ground_truth(path: str, beats: SyntheticBeats, meta: dict) -> None:
+    """
+    写出节拍真值 JSON (每个节拍一行, 格式与时间线文件相近)
+
+    每个节拍: time, tempo, accent, strong (重音等级 >= 0.75), 小节第一拍带 "downbeat": true
+    """
+    lines = []
+    for t, bpm, accent, downbeat in zip(beats.times, beats.tempo, beats.accents, beats.downbeats):
+        beat = {'time': round(float(t), 6), 'tempo': round(float(bpm), 3),
+                'accent': round(float(accent), 4), 'strong': bool(accent >= STRONG_ACCENT_LEVEL)}
+        if downbeat:
+            beat['downbeat'] = True
+        lines.append(json.dumps(beat))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(meta)[:-1] + ', "beats": [\n  ')
+        f.write(',\n  '.join(lines))
+        f.write('\n]}\n')
+
+
+def load_ground_truth(path: str) -> dict:
+    """读取 write_ground_truth 写出的真值文件, 节拍字段转换为数组"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    beats = data.pop('beats')
+    data['times'] = np.array([beat['time'] for beat in beats], dtype=np.float64)
+    data['accents'] = np.array([beat.get('accent', 1.0) for beat in beats], dtype=np.float64)
+    data['strong'] = np.array([beat.get('strong', False) for beat in beats], dtype=bool)
+    data['downbeats'] = np.array([beat.get('downbeat', False) for beat in beats], dtype=bool)
+    data['tempo'] = np.array([beat.get('tempo', 0.0) for beat in beats], dtype=np.float64)
+    return data
+
+
+@lru_cache(maxsize=4)
+def _static_layers(width: int, height: int):
+    """
+    与帧序号无关的图层, 每个进程只计算一次:
+    标题文字的像素索引, 以及装饰圆圈区域内按到中心距离排序的像素索引
+    (半径为 r 的圆环即为其中一段连续切片)
+    """
+    title_mask = np.zeros((height, width), dtype=np.uint8)
+    text = "DANCE TEST VIDEO"
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    text_size = cv2.getTextSize(text, font, 2, 3)[0]
+    cv2.putText(title_mask, text, ((width - text_size[0]) // 2, (height + text_size[1]) // 2),
+                font, 2, 255, 3)
+    title_pixels = np.flatnonzero(title_mask)
+
+    # 最大半径 100 + 50*2 + 30, 再留出线宽
+    reach = 235
+    cx, cy = width // 2, height // 2
+    yy, xx = np.mgrid[max(cy - reach, 0):min(cy + reach, height),
+                      max(cx - reach, 0):min(cx + reach, width)]
+    distance = np.rint(np.hypot(xx - cx, yy - cy)).astype(np.int64).ravel()
+    order = np.argsort(distance, kind='stable')
+    ring_pixels = (yy.ravel() * width + xx.ravel())[order]
+    ring_bounds = np.searchsorted(distance[order], np.arange(reach + 3))
+    return title_pixels, ring_pixels, ring_bounds
+
+
+def render_frame_range(start: int, stop: int, width: int, height: int, fps: float,
+                       beat_times: np.ndarray, beat_accents: np.ndarray) -> np.ndarray:
+    """
+    绘制 [start, stop) 范围内的帧 (BGR)
+
+    画面与 create_test_video 相同 (渐变背景、标题、时间戳、装饰圆圈),
+    另在左下角加一个随节拍闪烁的方块, 亮度为重音等级, 便于目测节拍是否对齐。
+    背景和方块对整批帧一次性填充, 标题和圆圈使用预先算好的像素索引,
+    只有时间戳逐帧调用 cv2。
+    """
+    t = np.arange(start, stop) / fps
+    n = len(t)
+    frames = np.empty((n, height, width, 3), dtype=np.uint8)
+
+    background = np.stack([
+        100 + 50 * np.sin(2 * np.pi * t / 5),
+        50 + 30 * np.cos(2 * np.pi * t / 3),
+        150 + 50 * np.sin(2 * np.pi * t / 4),
+    ], axis=1).astype(np.uint8)
+    # 先填一行再按行广播 (直接按像素广播 3 个通道要慢一个数量级)
+    frames[:] = np.broadcast_to(background[:, None, :], (n, width, 3)).copy()[:, None]
+
+    title_pixels, ring_pixels, ring_bounds = _static_layers(width, height)
+    pixels = frames.reshape(n, height * width, 3)
+    pixels[:, title_pixels] = 255
+    for i in range(3):
+        radius = (100 + 50 * i + 30 * np.sin(2 * np.pi * t / (2 + i))).astype(np.int64)
+        color = (255, 255 - i * 80, 255 - i * 80)
+        for k, r in enumerate(radius):
+            pixels[k, ring_pixels[ring_bounds[r - 1]:ring_bounds[r + 2]]] = color
+
+    # 节拍指示方块
+    previous = np.searchsorted(beat_times, t, side='right') - 1
+    since = t - beat_times[np.maximum(previous, 0)]
+    level = np.where((previous >= 0) & (since < INDICATOR_DECAY_SECONDS),
+                     beat_accents[np.maximum(previous, 0)] * (1 - since / INDICATOR_DECAY_SECONDS), 0.0)
+    side = max(height // 10, 8)
+    frames[:, height - 2 * side:height - side, side:2 * side] = \
+        (level * 255).astype(np.uint8)[:, None, None, None]
+
+    for k, frame_t in enumerate(t):
+        cv2.putText(frames[k], f"Time: {frame_t:.1f}s", (50, 50),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+    return frames
+
+
+def create_test_track(audio_path: str, duration: float = 10, bpm: float = 120,
+                      bpm_end: Optional[float] = None, swing: float = 0.0,
+                      accents: Sequence[float] = DEFAULT_ACCENTS,
+                      beats_path: Optional[str] = None) -> str:
+    """
+    只生成音轨 (WAV) 和节拍真值, 用于节拍分析的评测
+
+    Args:
+        audio_path: 输出 WAV 路径
+        duration / bpm / bpm_end / swing / accents: 见 generate_beat_track
+        beats_path: 真值文件路径, 默认为 <音频文件名>.beats.json
+
+    Returns:
+        真值文件路径
+    """
+    beats = generate_beat_track(duration, bpm, bpm_end, swing, accents)
+    beats_path = beats_path or f"{os.path.splitext(audio_path)[0]}.beats.json"
+    write_ground_truth(beats_path, beats, {
+        'duration': float(duration), 'bpm': float(bpm),
+        'bpm_end': float(bpm if bpm_end is None else bpm_end),
+        'swing': float(swing), 'accents': [float(a) for a in accents],
+        'beats_per_bar': len(accents),
+    })
+    synthesize_audio(audio_path, beats, duration)
+    return beats_path
+
+
+def create_fast_test_media(output_path: str, duration: float = 10, bpm: float = 120,
+                           bpm_end: Optional[float] = None, swing: float = 0.0,
+                           accents: Sequence[float] = DEFAULT_ACCENTS,
+                           fps: float = 30, width: int = 1280, height: int = 720,
+                           workers: int = 1, preset: str = 'veryfast',
+                           beats_path: Optional[str] = None) -> str:
+    """
+    快速生成带节拍真值的测试视频
+
+    音轨向量化合成后, 帧按范围分给多个进程绘制, 按顺序直接写入一个 ffmpeg 进程
+    同时完成视频编码和音频封装, 不经过中间视频文件或二次编码。
+
+    Args:
+        output_path: 输出视频路径
+        duration: 时长(秒)
+        bpm / bpm_end / swing / accents: 见 generate_beat_track
+        fps: 帧率
+        width / height: 画面尺寸
+        workers: 绘制帧的进程数
+        preset: libx264 速度预设
+        beats_path: 真值文件路径, 默认为 <输出文件名>.beats.json
+
+    Returns:
+        真值文件路径
+
+    Raises:
+        RuntimeError: ffmpeg 编码失败
+    """
+    from rhythm_cam import get_ffmpeg_binary
+
+    beats = generate_beat_track(duration, bpm, bpm_end, swing, accents)
+    beats_path = beats_path or f"{os.path.splitext(output_path)[0]}.beats.json"
+
+    total_frames = int(duration * fps)
+    frames_per_task = max(FRAME_TASK_BYTES // (width * height * 3), 1)
+    ranges = [(start, min(start + frames_per_task, total_frames))
+              for start in range(0, total_frames, frames_per_task)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        audio_path = os.path.join(tmpdir, 'audio.wav')
+        create_test_track(audio_path, duration, bpm, bpm_end, swing, accents, beats_path)
+        print(f"🎵 节拍真值: {len(beats.times)} 拍 → {beats_path}")
+
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps}',
+            '-i', '-', '-i', audio_path, '-map', '0:v', '-map', '1:a',
+            '-c:v', 'libx264', '-preset', preset, '-crf', '23', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-movflags', '+faststart', output_path,
+        ]
+        stderr = tempfile.TemporaryFile()
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr)
+        print(f"🎬 正在生成测试视频 ({width}x{height}, {total_frames} 帧, {workers} 个进程)...")
+        try:
+            args = (width, height, fps, beats.times, beats.accents)
+            if workers <= 1:
+                for start, stop in ranges:
+                    proc.stdin.write(render_frame_range(start, stop, *args).data)
+            else:
+                # 在途任务数有上限, 按提交顺序写出, 内存占用与时长无关
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    pending = deque()
+                    for start, stop in ranges:
+                        pending.append(pool.submit(render_frame_range, start, stop, *args))
+                        if len(pending) >= 2 * workers:
+                            proc.stdin.write(pending.popleft().result().data)
+                    while pending:
+                        proc.stdin.write(pending.popleft().result().data)
+        except BrokenPipeError:
+            # ffmpeg 提前退出, 错误信息在下面报告
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = proc.wait()
+            stderr.seek(0)
+            message = stderr.read().decode('utf-8', errors='replace').strip()
+            stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败: {message[-2000:]}")
+
+    print(f"✅ 测试视频已生成: {output_path}")
+    return beats_path
+
+
+def create_test_video(video_path, duration=10, fps=30, width=1280, height=720):
     """
     创建带有动画的测试视频
 
@@ -73,11 +433,12 @@ def create_test_video(video_path, duration=10, fps=30):
         video_path: 输出视频路径
         duration: 视频时长(秒)
         fps: 帧率
+        width: 画面宽度
+        height: 画面高度
     """
-    print(f"🎬 正在生成测试视频...")
+    print(f"🎬 正在生成测试视频 ({width}x{height})...")
 
     # 视频参数
-    width, height = 1280, 720
     total_frames = int(duration * fps)
 
     # 创建视频写入器
@@ -179,11 +540,47 @@ def main():
                        help='输出视频路径 (默认: test_dance.mp4)')
     parser.add_argument('-d', '--duration', type=float, default=10,
                        help='视频时长(秒) (默认: 10)')
-    parser.add_argument('--bpm', type=int, default=120,
+    parser.add_argument('--bpm', type=float, default=120,
                        help='音乐节奏 (默认: 120)')
+    parser.add_argument('--size', default='1280x720',
+                       help='画面尺寸 宽x高 (默认: 1280x720)')
+    parser.add_argument('--fps', type=float, default=30,
+                       help='帧率 (默认: 30)')
+    parser.add_argument('--fast', action='store_true',
+                       help='快速模式: 向量化合成音画, 直接写入一个 ffmpeg 进程, 并输出节拍真值文件')
+    parser.add_argument('--bpm-end', type=float, default=None,
+                       help='[快速模式] 结束时的节奏, 速度在整段时长内线性变化 (默认: 与 --bpm 相同)')
+    parser.add_argument('--swing', type=float, default=0.0,
+                       help='[快速模式] 反拍摇摆程度 0-1, 1 为三连音摇摆 (默认: 0)')
+    parser.add_argument('--accents', default=','.join(f'{a:g}' for a in DEFAULT_ACCENTS),
+                       help='[快速模式] 每小节各拍的重音等级, 逗号分隔 (默认: 1,0.5,0.8,0.5)')
+    parser.add_argument('--beats', default=None,
+                       help='[快速模式] 节拍真值文件路径 (默认: <输出文件名>.beats.json)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='[快速模式] 绘制帧的进程数 (默认: CPU 核数)')
+    parser.add_argument('--preset', default='veryfast',
+                       help='[快速模式] libx264 速度预设 (默认: veryfast)')
 
     args = parser.parse_args()
 
+    try:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        accents = [float(v) for v in args.accents.split(',') if v.strip()]
+    except ValueError:
+        print("❌ --size 格式应为 宽x高, --accents 应为逗号分隔的数字")
+        return 1
+    if (not accents or not 0.0 <= args.swing <= 1.0 or args.bpm <= 0
+            or (args.bpm_end is not None and args.bpm_end <= 0)):
+        print("❌ 节奏必须为正数, --swing 在 0-1 之间, --accents 不能为空")
+        return 1
+    if width <= 0 or height <= 0 or width % 2 or height % 2:
+        # libx264 的 yuv420p 要求宽高都是偶数
+        print(f"❌ --size 的宽高必须为正偶数: {args.size}")
+        return 1
+    if args.fps <= 0 or args.workers < 1:
+        print("❌ --fps 必须为正数, --workers 至少为 1")
+        return 1
+
     # 检查依赖
     try:
         import moviepy
@@ -192,7 +589,20 @@ def main():
         print("请运行: pip install moviepy opencv-python soundfile numpy")
         return 1
 
-    print(f"🎥 开始生成测试视频 ({args.duration}秒, {args.bpm} BPM)")
+    print(f"🎥 开始生成测试视频 ({args.duration}秒, {args.bpm:g} BPM)")
+
+    if args.fast:
+        try:
+            create_fast_test_media(args.output, args.duration, args.bpm, args.bpm_end,
+                                   args.swing, accents, args.fps, width, height,
+                                   workers=args.workers, preset=args.preset,
+                                   beats_path=args.beats)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"\n🚀 现在可以测试节奏运镜:")
+        print(f"   python3 ~/.claude/skills/video-rhythm-cam/scripts/rhythm_cam.py {args.output}")
+        return 0
 
     with tempfile.TemporaryDirectory() as tmpdir:
         audio_path = os.path.join(tmpdir, "audio.wav")
@@ -202,7 +612,7 @@ def main():
         create_test_audio(audio_path, args.duration, args.bpm)
 
         # 创建视频
-        create_test_video(video_only_path, args.duration)
+        create_test_video(video_only_path, args.duration, args.fps, width, height)
 
         # 合并
         combine_audio_video(video_only_path, audio_path, args.output)
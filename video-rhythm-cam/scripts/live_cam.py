@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+实时节奏运镜
+从摄像头 (V4L2) 或按实时速度播放的视频文件读取画面, 从音频设备或文件读取声音,
+在线检测节拍并应用与 rhythm_cam.py 相同的强度加权缩放,
+输出到窗口、管道或文件, 结束时报告丢帧数和端到端延迟
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import collections
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+from rhythm_cam import (ANALYSIS_HOP_LENGTH, ANALYSIS_SAMPLE_RATE, FFmpegVideoWriter,
+                        QUALITY_INTERPOLATION, FrameTransformer, OnsetEnvelopeStream,
+                        build_zoom_schedule, compute_beat_peaks, iter_audio_blocks,
+                        iter_video_frames, probe_media)
+
+
+# 实时输出的编码参数 (最低编码延迟)
+LIVE_VIDEO_PARAMS = [
+    '-c:v', 'libx264',
+    '-preset', 'ultrafast',
+    '-tune', 'zerolatency',
+    '-pix_fmt', 'yuv420p',
+]
+# 每次送入节拍跟踪器的音频长度(秒)
+AUDIO_BLOCK_SECONDS = 0.02
+# 默认每帧延迟预算(秒): 画面最多等待这么久, 让音频分析跟上
+DEFAULT_LATENCY = 0.3
+# 在线节拍跟踪的速度范围 (BPM)
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+# 半周期处的峰值超过上一节拍强度的该倍数时, 切换节拍相位
+PHASE_SWITCH_RATIO = 1.2
+
+
+class OnlineBeatTracker:
+    """
+    在线节拍跟踪
+
+    增量计算 onset 包络, 对只往后看 lookahead 帧的局部峰值做自适应阈值判定,
+    并用最近几秒包络的自相关估计节拍周期, 同一周期内只接受一个节拍。
+    节拍强度相对于缓慢衰减的历史峰值归一化, 与离线模式的 0-1 强度含义一致。
+    """
+
+    def __init__(self, sr: int = ANALYSIS_SAMPLE_RATE,
+                 hop_length: int = ANALYSIS_HOP_LENGTH,
+                 sensitivity: float = 0.5,
+                 lookahead: int = 2,
+                 history_seconds: float = 8.0):
+        """
+        Args:
+            sr: 采样率
+            hop_length: 分析帧移 (采样点)
+            sensitivity: 灵敏度 (0.0-1.0), 越高接受的节拍越多
+            lookahead: 峰值判定向后看的包络帧数 (决定检测延迟)
+            history_seconds: 阈值和速度估计使用的历史长度(秒)
+        """
+        self.sr = sr
+        self.hop_length = hop_length
+        self.lookahead = max(int(lookahead), 1)
+        self.frame_seconds = hop_length / sr
+        self._stream = OnsetEnvelopeStream(sr, hop_length)
+        self._history = max(int(history_seconds / self.frame_seconds), 8 * self.lookahead)
+        self._env = np.zeros(0, dtype=np.float32)
+        self._env_start = 0  # self._env[0] 的绝对帧号
+        self._checked = 0  # 已做过峰值判定的绝对帧上界
+        # 灵敏度 0.5 时阈值为均值 + 1 倍标准差
+        self._threshold_k = 2.0 * (1.0 - sensitivity)
+        self._peak_ref = 0.0
+        self._period = None  # 节拍周期 (包络帧)
+        self._next_tempo_update = 0
+        self._last_beat = None
+        self._last_value = 0.0
+        self.n_samples = 0
+        self.beats: List[Tuple[float, float]] = []
+
+    @property
+    def latency(self) -> float:
+        """检测延迟(秒): STFT 半窗 + 峰值判定的向后看帧数"""
+        return (self._stream.n_fft // 2 + self.lookahead * self.hop_length) / self.sr
+
+    @property
+    def audio_time(self) -> float:
+        """已输入的音频时长(秒)"""
+        return self.n_samples / self.sr
+
+    @property
+    def tempo(self) -> float:
+        """当前速度估计 (BPM), 尚未估计时为 0"""
+        return 60.0 / (self._period * self.frame_seconds) if self._period else 0.0
+
+    def feed(self, samples: np.ndarray) -> List[Tuple[float, float]]:
+        """
+        输入一段音频
+
+        Returns:
+            新确定的节拍 [(时间(秒), 强度 0-1), ...]
+        """
+        self.n_samples += len(samples)
+        values = self._stream.feed(samples)
+        if len(values) == 0:
+            return []
+        self._env = np.concatenate([self._env, values])
+        new_beats = self._detect()
+
+        # 只保留阈值计算和峰值判定需要的历史
+        excess = len(self._env) - self._history
+        if excess > 0:
+            self._env = self._env[excess:]
+            self._env_start += excess
+        return new_beats
+
+    def _update_tempo(self, end: int) -> None:
+        """用最近的包络自相关估计节拍周期"""
+        env = self._env[:end - self._env_start]
+        min_lag = int(60.0 / MAX_BPM / self.frame_seconds)
+        max_lag = int(60.0 / MIN_BPM / self.frame_seconds)
+        if len(env) < 2 * max_lag:
+            return
+        x = env - env.mean()
+        spectrum = np.fft.rfft(x, n=2 * len(x))
+        acf = np.fft.irfft(spectrum * np.conj(spectrum))[:max_lag + 1]
+        if acf[0] <= 0:
+            return
+        # 与 librosa 相同的对数正态速度先验 (中心 120 BPM, 标准差 1 个八度), 避免锁定到半速
+        lags = np.arange(min_lag, max_lag + 1)
+        bpm = 60.0 / (lags * self.frame_seconds)
+        prior = np.exp(-0.5 * np.log2(bpm / 120.0) ** 2)
+        self._period = int(lags[np.argmax(acf[min_lag:max_lag + 1] * prior)])
+
+    def _detect(self) -> List[Tuple[float, float]]:
+        new_beats = []
+        end = self._env_start + len(self._env)
+        if end >= self._next_tempo_update:
+            self._update_tempo(end)
+            self._next_tempo_update = end + int(1.0 / self.frame_seconds)
+
+        # 候选帧 c 需要 [c - lookahead, c + lookahead] 都已到达
+        first = max(self._checked, self._env_start + self.lookahead)
+        last = end - self.lookahead
+        for frame in range(first, last):
+            i = frame - self._env_start
+            value = float(self._env[i])
+            self._peak_ref = max(self._peak_ref * 0.999, value)
+            neighbourhood = self._env[i - self.lookahead:i + self.lookahead + 1]
+            if value <= 0 or value < neighbourhood.max():
+                continue
+            past = self._env[:i]
+            if len(past) < self.lookahead * 4:
+                continue
+            if value < past.mean() + self._threshold_k * past.std():
+                continue
+            if self._last_beat is not None:
+                gap = frame - self._last_beat
+                if self._period:
+                    # 同一周期内只接受一个节拍; 半周期处明显更强的峰值说明相位选错了, 改用新相位
+                    rephase = gap >= 0.4 * self._period and value > PHASE_SWITCH_RATIO * self._last_value
+                    if gap < 0.6 * self._period and not rephase:
+                        continue
+                elif gap < 60.0 / MAX_BPM / self.frame_seconds:
+                    continue
+            self._last_beat = frame
+            self._last_value = value
+            strength = value / self._peak_ref if self._peak_ref > 0 else 1.0
+            new_beats.append((frame * self.frame_seconds, strength))
+        self._checked = max(self._checked, last)
+        self.beats.extend(new_beats)
+        return new_beats
+
+
+class FrameSlots:
+    """
+    读取线程与处理循环之间的帧缓冲: 固定数量的预分配缓冲区,
+    处理跟不上时丢弃最旧的待处理帧, 不会无限积压
+    """
+
+    def __init__(self, size: Tuple[int, int], capacity: int):
+        w, h = size
+        # 读取线程 1 个 + 处理循环 1 个 + 待处理帧 capacity 个
+        self._free = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(capacity + 2)]
+        self._pending = collections.deque()
+        self._capacity = capacity
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, t: float, frame: np.ndarray, arrival: float) -> None:
+        with self._cond:
+            if len(self._pending) >= self._capacity:
+                _, old, _ = self._pending.popleft()
+                self._free.append(old)
+                self.dropped += 1
+            buffer = self._free.pop()
+            np.copyto(buffer, frame)
+            self._pending.append((t, buffer, arrival))
+            self._cond.notify()
+
+    def get(self) -> Optional[Tuple[float, np.ndarray, float]]:
+        """取出最旧的待处理帧, 输入结束且没有待处理帧时返回 None"""
+        with self._cond:
+            while not self._pending and not self.closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            return self._pending.popleft()
+
+    def release(self, buffer: np.ndarray) -> None:
+        with self._cond:
+            self._free.append(buffer)
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def device_input_args(source: str, size: Optional[Tuple[int, int]],
+                      fps: Optional[float], input_format: Optional[str]) -> List[str]:
+    """
+    构造 ffmpeg 输入参数: /dev/video* 按 V4L2 摄像头读取, 普通文件按实时速度(-re)读取
+    """
+    if input_format is None and source.startswith('/dev/video'):
+        input_format = 'v4l2'
+    if input_format is None:
+        return ['-re']
+    args = ['-f', input_format]
+    if size is not None:
+        args += ['-video_size', f'{size[0]}x{size[1]}']
+    if fps is not None:
+        args += ['-framerate', f'{fps:g}']
+    return args
+
+
+class FrameSink:
+    """输出目标: display (窗口) / - (标准输出原始 RGB 帧) / null (丢弃) / 文件或流地址"""
+
+    def __init__(self, target: str, size: Tuple[int, int], fps: float):
+        self.target = target
+        self._writer = None
+        if target == 'display':
+            import cv2
+            self._cv2 = cv2
+            self._bgr = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        elif target not in ('-', 'null'):
+            self._writer = FFmpegVideoWriter(target, size, fps, video_params=LIVE_VIDEO_PARAMS)
+
+    def write(self, frame: np.ndarray) -> bool:
+        """输出一帧, 用户关闭窗口 (按 q 或 Esc) 时返回 False"""
+        if self.target == 'display':
+            self._cv2.cvtColor(frame, self._cv2.COLOR_RGB2BGR, dst=self._bgr)
+            self._cv2.imshow('rhythm cam', self._bgr)
+            return self._cv2.waitKey(1) & 0xFF not in (ord('q'), 27)
+        if self.target == '-':
+            sys.stdout.buffer.write(np.ascontiguousarray(frame).data)
+        elif self._writer is not None:
+            self._writer.write(frame)
+        return True
+
+    def close(self) -> None:
+        if self.target == 'display':
+            self._cv2.destroyAllWindows()
+        elif self.target == '-':
+            sys.stdout.buffer.flush()
+        elif self._writer is not None:
+            self._writer.close()
+
+
+def run_live(video_source: str, audio_source: Optional[str], output: str,
+             size: Tuple[int, int], fps: float,
+             sensitivity: float = 0.5,
+             zoom_min: float = 1.0,
+             zoom_max: float = 1.3,
+             zoom_duration: float = 0.2,
+             latency: float = DEFAULT_LATENCY,
+             quality: str = 'fast',
+             video_input_args: Sequence[str] = (),
+             audio_input_args: Sequence[str] = (),
+             max_seconds: Optional[float] = None) -> dict:
+    """
+    实时处理主循环
+
+    画面最多等待 latency 秒, 等音频分析覆盖到该帧时间 + 检测延迟后再渲染,
+    因此节拍前后的缩放与离线结果一致; 超出预算的帧直接渲染, 积压的帧被丢弃。
+
+    Args:
+        video_source: 视频文件或摄像头设备
+        audio_source: 音频文件或设备
+        output: 输出目标, 见 FrameSink
+        size: 画面尺寸 (w, h)
+        fps: 帧率
+        sensitivity: 节拍检测灵敏度 (0.0-1.0)
+        zoom_min: 最小缩放比例
+        zoom_max: 最大缩放比例
+        zoom_duration: 缩放持续时间(秒)
+        latency: 每帧延迟预算(秒)
+        quality: 缩放插值质量
+        video_input_args: 视频输入的 ffmpeg 参数
+        audio_input_args: 音频输入的 ffmpeg 参数
+        max_seconds: 最长运行时间(秒), None 表示直到输入结束
+
+    Returns:
+        统计信息: frames / dropped / late / beats / tempo / latency_ms
+    """
+    tracker = OnlineBeatTracker(sensitivity=sensitivity)
+    tracker_lock = threading.Lock()
+    slots = FrameSlots(size, capacity=max(int(np.ceil(latency * fps)) + 1, 2))
+    stop = threading.Event()
+    errors = []
+
+    def read_audio():
+        try:
+            block = AUDIO_BLOCK_SECONDS
+            for samples in iter_audio_blocks(audio_source, tracker.sr, block, input_args=audio_input_args):
+                with tracker_lock:
+                    tracker.feed(samples)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            errors.append(f"音频输入失败: {e}")
+        finally:
+            # 音频结束后不再等待分析
+            with tracker_lock:
+                tracker.n_samples = np.iinfo(np.int64).max // 2
+
+    def read_video():
+        try:
+            first_t = None
+            for t, frame in iter_video_frames(video_source, size, fps, input_args=video_input_args):
+                if first_t is None:
+                    first_t = t
+                slots.put(t - first_t, frame, time.perf_counter())
+                if stop.is_set():
+                    break
+        except Exception as e:
+            errors.append(f"视频输入失败: {e}")
+        finally:
+            slots.close()
+
+    audio_thread = threading.Thread(target=read_audio, daemon=True)
+    video_thread = threading.Thread(target=read_video, daemon=True)
+    audio_thread.start()
+    video_thread.start()
+
+    transformer = FrameTransformer(size, quality)
+    sink = FrameSink(output, size, fps)
+    clock = time.perf_counter
+    latencies = []
+    late = 0
+    beat_times = np.zeros(0)
+    beat_peaks = np.zeros(0)
+    n_known = 0
+    t_begin = clock()
+    try:
+        while True:
+            item = slots.get()
+            if item is None:
+                break
+            t, frame, arrival = item
+
+            # 等待音频分析覆盖到 t + 检测延迟, 最多等到延迟预算用完
+            deadline = arrival + latency
+            while True:
+                with tracker_lock:
+                    ready = tracker.audio_time >= t + zoom_duration + tracker.latency
+                if ready or clock() >= deadline or stop.is_set():
+                    break
+                time.sleep(0.002)
+            if not ready:
+                late += 1
+
+            with tracker_lock:
+                if len(tracker.beats) != n_known:
+                    n_known = len(tracker.beats)
+                    beat_times = np.array([b for b, _ in tracker.beats])
+                    beat_peaks = compute_beat_peaks([s for _, s in tracker.beats], zoom_min, zoom_max)
+
+            # 只取当前帧附近的节拍, 与离线模式相同的缩放计算
+            lo, hi = np.searchsorted(beat_times, [t - zoom_duration, t + zoom_duration])
+            schedule = build_zoom_schedule([t], fps, beat_times[lo:hi], beat_peaks[lo:hi], size,
+                                           zoom_min=zoom_min, zoom_duration=zoom_duration)
+            out = transformer.transform(frame, schedule.rects[0], schedule.active[0])
+            keep_going = sink.write(out)
+            slots.release(frame)
+            latencies.append(clock() - arrival)
+
+            if not keep_going or (max_seconds is not None and clock() - t_begin >= max_seconds):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        slots.close()
+        sink.close()
+
+    for message in errors:
+        print(f"❌ {message}", file=sys.stderr)
+
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'frames': len(latencies),
+        'dropped': slots.dropped,
+        'late': late,
+        'beats': len(tracker.beats),
+        'tempo': round(tracker.tempo, 1),
+        'tracker_latency_ms': round(tracker.latency * 1000, 1),
+        'latency_ms': {
+            'mean': round(float(lat_ms.mean()), 1),
+            'p95': round(float(np.percentile(lat_ms, 95)), 1),
+            'max': round(float(lat_ms.max()), 1),
+        },
+        'errors': errors,
+    }
+
+
+def _parse_size(value: str) -> Tuple[int, int]:
+    try:
+        w, h = value.lower().split('x')
+        return int(w), int(h)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的尺寸: {value} (格式: 1280x720)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='实时节奏运镜: 摄像头或实时播放的视频 + 在线节拍检测'
+    )
+    parser.add_argument('video', help='视频输入: 摄像头设备 (如 /dev/video0) 或视频文件 (按实时速度播放)')
+    parser.add_argument('--audio', help='音频输入: 音频设备或文件 (默认: 视频文件自身的音轨)')
+    parser.add_argument('--audio-format', help='音频设备的 ffmpeg 输入格式, 如 alsa / pulse')
+    parser.add_argument('--video-format', help='视频输入的 ffmpeg 格式 (默认: /dev/video* 为 v4l2)')
+    parser.add_argument('--size', type=_parse_size, help='摄像头画面尺寸, 如 1280x720')
+    parser.add_argument('--fps', type=float, help='摄像头帧率 (默认: 30)')
+    parser.add_argument('-o', '--output', default='display',
+                       help='输出: display (窗口, 默认) / - (标准输出原始 rgb24 帧) / null / 文件或流地址')
+    parser.add_argument('-s', '--sensitivity', type=float, default=0.5,
+                       help='节拍检测灵敏度 (0.0-1.0, 默认: 0.5)')
+    parser.add_argument('--zoom-min', type=float, default=1.0,
+                       help='最小缩放比例 (默认: 1.0)')
+    parser.add_argument('--zoom-max', type=float, default=1.3,
+                       help='最大缩放比例 (默认: 1.3)')
+    parser.add_argument('--zoom-duration', type=float, default=0.2,
+                       help='缩放持续时间(秒) (默认: 0.2)')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY,
+                       help=f'每帧延迟预算(秒) (默认: {DEFAULT_LATENCY})')
+    parser.add_argument('--quality', choices=list(QUALITY_INTERPOLATION), default='fast',
+                       help='缩放插值质量 (默认: fast)')
+    parser.add_argument('--max-seconds', type=float, help='最长运行时间(秒)')
+
+    args = parser.parse_args()
+
+    is_device = args.video_format is not None or args.video.startswith('/dev/video')
+    audio_source = args.audio
+    if audio_source is None:
+        if is_device:
+            print("❌ 使用摄像头时需要用 --audio 指定音频输入", file=sys.stderr)
+            return 1
+        audio_source = args.video
+
+    if is_device:
+        size = args.size or (1280, 720)
+        fps = args.fps or 30.0
+        video_input_args = device_input_args(args.video, args.size, args.fps, args.video_format)
+    else:
+        if not os.path.exists(args.video):
+            print(f"❌ 视频文件不存在: {args.video}", file=sys.stderr)
+            return 1
+        media = probe_media(args.video)
+        if media['video_size'] is None or not media['video_fps']:
+            print("❌ 无法读取视频流信息", file=sys.stderr)
+            return 1
+        size, fps = media['video_size'], media['video_fps']
+        video_input_args = ['-re']
+    if args.audio_format:
+        audio_input_args = ['-f', args.audio_format]
+    else:
+        audio_input_args = ['-re']
+
+    print(f"🎥 {args.video} → {args.output} ({size[0]}x{size[1]} @ {fps:g}fps, "
+          f"延迟预算 {args.latency * 1000:.0f}ms)", file=sys.stderr)
+    stats = run_live(
+        args.video, audio_source, args.output, size, fps,
+        sensitivity=args.sensitivity,
+        zoom_min=args.zoom_min,
+        zoom_max=args.zoom_max,
+        zoom_duration=args.zoom_duration,
+        latency=args.latency,
+        quality=args.quality,
+        video_input_args=video_input_args,
+        audio_input_args=audio_input_args,
+        max_seconds=args.max_seconds,
+    )
+
+    latency = stats['latency_ms']
+    print(f"\n📊 输出 {stats['frames']} 帧, 丢帧 {stats['dropped']}, "
+          f"超出预算 {stats['late']} 帧", file=sys.stderr)
+    print(f"   节拍 {stats['beats']} 个 (BPM: {stats['tempo']:.1f}), "
+          f"检测延迟 {stats['tracker_latency_ms']:.0f}ms", file=sys.stderr)
+    print(f"   端到端延迟: 平均 {latency['mean']:.1f}ms, "
+          f"P95 {latency['p95']:.1f}ms, 最大 {latency['max']:.1f}ms", file=sys.stderr)
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
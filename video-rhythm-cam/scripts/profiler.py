@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+处理过程的性能剖析与进度上报
+记录各阶段耗时、渲染帧率、编码器队列深度和内存占用,
+可写出 JSON Lines 或 Chrome Trace (chrome://tracing / Perfetto) 文件,
+并通过回调把进度交给外部调度系统
+"""
+
+import os
+import sys
+import json
+import time
+import contextlib
+from typing import Callable, Optional
+
+
+# 渲染阶段每隔多少帧上报一次进度
+PROGRESS_INTERVAL = 30
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """
+    当前进程的峰值常驻内存(MB); children 为 True 时取已结束的子进程 (如 ffmpeg) 中的最大值
+
+    ru_maxrss 在 Linux 上以 KB 为单位, macOS 上为字节
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb() -> float:
+    """当前进程的常驻内存(MB); 没有 /proc 时退回到峰值内存"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def _call_isolated(func: Callable[[dict], dict], job: dict, quiet: bool) -> dict:
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    return func(job)
+
+
+def run_isolated(func: Callable[[dict], dict], job: dict, quiet: bool = False) -> dict:
+    """
+    在全新的 Python 进程 (spawn) 中运行 func(job), 用于基准测试和评测:
+    每次运行的峰值内存和模块状态 (缓存、已加载的库) 互不影响
+
+    Args:
+        func: 模块级函数 (须可 pickle), 返回结果字典
+        job: 传给 func 的参数
+        quiet: 丢弃子进程的标准输出
+
+    Returns:
+        func 的返回值; 出错或子进程异常退出时为 {'error': 错误信息}
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        try:
+            return pool.submit(_call_isolated, func, job, quiet).result()
+        except Exception as e:
+            return {'error': f"{type(e).__name__}: {e}"}
+
+
+class Profiler:
+    """
+    阶段计时与进度上报
+
+    - stage(name): 计时上下文, 累加到 stages 并写出一个阶段事件
+    - begin_frames / frames: 渲染进度, 计算帧率和剩余时间, 打印并回调;
+      渲染结束时须以最终帧数再调用一次 frames(), 汇总的帧率按此时刻计算 (不含之后的混流)
+    - close(): 写出汇总事件, Chrome Trace 格式在此时写入文件
+
+    profile 路径以 .jsonl 结尾时逐行写出事件, 其他扩展名写 Chrome Trace JSON。
+    """
+
+    def __init__(self, profile: Optional[str] = None,
+                 progress: Optional[Callable[[dict], None]] = None,
+                 verbose: bool = True):
+        """
+        Args:
+            profile: 剖析结果输出路径, None 表示不写文件
+            progress: 进度回调, 参数为进度事件字典 (见 frames())
+            verbose: 是否打印进度
+        """
+        self.stages = {}
+        self.profile = profile
+        self.progress = progress
+        self.verbose = verbose
+        self._clock = time.perf_counter
+        self._t0 = self._clock()
+        self._trace = []
+        self._jsonl = None
+        if profile and profile.endswith('.jsonl'):
+            self._jsonl = open(profile, 'w', encoding='utf-8')
+        elif profile:
+            self._trace.append({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                                'args': {'name': 'rhythm_cam'}})
+        self._frames_total = None
+        self._frames_start = None
+        self._frames_end = None
+        self._frames_done = 0
+        self._peak_rss = current_rss_mb()
+
+    def _timestamp(self) -> float:
+        return self._clock() - self._t0
+
+    def _emit(self, event: dict) -> None:
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self._jsonl.flush()
+
+    def add_stage_time(self, name: str, seconds: float) -> None:
+        """累加某个阶段的耗时(秒), 用于逐帧累计的 decode / frame_transform / encode"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """阶段计时上下文"""
+        start = self._timestamp()
+        self._notify({'type': 'stage_start', 'stage': name, 't': round(start, 6)})
+        try:
+            yield
+        finally:
+            duration = self._timestamp() - start
+            self.add_stage_time(name, duration)
+            rss = current_rss_mb()
+            self._peak_rss = max(self._peak_rss, rss)
+            self._emit({'type': 'stage', 'stage': name, 't': round(start, 6),
+                        'duration': round(duration, 6), 'rss_mb': round(rss, 1)})
+            if self.profile and self._jsonl is None:
+                self._trace.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                    'ts': start * 1e6, 'dur': duration * 1e6})
+
+    def begin_frames(self, total: Optional[int]) -> None:
+        """开始渲染计时, total 为预计总帧数"""
+        self._frames_total = total
+        self._frames_start = self._clock()
+        self._frames_end = None
+        self._frames_done = 0
+
+    def frames(self, done: int, queue_depth: Optional[float] = None) -> None:
+        """
+        上报渲染进度
+
+        进度事件: {'type': 'progress', 'stage': 'render', 't', 'frames', 'total',
+        'fraction', 'fps', 'eta_seconds', 'queue_depth', 'rss_mb'}
+        """
+        if self._frames_start is None:
+            self.begin_frames(None)
+        self._frames_done = done
+        self._frames_end = self._clock()
+        elapsed = self._frames_end - self._frames_start
+        fps = done / elapsed if elapsed > 0 else 0.0
+        total = self._frames_total
+        fraction = min(done / total, 1.0) if total else None
+        eta = (total - done) / fps if total and fps > 0 else None
+        rss = current_rss_mb()
+        self._peak_rss = max(self._peak_rss, rss)
+
+        event = {
+            'type': 'progress',
+            'stage': 'render',
+            't': round(self._timestamp(), 6),
+            'frames': done,
+            'total': total,
+            'fraction': None if fraction is None else round(fraction, 4),
+            'fps': round(fps, 2),
+            'eta_seconds': None if eta is None else round(max(eta, 0.0), 1),
+            'queue_depth': None if queue_depth is None else round(queue_depth, 2),
+            'rss_mb': round(rss, 1),
+        }
+        self._emit(event)
+        if self.profile and self._jsonl is None:
+            counters = {'fps': event['fps'], 'rss_mb': event['rss_mb']}
+            if queue_depth is not None:
+                counters['queue_depth'] = event['queue_depth']
+            for name, value in counters.items():
+                self._trace.append({'name': name, 'ph': 'C', 'pid': os.getpid(),
+                                    'ts': event['t'] * 1e6, 'args': {name: value}})
+        self._notify(event)
+
+        if self.verbose:
+            percent = f"{fraction * 100:.1f}%" if fraction is not None else f"{done} 帧"
+            eta_text = f", 剩余 {eta:.0f}s" if eta is not None else ''
+            print(f"   进度: {percent} ({fps:.1f} 帧/秒{eta_text})")
+
+    def _notify(self, event: dict) -> None:
+        if self.progress is None:
+            return
+        try:
+            self.progress(event)
+        except Exception as e:
+            # 回调出错不应中断处理
+            print(f"⚠️  进度回调出错: {e}")
+
+    def summary(self) -> dict:
+        """汇总: 总耗时、帧数、平均帧率、峰值内存和各阶段耗时"""
+        wall = self._timestamp()
+        # 渲染耗时截止到最后一次上报进度, 不含编码收尾和混流
+        render = (self._frames_end - self._frames_start) if self._frames_end is not None else 0.0
+        return {
+            'type': 'summary',
+            'wall_seconds': round(wall, 4),
+            'frames': self._frames_done,
+            'fps': round(self._frames_done / render, 2) if render > 0 else 0.0,
+            'peak_rss_mb': round(self._peak_rss, 1),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+        }
+
+    def close(self) -> None:
+        """写出汇总并关闭输出文件"""
+        summary = self.summary()
+        self._emit(summary)
+        self._notify(summary)
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        elif self.profile:
+            with open(self.profile, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self._trace, 'displayTimeUnit': 'ms',
+                           'otherData': summary}, f)
+            self._trace = []
@@ -7,18 +7,83 @@
 import os
 import sys
 import argparse
+import contextlib
+import re
+import json
+import subprocess
 import tempfile
+import threading
+import time
+import queue
 import numpy as np
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+from beat_cache import BeatCache, default_cache_dir
+from beat_grid import GRID_VERSION, accent_levels, analyze_beat_grid
+from frame_cache import DEFAULT_MAX_BYTES as DEFAULT_FRAME_CACHE_BYTES
+from frame_cache import CachedFrames, FrameCache, FrameRecorder
+from encoding import (CODEC_ENCODERS, DEFAULT_CODEC, DEFAULT_ENCODING, ENCODING_PROFILES,
+                      EncoderSettings, audio_codec_params, container_for)
+from profiler import PROGRESS_INTERVAL, Profiler
+from subject_tracker import TRACK_FPS, TRACK_WIDTH, MotionTracker, SubjectTrack, track_size
 
-def check_dependencies():
-    """检查必要的依赖"""
+
+# 重拍判定阈值 (归一化强度)
+STRONG_BEAT_THRESHOLD = 0.6
+# 弱拍峰值缩放占 zoom_min→zoom_max 区间的比例
+WEAK_BEAT_ZOOM_RATIO = 0.6
+# 缩放因子超过 zoom_min 的该倍数才真正裁剪
+ZOOM_APPLY_RATIO = 1.01
+# 节拍分析使用的采样率和帧移 (与 librosa 默认一致)
+ANALYSIS_SAMPLE_RATE = 22050
+ANALYSIS_HOP_LENGTH = 512
+# 分块分析: 每次读取的音频块长度, 节拍跟踪窗口长度及相邻窗口重叠 (秒)
+CHUNK_BLOCK_SECONDS = 10.0
+CHUNK_WINDOW_SECONDS = 60.0
+CHUNK_OVERLAP_SECONDS = 10.0
+# 节拍速度模式: global 整首一个速度 (librosa 动态规划), adaptive 逐段跟踪速度变化并检测重拍
+TEMPO_MODES = ('global', 'adaptive')
+# 自适应模式下用于判断重拍的低频 mel 频带数 (128 个频带中约 350 Hz 以下)
+BASS_MEL_BANDS = 16
+# 按重音缩放时, 最弱节拍的峰值仍占 zoom_min→zoom_max 区间的比例
+ACCENT_ZOOM_FLOOR = 0.3
+
+
+class RhythmCamError(Exception):
+    """节奏运镜处理错误的基类"""
+
+
+class MediaError(RhythmCamError):
+    """输入媒体不可用: 文件不存在、缺少视频流或音轨、解码失败"""
+
+
+class AnalysisError(RhythmCamError):
+    """节拍分析失败或没有检测到节拍"""
+
+
+class RenderError(RhythmCamError):
+    """渲染或编码失败"""
+
+
+class InvalidParameterError(RhythmCamError, ValueError):
+    """参数不合法 (时间范围、缩放比例等)"""
+
+
+def check_dependencies(analysis: bool = True):
+    """
+    检查必要的依赖
+
+    Args:
+        analysis: 是否需要音频分析依赖 (使用已有时间线渲染时不需要 librosa)
+    """
     try:
         import moviepy
-        import librosa
-        import librosa.display
-        import soundfile as sf
+        if analysis:
+            import librosa
+            import librosa.display
+            import soundfile as sf
         return True
     except ImportError as e:
         print(f"❌ 缺少依赖库: {e}")
@@ -51,71 +116,2058 @@ def extract_audio(video_path: str, audio_path: str) -> bool:
         return False
 
 
-def detect_beats_with_strength(audio_path: str, sensitivity: float = 0.5) -> Tuple[List[Tuple[float, float]], float]:
+@dataclass
+class BeatAnalysis:
+    """
+    节拍分析的原始结果 (尚未做灵敏度过滤)
+
+    Attributes:
+        beat_times: 节拍时间(秒)
+        beat_strengths: 节拍处的 onset 强度原始值
+        tempo: 全局速度 (BPM), 自适应模式下为局部速度的中位数
+        duration: 音频时长(秒)
+        downbeats: 每个节拍是否为小节第一拍 (仅自适应模式)
+        tempo_times: 局部速度曲线的采样时间(秒) (仅自适应模式)
+        tempo_curve: 各采样点的局部速度 BPM (仅自适应模式)
     """
-    检测音频中的节拍点，并区分重拍和弱拍
+    beat_times: np.ndarray
+    beat_strengths: np.ndarray
+    tempo: float
+    duration: float
+    downbeats: Optional[np.ndarray] = None
+    tempo_times: Optional[np.ndarray] = None
+    tempo_curve: Optional[np.ndarray] = None
+
+    def to_dict(self) -> dict:
+        data = {
+            'beat_times': np.asarray(self.beat_times, dtype=np.float64),
+            'beat_strengths': np.asarray(self.beat_strengths, dtype=np.float64),
+            'tempo': np.float64(self.tempo),
+            'duration': np.float64(self.duration),
+        }
+        if self.downbeats is not None:
+            data['downbeats'] = np.asarray(self.downbeats, dtype=bool)
+            data['tempo_times'] = np.asarray(self.tempo_times, dtype=np.float64)
+            data['tempo_curve'] = np.asarray(self.tempo_curve, dtype=np.float64)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BeatAnalysis':
+        optional = {}
+        if 'downbeats' in data:
+            optional = {
+                'downbeats': np.asarray(data['downbeats'], dtype=bool),
+                'tempo_times': np.asarray(data['tempo_times'], dtype=np.float64),
+                'tempo_curve': np.asarray(data['tempo_curve'], dtype=np.float64),
+            }
+        return cls(
+            beat_times=np.asarray(data['beat_times'], dtype=np.float64),
+            beat_strengths=np.asarray(data['beat_strengths'], dtype=np.float64),
+            tempo=float(data['tempo']),
+            duration=float(data['duration']),
+            **optional,
+        )
+
+
+def load_audio(media_path: str, sr: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """
+    用 ffmpeg 把媒体文件的音轨一次性解码为内存中的单声道 float32 数组
+
+    直接在解码时重采样到分析采样率, 不写任何中间 WAV 文件。
 
     Args:
-        audio_path: 音频文件路径
-        sensitivity: 节拍检测灵敏度 (0.0-1.0), 越高检测到的节拍越多
+        media_path: 视频或音频文件路径
+        sr: 目标采样率
 
     Returns:
-        ((时间, 强度) 列表, 音频时长)
+        音频采样
+
+    Raises:
+        RuntimeError: 解码失败 (例如没有音轨)
+    """
+    cmd = [
+        get_ffmpeg_binary(), '-hide_banner', '-nostats', '-loglevel', 'error',
+        '-i', media_path, '-map', '0:a:0', '-vn', '-sn',
+        '-ac', '1', '-ar', str(sr), '-f', 'f32le', '-',
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"音频解码失败: {message[-2000:]}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def iter_audio_blocks(media_path: str, sr: int = ANALYSIS_SAMPLE_RATE,
+                      block_seconds: float = CHUNK_BLOCK_SECONDS,
+                      input_args: Sequence[str] = ()) -> Iterator[np.ndarray]:
+    """
+    流式解码音轨, 逐块产出单声道 float32 采样 (内存占用只与块长度有关)
+
+    Args:
+        media_path: 视频或音频文件路径
+        sr: 目标采样率
+        block_seconds: 每块时长(秒)
+        input_args: 放在 -i 之前的 ffmpeg 输入参数 (如 ['-re'], ['-f', 'alsa'])
+
+    Yields:
+        音频采样块
+
+    Raises:
+        RuntimeError: 解码失败 (例如没有音轨)
+    """
+    cmd = [
+        get_ffmpeg_binary(), '-hide_banner', '-nostats', '-loglevel', 'error',
+        *input_args, '-i', media_path, '-map', '0:a:0', '-vn', '-sn',
+        '-ac', '1', '-ar', str(sr), '-f', 'f32le', '-',
+    ]
+    block_bytes = max(int(block_seconds * sr), 1) * 4
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            usable = len(data) - len(data) % 4
+            if usable > 0:
+                yield np.frombuffer(data[:usable], dtype=np.float32)
+            if len(data) < block_bytes:
+                break
+        returncode = proc.wait()
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f"音频解码失败: {message[-2000:]}")
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        stderr.close()
+
+
+def analyze_beats(y: np.ndarray, sr: int,
+                  hop_length: int = ANALYSIS_HOP_LENGTH) -> BeatAnalysis:
+    """
+    检测音频中的节拍点及其强度
+
+    频谱和 onset 包络只计算一次, 同时用于速度估计、节拍定位和强度评分。
+
+    Args:
+        y: 单声道音频采样
+        sr: 采样率
+        hop_length: 分析帧移 (采样点), 越大越快但时间精度越低
+
+    Returns:
+        BeatAnalysis
+    """
+    import librosa
+
+    duration = len(y) / sr
+
+    # 计算 onset 包络 (唯一一次频谱分析)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+
+    # 基于同一包络检测速度和节拍
+    tempo, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr,
+                                           hop_length=hop_length)
+
+    # 将帧转换为时间(秒), 节拍强度直接按帧索引取包络值
+    beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=hop_length)
+    beat_strength = onset_env[beats]
+
+    return BeatAnalysis(
+        beat_times=np.asarray(beat_times, dtype=np.float64),
+        beat_strengths=np.asarray(beat_strength, dtype=np.float64),
+        tempo=float(np.atleast_1d(tempo)[0]),
+        duration=duration,
+    )
+
+
+def _grid_analysis(onset_env: np.ndarray, sr: int, hop_length: int, duration: float,
+                   bass_env: Optional[np.ndarray] = None) -> BeatAnalysis:
+    """在 onset 包络上计算自适应节拍网格, 转换为 BeatAnalysis"""
+    frame_rate = sr / hop_length
+    grid = analyze_beat_grid(onset_env, frame_rate, bass_env)
+    return BeatAnalysis(
+        beat_times=grid.beat_frames / frame_rate,
+        beat_strengths=np.asarray(grid.beat_strengths, dtype=np.float64),
+        tempo=float(np.median(grid.tempo_bpm)) if len(grid.tempo_bpm) else 0.0,
+        duration=duration,
+        downbeats=grid.downbeats,
+        tempo_times=grid.tempo_frames / frame_rate,
+        tempo_curve=grid.tempo_bpm,
+    )
+
+
+def analyze_beats_adaptive(y: np.ndarray, sr: int,
+                           hop_length: int = ANALYSIS_HOP_LENGTH) -> BeatAnalysis:
+    """
+    自适应速度的节拍分析: 跟踪速度变化, 并标出每小节的第一拍
+
+    mel 频谱只计算一次, 同时得到全频段 onset 包络 (节拍定位) 和
+    低频段 onset 包络 (底鼓, 用于判断重拍)。
+
+    Args:
+        y: 单声道音频采样
+        sr: 采样率
+        hop_length: 分析帧移 (采样点)
+
+    Returns:
+        BeatAnalysis (含 downbeats / tempo_times / tempo_curve)
     """
     import librosa
-    import soundfile as sf
 
+    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=sr, hop_length=hop_length))
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=hop_length)
+    bass_env = librosa.onset.onset_strength(S=mel_db[:BASS_MEL_BANDS], sr=sr, hop_length=hop_length)
+    return _grid_analysis(onset_env, sr, hop_length, len(y) / sr, bass_env)
+
+
+class OnsetEnvelopeStream:
+    """
+    增量计算 onset 包络, 与 librosa.onset.onset_strength 的默认参数对齐
+    (center=True 零填充, Hann 窗, 128 个 mel 频带, 帧间差分取正后求均值)。
+
+    唯一的差别是 dB 下限 (top_db) 相对于"到目前为止"的最大值而非全局最大值。
+    """
+
+    def __init__(self, sr: int, hop_length: int = ANALYSIS_HOP_LENGTH,
+                 n_fft: int = 2048, n_mels: int = 128, top_db: float = 80.0):
+        import librosa
+
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.top_db = top_db
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).T
+        self._window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        # center=True 时左侧填充 n_fft // 2 个零
+        self._buffer = np.zeros(n_fft // 2, dtype=np.float32)
+        self._prev_db = None
+        self._ref_db = -np.inf
+        self._n_samples = 0
+        self._emitted = 0
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        """输入一段音频, 返回新得到的包络值"""
+        self._n_samples += len(samples)
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float32)])
+        return self._emit(self._process())
+
+    def finish(self) -> np.ndarray:
+        """输入结束: 补齐右侧零填充, 返回剩余的包络值"""
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        self._process()
+        # 包络总长度与整段分析的 STFT 帧数一致, 末尾多出的差分值丢弃
+        total = 1 + self._n_samples // self.hop_length
+        return self._emit(np.zeros(max(total - self._emitted, 0), dtype=np.float32))
+
+    def _emit(self, values: np.ndarray) -> np.ndarray:
+        self._emitted += len(values)
+        return values
+
+    def _process(self) -> np.ndarray:
+        n_frames = (len(self._buffer) - self.n_fft) // self.hop_length + 1
+        if n_frames <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, self.n_fft)
+        frames = frames[::self.hop_length][:n_frames]
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        mel_db = 10.0 * np.log10(np.maximum(power @ self._mel_basis, 1e-10))
+        self._ref_db = max(self._ref_db, float(mel_db.max()))
+        mel_db = np.maximum(mel_db, self._ref_db - self.top_db)
+        self._buffer = self._buffer[n_frames * self.hop_length:]
+
+        if self._prev_db is None:
+            # 第一帧: 对应 librosa 的 lag + n_fft/(2*hop) 个前导零
+            lead = np.zeros(1 + self.n_fft // (2 * self.hop_length), dtype=np.float32)
+            stacked = mel_db
+        else:
+            lead = np.zeros(0, dtype=np.float32)
+            stacked = np.vstack([self._prev_db[None, :], mel_db])
+        self._prev_db = mel_db[-1]
+
+        flux = np.maximum(0.0, np.diff(stacked, axis=0)).mean(axis=1).astype(np.float32)
+        return np.concatenate([lead, flux])
+
+
+class ChunkedBeatTracker:
+    """
+    分块节拍跟踪: 增量计算 onset 包络, 在重叠的滑动窗口上运行节拍跟踪。
+
+    每个窗口只输出去掉半个重叠区后的中间部分的节拍, 边缘由相邻窗口负责;
+    只保留当前窗口的包络, 峰值内存与音频总长度无关。
+    """
+
+    def __init__(self, sr: int, hop_length: int = ANALYSIS_HOP_LENGTH,
+                 window_seconds: float = CHUNK_WINDOW_SECONDS,
+                 overlap_seconds: float = CHUNK_OVERLAP_SECONDS):
+        self.sr = sr
+        self.hop_length = hop_length
+        self._stream = OnsetEnvelopeStream(sr, hop_length)
+        self._window = max(int(round(window_seconds * sr / hop_length)), 2)
+        self._overlap = min(int(round(overlap_seconds * sr / hop_length)), self._window // 2)
+        self._env = np.zeros(0, dtype=np.float32)
+        self._env_start = 0  # self._env[0] 的绝对帧号
+        self._accepted_until = 0  # 已输出节拍的绝对帧上界
+        self._tempos = []
+        self.beat_frames = []
+        self.beat_strengths = []
+
+    def feed(self, samples: np.ndarray) -> int:
+        """输入一段音频, 返回新确定的节拍数"""
+        before = len(self.beat_frames)
+        self._env = np.concatenate([self._env, self._stream.feed(samples)])
+        while len(self._env) >= self._window:
+            self._track(final=False)
+        return len(self.beat_frames) - before
+
+    def finish(self) -> int:
+        """输入结束, 处理剩余窗口, 返回新确定的节拍数"""
+        before = len(self.beat_frames)
+        self._env = np.concatenate([self._env, self._stream.finish()])
+        while len(self._env) > self._window:
+            self._track(final=False)
+        self._track(final=True)
+        return len(self.beat_frames) - before
+
+    @property
+    def tempo(self) -> float:
+        """各窗口速度估计的中位数 (BPM)"""
+        return float(np.median(self._tempos)) if self._tempos else 0.0
+
+    def _track(self, final: bool) -> None:
+        import librosa
+
+        window = self._env if final else self._env[:self._window]
+        if len(window) > 1 and window.max() > 0:
+            tempo, beats = librosa.beat.beat_track(onset_envelope=window, sr=self.sr,
+                                                   hop_length=self.hop_length)
+            tempo = float(np.atleast_1d(tempo)[0])
+            if len(beats) > 0:
+                self._tempos.append(tempo)
+
+            # 只接受窗口中间部分的节拍, 并丢弃与上一窗口重复的节拍
+            upper = np.inf if final else self._env_start + self._window - self._overlap // 2
+            min_gap = 0.5 * np.median(np.diff(beats)) if len(beats) > 1 else 0
+            for beat in beats:
+                frame = int(beat) + self._env_start
+                if frame < self._accepted_until or frame >= upper:
+                    continue
+                if self.beat_frames and frame - self.beat_frames[-1] < min_gap:
+                    continue
+                self.beat_frames.append(frame)
+                self.beat_strengths.append(float(window[beat]))
+
+        if final:
+            self._env = np.zeros(0, dtype=np.float32)
+            return
+        self._accepted_until = self._env_start + self._window - self._overlap // 2
+        step = self._window - self._overlap
+        self._env = self._env[step:]
+        self._env_start += step
+
+
+def analyze_beats_chunked(media_path: str, sr: int = ANALYSIS_SAMPLE_RATE,
+                          hop_length: int = ANALYSIS_HOP_LENGTH,
+                          tempo: str = 'global') -> BeatAnalysis:
+    """
+    分块流式分析长音频的节拍 (峰值内存恒定)
+
+    自适应模式下流式计算 onset 包络后一次性计算节拍网格; 包络每小时只有约 15 万个值,
+    音频采样本身仍不驻留内存 (重拍按全频段包络判断)。
+
+    Args:
+        media_path: 视频或音频文件路径
+        sr: 分析采样率
+        hop_length: 分析帧移 (采样点)
+        tempo: 速度模式 global / adaptive
+
+    Returns:
+        BeatAnalysis
+    """
+    if tempo == 'adaptive':
+        stream = OnsetEnvelopeStream(sr, hop_length)
+        n_samples = 0
+        envelope = []
+        for block in iter_audio_blocks(media_path, sr):
+            n_samples += len(block)
+            envelope.append(stream.feed(block))
+        envelope.append(stream.finish())
+        return _grid_analysis(np.concatenate(envelope), sr, hop_length, n_samples / sr)
+
+    tracker = ChunkedBeatTracker(sr, hop_length)
+    n_samples = 0
+    for block in iter_audio_blocks(media_path, sr):
+        n_samples += len(block)
+        tracker.feed(block)
+    tracker.finish()
+
+    beat_frames = np.asarray(tracker.beat_frames, dtype=np.int64)
+    return BeatAnalysis(
+        beat_times=beat_frames * hop_length / sr,
+        beat_strengths=np.asarray(tracker.beat_strengths, dtype=np.float64),
+        tempo=tracker.tempo,
+        duration=n_samples / sr,
+    )
+
+
+def filter_beats(analysis: BeatAnalysis, sensitivity: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    归一化节拍强度并按灵敏度过滤
+
+    Args:
+        analysis: 节拍分析结果
+        sensitivity: 节拍检测灵敏度 (0.0-1.0), 越高保留的节拍越多
+
+    Returns:
+        (时间, 归一化强度) 列表
+    """
+    beat_times = analysis.beat_times
+    beat_strength = analysis.beat_strengths
+
+    if len(beat_strength) == 0:
+        return []
+
+    # 归一化强度到 0-1 范围
+    beat_strength_normalized = (beat_strength - beat_strength.min()) / (beat_strength.max() - beat_strength.min() + 1e-8)
+
+    # 根据灵敏度过滤节拍
+    if sensitivity < 1.0:
+        threshold = np.percentile(beat_strength_normalized, (1 - sensitivity) * 100)
+        mask = beat_strength_normalized >= threshold
+        beat_times = beat_times[mask]
+        beat_strength_normalized = beat_strength_normalized[mask]
+
+    # 组合时间和强度
+    return list(zip(beat_times, beat_strength_normalized))
+
+
+def grade_beats(analysis: BeatAnalysis, sensitivity: float = 0.5
+                ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    按局部重音等级过滤节拍 (替代 filter_beats 的全局最小-最大归一化)
+
+    重音等级是节拍强度在前后若干拍内的排名, 单个异常响的节拍或整体音量变化
+    不会影响其他节拍的等级; 小节第一拍总是保留。
+
+    Args:
+        analysis: 节拍分析结果
+        sensitivity: 节拍检测灵敏度 (0.0-1.0), 越高保留的节拍越多
+
+    Returns:
+        (节拍时间, 重音等级 0-1, 是否为小节第一拍 或 None)
+    """
+    accents = accent_levels(analysis.beat_strengths)
+    keep = np.ones(len(accents), dtype=bool)
+    if sensitivity < 1.0 and len(accents) > 0:
+        keep = accents >= np.percentile(accents, (1 - sensitivity) * 100)
+        if analysis.downbeats is not None:
+            keep |= analysis.downbeats
+    downbeats = None if analysis.downbeats is None else analysis.downbeats[keep]
+    return analysis.beat_times[keep], accents[keep], downbeats
+
+
+def _analysis_params(hop_length: int, tempo: str) -> dict:
+    """缓存键中的分析参数 (global 模式不写入 tempo, 保持与旧缓存的键一致)"""
+    params = {'hop_length': hop_length}
+    if tempo != 'global':
+        params['tempo'] = tempo
+        params['grid'] = GRID_VERSION
+    return params
+
+
+def analyze_audio_cached(y: np.ndarray, sr: int,
+                         cache_dir: Optional[str] = None,
+                         hop_length: int = ANALYSIS_HOP_LENGTH,
+                         tempo: str = 'global') -> Tuple[BeatAnalysis, bool]:
+    """
+    分析内存中的音频, 使用缓存时先查缓存
+
+    缓存键只取决于音频内容和分析参数, 灵敏度过滤在查缓存之后进行。
+
+    Returns:
+        (分析结果, 是否命中缓存)
+    """
+    cache = None
+    if cache_dir:
+        cache = BeatCache(cache_dir)
+        cache_key = cache.make_key(y, sr, _analysis_params(hop_length, tempo))
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return BeatAnalysis.from_dict(entry), True
+
+    if tempo == 'adaptive':
+        analysis = analyze_beats_adaptive(y, sr, hop_length=hop_length)
+    else:
+        analysis = analyze_beats(y, sr, hop_length=hop_length)
+    if cache is not None:
+        cache.put(cache_key, analysis.to_dict())
+    return analysis, False
+
+
+def analyze_media_chunked_cached(media_path: str,
+                                 cache_dir: Optional[str] = None,
+                                 sr: int = ANALYSIS_SAMPLE_RATE,
+                                 hop_length: int = ANALYSIS_HOP_LENGTH,
+                                 tempo: str = 'global') -> Tuple[BeatAnalysis, bool]:
+    """
+    分块流式分析媒体文件的音轨, 使用缓存时先流式解码一遍计算缓存键
+
+    Returns:
+        (分析结果, 是否命中缓存)
+    """
+    cache = None
+    if cache_dir:
+        cache = BeatCache(cache_dir)
+        params = dict(_analysis_params(hop_length, tempo), mode='chunked',
+                      window=CHUNK_WINDOW_SECONDS, overlap=CHUNK_OVERLAP_SECONDS)
+        hasher = cache.key_hasher(sr, params)
+        for block in iter_audio_blocks(media_path, sr):
+            hasher.update(block.data)
+        cache_key = hasher.hexdigest()
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return BeatAnalysis.from_dict(entry), True
+
+    analysis = analyze_beats_chunked(media_path, sr, hop_length, tempo=tempo)
+    if cache is not None:
+        cache.put(cache_key, analysis.to_dict())
+    return analysis, False
+
+
+def detect_beats_from_audio(y: np.ndarray, sr: int, sensitivity: float = 0.5,
+                            cache_dir: Optional[str] = None,
+                            hop_length: int = ANALYSIS_HOP_LENGTH) -> Tuple[List[Tuple[float, float]], float]:
+    """
+    对内存中的音频检测节拍点，并区分重拍和弱拍
+
+    Args:
+        y: 单声道音频采样
+        sr: 采样率
+        sensitivity: 节拍检测灵敏度 (0.0-1.0), 越高检测到的节拍越多
+        cache_dir: 分析结果缓存目录, None 表示不使用缓存
+        hop_length: 分析帧移 (采样点)
+
+    Returns:
+        ((时间, 强度) 列表, 音频时长)
+    """
     try:
         print("🎵 正在分析音乐节奏和强度...")
+        analysis, cached = analyze_audio_cached(y, sr, cache_dir=cache_dir, hop_length=hop_length)
+        if cached:
+            print("   使用缓存的节拍分析结果")
+        return _report_beats(analysis, sensitivity)
 
-        # 加载音频
-        y, sr = librosa.load(audio_path)
-        duration = len(y) / sr
+    except Exception as e:
+        print(f"❌ 节拍检测失败: {e}")
+        return [], 0.0
 
-        # 检测节拍
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
 
-        # 将帧转换为时间(秒)
-        beat_times = librosa.frames_to_time(beats, sr=sr)
+def detect_beats_chunked(media_path: str, sensitivity: float = 0.5,
+                         cache_dir: Optional[str] = None,
+                         sr: int = ANALYSIS_SAMPLE_RATE,
+                         hop_length: int = ANALYSIS_HOP_LENGTH) -> Tuple[List[Tuple[float, float]], float]:
+    """
+    分块流式检测长音频的节拍点 (峰值内存恒定)
 
-        # 计算节拍强度
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        beat_frames = librosa.time_to_frames(beat_times, sr=sr)
-        beat_strength = onset_env[beat_frames]
+    使用缓存时先流式解码一遍计算缓存键, 未命中再做分块分析。
 
-        # 归一化强度到 0-1 范围
-        if len(beat_strength) > 0:
-            beat_strength_normalized = (beat_strength - beat_strength.min()) / (beat_strength.max() - beat_strength.min() + 1e-8)
-        else:
-            beat_strength_normalized = beat_strength
+    Args:
+        media_path: 视频或音频文件路径
+        sensitivity: 节拍检测灵敏度 (0.0-1.0)
+        cache_dir: 分析结果缓存目录, None 表示不使用缓存
+        sr: 分析采样率
+        hop_length: 分析帧移 (采样点)
 
-        # 根据灵敏度过滤节拍
-        if sensitivity < 1.0:
-            threshold = np.percentile(beat_strength_normalized, (1 - sensitivity) * 100)
-            mask = beat_strength_normalized >= threshold
-            beat_times = beat_times[mask]
-            beat_strength_normalized = beat_strength_normalized[mask]
+    Returns:
+        ((时间, 强度) 列表, 音频时长)
+    """
+    try:
+        print("🎵 正在分块分析音乐节奏和强度...")
+        analysis, cached = analyze_media_chunked_cached(media_path, cache_dir=cache_dir,
+                                                        sr=sr, hop_length=hop_length)
+        if cached:
+            print("   使用缓存的节拍分析结果")
+        return _report_beats(analysis, sensitivity)
 
-        # 组合时间和强度
-        beats_with_strength = list(zip(beat_times, beat_strength_normalized))
+    except Exception as e:
+        print(f"❌ 节拍检测失败: {e}")
+        return [], 0.0
+
+
+def _report_beats(analysis: BeatAnalysis, sensitivity: float) -> Tuple[List[Tuple[float, float]], float]:
+    """按灵敏度过滤节拍并打印统计信息"""
+    beats_with_strength = filter_beats(analysis, sensitivity)
+
+    # 统计重拍数量
+    strong_beats = sum(1 for _, strength in beats_with_strength if strength > STRONG_BEAT_THRESHOLD)
+    print(f"✅ 检测到 {len(beats_with_strength)} 个节拍点 (BPM: {analysis.tempo:.1f})")
+    print(f"   其中重拍: {strong_beats} 个")
+
+    return beats_with_strength, analysis.duration
 
-        # 统计重拍数量
-        strong_beats = sum(1 for _, strength in beats_with_strength if strength > 0.6)
-        print(f"✅ 检测到 {len(beats_with_strength)} 个节拍点 (BPM: {float(tempo):.1f})")
-        print(f"   其中重拍: {strong_beats} 个")
 
-        return beats_with_strength, duration
+def detect_beats_with_strength(audio_path: str, sensitivity: float = 0.5,
+                               cache_dir: Optional[str] = None,
+                               sr: int = ANALYSIS_SAMPLE_RATE,
+                               hop_length: int = ANALYSIS_HOP_LENGTH) -> Tuple[List[Tuple[float, float]], float]:
+    """
+    检测音频文件中的节拍点，并区分重拍和弱拍
+
+    Args:
+        audio_path: 音频文件路径
+        sensitivity: 节拍检测灵敏度 (0.0-1.0), 越高检测到的节拍越多
+        cache_dir: 分析结果缓存目录, None 表示不使用缓存
+        sr: 分析采样率
+        hop_length: 分析帧移 (采样点)
 
+    Returns:
+        ((时间, 强度) 列表, 音频时长)
+    """
+    import librosa
+
+    try:
+        # 加载音频
+        y, sr = librosa.load(audio_path, sr=sr)
     except Exception as e:
         print(f"❌ 节拍检测失败: {e}")
         return [], 0.0
 
+    return detect_beats_from_audio(y, sr, sensitivity, cache_dir=cache_dir,
+                                   hop_length=hop_length)
+
+
+@dataclass
+class ZoomSchedule:
+    """
+    逐帧缩放计划
+
+    Attributes:
+        fps: 帧率
+        frame_times: 每帧时间(秒), shape (n,)
+        zoom: 每帧缩放因子, shape (n,)
+        rects: 每帧裁剪区域 (x1, y1, x2, y2), shape (n, 4)
+        active: 每帧是否需要裁剪缩放, shape (n,)
+    """
+    fps: float
+    frame_times: np.ndarray
+    zoom: np.ndarray
+    rects: np.ndarray
+    active: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.frame_times)
+
+    def index_at(self, t: float) -> int:
+        """时间点 t 对应的计划帧序号"""
+        i = int(round(t * self.fps))
+        return min(max(i, 0), len(self.frame_times) - 1)
+
+
+def compute_beat_peaks(beat_strengths: Sequence[float],
+                       zoom_min: float, zoom_max: float,
+                       downbeats: Optional[Sequence[bool]] = None) -> np.ndarray:
+    """
+    根据节拍强度计算每个节拍的峰值缩放
+
+    重拍（强度>0.6, 或小节第一拍）: zoom_min 到 zoom_max
+    弱拍（强度<=0.6）: zoom_min 到 zoom_min + (zoom_max - zoom_min) * 0.6
+    """
+    strengths = np.asarray(beat_strengths, dtype=np.float64)
+    strong = strengths > STRONG_BEAT_THRESHOLD
+    if downbeats is not None:
+        strong |= np.asarray(downbeats, dtype=bool)
+    weak_peak = zoom_min + (zoom_max - zoom_min) * WEAK_BEAT_ZOOM_RATIO
+    return np.where(strong, zoom_max, weak_peak)
+
+
+def accent_peaks(accents: Sequence[float], zoom_min: float, zoom_max: float,
+                 downbeats: Optional[Sequence[bool]] = None) -> np.ndarray:
+    """
+    按重音等级连续缩放每个节拍的峰值
+
+    等级 0 的节拍峰值为 zoom_min + (zoom_max - zoom_min) * 0.3, 等级 1 为 zoom_max,
+    小节第一拍总是 zoom_max。
+    """
+    accents = np.clip(np.asarray(accents, dtype=np.float64), 0.0, 1.0)
+    level = ACCENT_ZOOM_FLOOR + (1.0 - ACCENT_ZOOM_FLOOR) * accents
+    if downbeats is not None:
+        level = np.where(np.asarray(downbeats, dtype=bool), 1.0, level)
+    return zoom_min + (zoom_max - zoom_min) * level
+
+
+# 时间线文件格式版本
+TIMELINE_VERSION = 1
+
+
+@dataclass
+class ZoomTimeline:
+    """
+    缩放关键帧时间线: 渲染所需的全部节拍信息, 可保存为 JSON 或 .npz,
+    渲染时直接读取, 无需再分析音频
+
+    Attributes:
+        beat_times: 节拍时间(秒)
+        beat_strengths: 归一化节拍强度 (0-1)
+        beat_peaks: 每个节拍的峰值缩放比例
+        zoom_min: 最小(静止)缩放比例
+        zoom_duration: 每次缩放从峰值衰减到 zoom_min 的时长(秒)
+        duration: 音频时长(秒)
+        downbeats: 每个节拍是否为小节第一拍, None 表示未检测
+    """
+    beat_times: np.ndarray
+    beat_strengths: np.ndarray
+    beat_peaks: np.ndarray
+    zoom_min: float
+    zoom_duration: float
+    duration: float
+    downbeats: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.beat_times)
+
+    def save(self, path: str) -> None:
+        """按扩展名保存为 .npz 或 JSON (每个节拍一个对象, 便于手工编辑)"""
+        if path.endswith('.npz'):
+            optional = {}
+            if self.downbeats is not None:
+                optional['downbeats'] = np.asarray(self.downbeats, dtype=bool)
+            np.savez(path, version=np.int64(TIMELINE_VERSION),
+                     beat_times=np.asarray(self.beat_times, dtype=np.float64),
+                     beat_strengths=np.asarray(self.beat_strengths, dtype=np.float64),
+                     beat_peaks=np.asarray(self.beat_peaks, dtype=np.float64),
+                     zoom_min=np.float64(self.zoom_min),
+                     zoom_duration=np.float64(self.zoom_duration),
+                     duration=np.float64(self.duration),
+                     **optional)
+            return
+
+        header = {
+            'version': TIMELINE_VERSION,
+            'zoom_min': float(self.zoom_min),
+            'zoom_duration': float(self.zoom_duration),
+            'duration': float(self.duration),
+        }
+        downbeats = (np.zeros(len(self), dtype=bool) if self.downbeats is None
+                     else np.asarray(self.downbeats, dtype=bool))
+        beats = []
+        for t, s, z, downbeat in zip(self.beat_times, self.beat_strengths,
+                                     self.beat_peaks, downbeats):
+            beat = {'time': round(float(t), 6), 'strength': round(float(s), 4),
+                    'zoom': round(float(z), 4)}
+            if downbeat:
+                beat['downbeat'] = True
+            beats.append(json.dumps(beat))
+        # 每个节拍占一行
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header)[:-1] + ', "beats": [\n  ')
+            f.write(',\n  '.join(beats))
+            f.write('\n]}\n')
+
+    @classmethod
+    def load(cls, path: str) -> 'ZoomTimeline':
+        """
+        读取 .npz 或 JSON 时间线, 节拍按时间排序
+
+        JSON 中每个节拍至少需要 time 和 zoom, strength 可省略 (默认 1.0),
+        小节第一拍可标记 "downbeat": true
+
+        Raises:
+            ValueError: 格式不正确或版本不支持
+        """
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                data = {name: data[name] for name in data.files}
+            beat_times = data['beat_times']
+            beat_strengths = data['beat_strengths']
+            beat_peaks = data['beat_peaks']
+            downbeats = data.get('downbeats')
+        else:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            beats = data.get('beats', [])
+            try:
+                beat_times = [beat['time'] for beat in beats]
+                beat_peaks = [beat['zoom'] for beat in beats]
+            except (KeyError, TypeError):
+                raise ValueError("时间线中的每个节拍都需要 time 和 zoom 字段")
+            beat_strengths = [beat.get('strength', 1.0) for beat in beats]
+            downbeats = [bool(beat.get('downbeat', False)) for beat in beats]
+            if not any(downbeats):
+                downbeats = None
+
+        version = int(data.get('version', TIMELINE_VERSION))
+        if version > TIMELINE_VERSION:
+            raise ValueError(f"不支持的时间线版本: {version}")
+
+        beat_times = np.asarray(beat_times, dtype=np.float64)
+        order = np.argsort(beat_times, kind='stable')
+        beat_times = beat_times[order]
+        timeline = cls(
+            beat_times=beat_times,
+            beat_strengths=np.asarray(beat_strengths, dtype=np.float64)[order],
+            beat_peaks=np.asarray(beat_peaks, dtype=np.float64)[order],
+            zoom_min=float(data.get('zoom_min', 1.0)),
+            zoom_duration=float(data.get('zoom_duration', 0.2)),
+            duration=float(data.get('duration', beat_times[-1] if len(beat_times) else 0.0)),
+            downbeats=None if downbeats is None else np.asarray(downbeats, dtype=bool)[order],
+        )
+        if timeline.zoom_duration <= 0 or np.any(timeline.beat_peaks <= 0):
+            raise ValueError("缩放比例和持续时间必须为正数")
+        return timeline
+
+
+def build_zoom_schedule(frame_times: Sequence[float], fps: float,
+                        beat_times: Sequence[float], beat_peaks: Sequence[float],
+                        size: Tuple[int, int],
+                        zoom_min: float = 1.0,
+                        zoom_duration: float = 0.2,
+                        centers: Optional[np.ndarray] = None,
+                        crop_size: Optional[Tuple[int, int]] = None) -> ZoomSchedule:
+    """
+    一次性向量化计算所有帧的缩放因子和裁剪区域
+
+    对排好序的节拍数组做 searchsorted, 取每帧左右两侧节拍中较近者
+    (距离相同时取较早的节拍), 在 zoom_duration 内从峰值线性衰减到 zoom_min。
+    提供 centers 时裁剪区域以主体位置为中心, 并限制在画面之内
+    (缩放越小可偏移的范围越小, 缩放结束时自然回到完整画面)。
+    提供 crop_size 时以该尺寸 (如竖屏输出的 9:16 区域) 代替完整画面作为不缩放时的裁剪区域,
+    此时每一帧都需要裁剪。
+
+    Args:
+        frame_times: 每帧时间(秒)
+        fps: 帧率
+        beat_times: 节拍时间点
+        beat_peaks: 每个节拍的峰值缩放比例
+        size: 画面尺寸 (w, h)
+        zoom_min: 最小缩放比例
+        zoom_duration: 缩放持续时间(秒)
+        centers: 每帧裁剪中心的归一化坐标 (cx, cy), shape (len(frame_times), 2);
+            None 表示居中裁剪
+        crop_size: 缩放为 zoom_min 时的裁剪区域尺寸 (cw, ch), 不超过 size; None 表示完整画面
+
+    Returns:
+        ZoomSchedule
+    """
+    w, h = size
+    t = np.asarray(frame_times, dtype=np.float64)
+    beats = np.asarray(beat_times, dtype=np.float64)
+    peaks = np.asarray(beat_peaks, dtype=np.float64)
+
+    zoom = np.full(len(t), zoom_min, dtype=np.float64)
+    if len(beats) > 0 and len(t) > 0 and zoom_duration > 0:
+        order = np.argsort(beats, kind='stable')
+        beats = beats[order]
+        peaks = peaks[order]
+
+        # beats[idx-1] < t <= beats[idx]
+        idx = np.searchsorted(beats, t)
+        left = np.clip(idx - 1, 0, len(beats) - 1)
+        right = np.clip(idx, 0, len(beats) - 1)
+        dist_left = np.abs(t - beats[left])
+        dist_right = np.abs(beats[right] - t)
+        use_right = dist_right < dist_left
+        nearest = np.where(use_right, right, left)
+        dist = np.where(use_right, dist_right, dist_left)
+
+        peak = peaks[nearest]
+        progress = dist / zoom_duration
+        zoom = np.where(dist < zoom_duration, peak - (peak - zoom_min) * progress, zoom)
+
+    active = zoom > zoom_min * ZOOM_APPLY_RATIO
+
+    cw, ch = crop_size or size
+    if (cw, ch) != (w, h):
+        active[:] = True
+    new_w = (cw / zoom).astype(np.int64)
+    new_h = (ch / zoom).astype(np.int64)
+    if centers is None:
+        # 居中裁剪区域
+        x1 = (w - new_w) // 2
+        y1 = (h - new_h) // 2
+    else:
+        centers = np.asarray(centers, dtype=np.float64)
+        x1 = np.clip(np.round(centers[:, 0] * w - new_w / 2).astype(np.int64), 0, w - new_w)
+        y1 = np.clip(np.round(centers[:, 1] * h - new_h / 2).astype(np.int64), 0, h - new_h)
+    rects = np.stack([x1, y1, x1 + new_w, y1 + new_h], axis=1)
+
+    return ZoomSchedule(fps=fps, frame_times=t, zoom=zoom, rects=rects, active=active)
+
+
+# 最终输出的默认编码参数 (archive 档案: H.264 slow, CRF 18)
+OUTPUT_VIDEO_PARAMS = EncoderSettings('archive').video_params()
+
+# 预览模式的编码参数 (draft 档案: 最快速度, 画质够用即可)
+PREVIEW_VIDEO_PARAMS = EncoderSettings('draft').video_params()
+# 预览画面高度与帧率上限
+PREVIEW_HEIGHT = 360
+PREVIEW_FPS = 15.0
+
+
+def get_ffmpeg_binary() -> str:
+    """获取 ffmpeg 可执行文件路径 (优先使用 moviepy 配置的版本)"""
+    try:
+        from moviepy.config import FFMPEG_BINARY
+        return FFMPEG_BINARY
+    except ImportError:
+        return 'ffmpeg'
+
+
+def probe_media(path: str) -> dict:
+    """
+    读取媒体文件的流信息 (解析 `ffmpeg -i` 的输出)
+
+    Returns:
+        {'duration': 时长(秒), 'video_size': (w, h), 'video_fps': 帧率,
+         'video_codec': 视频编码名, 'audio_codec': 音频编码名}, 缺失的流对应字段为 None
+    """
+    result = subprocess.run([get_ffmpeg_binary(), '-hide_banner', '-i', path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode('utf-8', errors='replace')
+
+    duration = None
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', info)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    video_size = None
+    video_fps = None
+    video_codec = None
+    match = re.search(r'Stream #\S+.*?: Video: .*', info)
+    if match:
+        line = match.group(0)
+        codec_match = re.match(r'.*?: Video: (\w+)', line)
+        if codec_match:
+            video_codec = codec_match.group(1)
+        size_match = re.search(r', (\d{2,5})x(\d{2,5})\b', line)
+        if size_match:
+            video_size = (int(size_match.group(1)), int(size_match.group(2)))
+        fps_match = re.search(r'([\d.]+)(k?) (?:fps|tbr)', line)
+        if fps_match:
+            video_fps = float(fps_match.group(1)) * (1000 if fps_match.group(2) else 1)
+
+    audio_codec = None
+    match = re.search(r'Stream #\S+.*?: Audio: (\w+)', info)
+    if match:
+        audio_codec = match.group(1)
+
+    return {'duration': duration, 'video_size': video_size, 'video_fps': video_fps,
+            'video_codec': video_codec, 'audio_codec': audio_codec}
+
+
+def _read_exact(stream, buffer: np.ndarray) -> int:
+    """从管道读满 buffer, 返回实际读取的字节数 (到达流结尾时可能不足)"""
+    view = memoryview(buffer).cast('B')
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def iter_video_frames(video_path: str, size: Tuple[int, int], fps: float,
+                      start: float = 0.0,
+                      end: Optional[float] = None,
+                      buffers: int = 1,
+                      filters: Sequence[str] = (),
+                      input_args: Sequence[str] = ()) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    顺序解码视频流, 按显示顺序逐帧产出 (时间戳, RGB 帧)
+
+    通过 ffmpeg 管道输出原始帧, 不做随机访问和帧率重采样;
+    时间戳取自 showinfo 滤镜报告的真实 pts_time。
+    帧直接读入预先分配的缓冲区并轮换使用, 产出的帧在之后再读取
+    `buffers` 帧之前保持有效; 需要长期保留时请自行复制。
+
+    Args:
+        video_path: 视频路径
+        size: 画面尺寸 (w, h)
+        fps: 标称帧率, 仅在时间戳缺失时用于推算
+        start: 起始时间(秒), 大于 0 时从该位置开始解码 (应落在关键帧上)
+        end: 结束时间(秒), 只产出时间戳小于该值的帧; None 表示到流结尾
+        buffers: 轮换使用的帧缓冲区个数
+        filters: 在解码端先执行的 ffmpeg 滤镜 (如缩小画面、降低帧率),
+            size 和 fps 应为滤镜处理后的值
+        input_args: 放在 -i 之前的 ffmpeg 输入参数 (如 ['-re'] 按实时速度读取,
+            ['-f', 'v4l2'] 读取摄像头)
+
+    Yields:
+        (时间戳(秒), (h, w, 3) uint8 RGB 帧)
+    """
+    w, h = size
+    frame_bytes = w * h * 3
+    pool = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(max(buffers, 1))]
+    cmd = [get_ffmpeg_binary(), '-hide_banner', '-nostats', '-loglevel', 'info']
+    if start > 0:
+        # 输入端定位, 输出时间戳从 0 开始, 需加回 start
+        cmd += ['-ss', f'{start:.6f}']
+    cmd += [
+        *input_args, '-i', video_path, '-map', '0:v:0', '-an', '-sn',
+        '-vf', ','.join([*filters, 'showinfo']), '-vsync', 'passthrough',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-',
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # showinfo 的日志写在 stderr, 在后台线程中解析出每帧的时间戳
+    timestamps = queue.Queue()
+
+    def read_timestamps():
+        for line in proc.stderr:
+            match = re.search(rb'pts_time:\s*(\S+)', line)
+            if match:
+                try:
+                    timestamps.put(float(match.group(1)))
+                except ValueError:
+                    timestamps.put(None)
+
+    reader = threading.Thread(target=read_timestamps, daemon=True)
+    reader.start()
+
+    try:
+        index = 0
+        last_t = None
+        while True:
+            frame = pool[index % len(pool)]
+            if _read_exact(proc.stdout, frame) < frame_bytes:
+                break
+            try:
+                t = timestamps.get(timeout=5.0)
+            except queue.Empty:
+                t = None
+            if t is None:
+                t = index / fps if last_t is None else last_t + 1.0 / fps
+            last_t = t
+            t += start
+            if end is not None and t >= end:
+                break
+            yield t, frame
+            index += 1
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        reader.join(timeout=1.0)
+
+
+def track_subject(video_path: str, size: Tuple[int, int],
+                  fps: float = TRACK_FPS, width: int = TRACK_WIDTH) -> SubjectTrack:
+    """
+    在低帧率、缩小的灰度画面上跟踪运动主体
+
+    解码端跳过不被参考的帧 (-skip_frame noref) 并直接输出小尺寸灰度图,
+    耗时只是完整解码的一部分, 远小于渲染本身。
+
+    Args:
+        video_path: 视频路径
+        size: 原画面尺寸 (w, h)
+        fps: 跟踪帧率
+        width: 跟踪画面宽度(像素)
+
+    Raises:
+        RuntimeError: ffmpeg 解码失败
+    """
+    tw, th = track_size(size, width)
+    cmd = [
+        get_ffmpeg_binary(), '-hide_banner', '-nostats', '-loglevel', 'error',
+        '-skip_frame', 'noref', '-i', video_path, '-map', '0:v:0', '-an', '-sn',
+        '-vf', f'fps={fps:g},scale={tw}:{th}:flags=area',
+        '-f', 'rawvideo', '-pix_fmt', 'gray', '-',
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr 在后台读取, 避免管道写满阻塞 ffmpeg
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+    reader.start()
+
+    tracker = MotionTracker(fps)
+    frame = np.empty((th, tw), dtype=np.uint8)
+    try:
+        while _read_exact(proc.stdout, frame) == frame.nbytes:
+            tracker.update(frame)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+        reader.join(timeout=1.0)
+    if proc.returncode != 0:
+        message = errors[0].decode('utf-8', 'replace').strip() if errors else ''
+        raise RuntimeError(f"主体跟踪解码失败: {message[-500:]}")
+    return tracker.finish()
+
+
+def track_subject_cached(video_path: str, size: Tuple[int, int],
+                         cache_dir: Optional[str] = None) -> Tuple[SubjectTrack, bool]:
+    """
+    跟踪运动主体, 使用缓存时以视频文件内容和跟踪参数为键
+
+    Returns:
+        (主体轨迹, 是否命中缓存)
+    """
+    cache = None
+    if cache_dir:
+        cache = BeatCache(cache_dir)
+        cache_key = cache.make_file_key(video_path, {'mode': 'subject', 'fps': TRACK_FPS,
+                                                     'width': TRACK_WIDTH})
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return SubjectTrack.from_dict(entry), True
+
+    track = track_subject(video_path, size)
+    if cache is not None:
+        cache.put(cache_key, track.to_dict())
+    return track, False
+
+
+class FFmpegVideoWriter:
+    """
+    单进程编码器: 把处理后的原始 RGB 帧通过管道送入 ffmpeg,
+    在同一次编码中混入原视频的音轨 (编码兼容时直接复制音频流)。
+    """
+
+    def __init__(self, output_path: str, size: Tuple[int, int], fps: float,
+                 audio_source: Optional[str] = None,
+                 audio_codec: Optional[str] = None,
+                 threads: Optional[int] = None,
+                 audio_start: float = 0.0,
+                 audio_duration: Optional[float] = None,
+                 video_params: Sequence[str] = OUTPUT_VIDEO_PARAMS):
+        """
+        Args:
+            output_path: 输出视频路径
+            size: 画面尺寸 (w, h)
+            fps: 帧率
+            audio_source: 提供音轨的文件 (通常为原视频), None 表示无音频
+            audio_codec: 音轨的原始编码, 用于判断能否直接复制
+            threads: 编码线程数, None 表示由编码器自动决定
+            audio_start: 音轨的起始时间(秒), 只渲染部分时间段时使用
+            audio_duration: 音轨时长(秒), None 表示到结尾
+            video_params: 视频编码参数
+        """
+        w, h = size
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}', '-r', f'{fps}',
+            '-i', '-',
+        ]
+        if audio_source is not None:
+            if audio_start > 0:
+                cmd += ['-ss', f'{audio_start:.6f}']
+            if audio_duration is not None:
+                cmd += ['-t', f'{audio_duration:.6f}']
+            cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0']
+            cmd += audio_codec_params(audio_codec, container_for(output_path))
+        cmd += list(video_params)
+        if threads is not None:
+            cmd += ['-threads', str(threads)]
+        cmd += [output_path]
+
+        self.output_path = output_path
+        self._frame_bytes = w * h * 3
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def queue_depth(self) -> Optional[float]:
+        """编码器输入管道中尚未被读取的帧数 (无法获取时返回 None)"""
+        try:
+            import fcntl
+            import termios
+            buf = fcntl.ioctl(self._proc.stdin.fileno(), termios.FIONREAD, b'\0\0\0\0')
+        except (ImportError, OSError, ValueError):
+            return None
+        return int.from_bytes(buf, sys.byteorder) / self._frame_bytes
+
+    def write(self, frame: np.ndarray) -> None:
+        """写入一帧 (h, w, 3) uint8 RGB 图像"""
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            # 编码进程已退出, 由 close() 报告 ffmpeg 的错误信息
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """结束输入并等待编码完成, 失败时抛出 RuntimeError"""
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._proc.wait()
+        self._stderr.seek(0)
+        message = self._stderr.read().decode('utf-8', errors='replace').strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败 (退出码 {returncode}): {message[-2000:]}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._proc.kill()
+            self._proc.wait()
+            self._stderr.close()
+
+
+def probe_keyframes(video_path: str) -> np.ndarray:
+    """
+    获取视频流中所有关键帧的时间戳 (只解码关键帧, 速度很快)
+
+    Returns:
+        升序排列的关键帧时间(秒)
+    """
+    cmd = [
+        get_ffmpeg_binary(), '-hide_banner', '-nostats', '-loglevel', 'info',
+        '-skip_frame', 'nokey', '-i', video_path, '-map', '0:v:0', '-an', '-sn',
+        '-vf', 'showinfo', '-vsync', 'passthrough', '-f', 'null', '-',
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    times = [float(t) for t in re.findall(rb'pts_time:\s*(-?[\d.]+)', result.stderr)]
+    return np.unique(np.array(times, dtype=np.float64))
+
+
+def plan_segments(keyframes: np.ndarray, duration: float,
+                  n_segments: int) -> List[Tuple[float, Optional[float]]]:
+    """
+    把时间轴切成约等长、边界落在关键帧(GOP 起点)上的片段
+
+    Returns:
+        [(起始时间, 结束时间), ...], 最后一段结束时间为 None
+    """
+    keyframes = keyframes[keyframes > 0]
+    if n_segments <= 1 or len(keyframes) == 0:
+        return [(0.0, None)]
+
+    targets = duration * np.arange(1, n_segments) / n_segments
+    nearest = np.abs(keyframes[None, :] - targets[:, None]).argmin(axis=1)
+    bounds = [float(b) for b in np.unique(keyframes[nearest])]
+    return list(zip([0.0] + bounds, bounds + [None]))
+
+
+# 缩放插值质量 → OpenCV 插值方式
+QUALITY_INTERPOLATION = {
+    'fast': 'INTER_LINEAR',
+    'balanced': 'INTER_CUBIC',
+    'best': 'INTER_LANCZOS4',
+}
+
+
+class FrameTransformer:
+    """
+    逐帧裁剪缩放引擎
+
+    - 未缩放的帧原样返回 (RGB 即编码器输入格式, 不转换色彩、不复制)
+    - 缩放帧对裁剪区域的视图做一次缩放, 直接写入预先分配的输出缓冲区
+    稳态下每帧没有新的内存分配。
+    """
+
+    def __init__(self, size: Tuple[int, int], quality: str = 'best', buffers: int = 1):
+        """
+        Args:
+            size: 输出画面尺寸 (w, h)
+            quality: 插值质量 fast / balanced / best
+            buffers: 轮换使用的输出缓冲区个数
+        """
+        import cv2
+
+        if quality not in QUALITY_INTERPOLATION:
+            raise ValueError(f"未知的插值质量: {quality}")
+        w, h = size
+        self.size = (w, h)
+        self.interpolation = getattr(cv2, QUALITY_INTERPOLATION[quality])
+        self._resize = cv2.resize
+        self._outputs = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(max(buffers, 1))]
+        self._next = 0
+
+    def transform(self, frame: np.ndarray, rect: Sequence[int], active: bool) -> np.ndarray:
+        """
+        Args:
+            frame: (h, w, 3) RGB 帧
+            rect: 裁剪区域 (x1, y1, x2, y2)
+            active: 是否需要裁剪缩放
+
+        Returns:
+            处理后的帧 (未缩放时就是输入帧本身)
+        """
+        if not active:
+            return frame
+        x1, y1, x2, y2 = rect
+        out = self._outputs[self._next]
+        self._next = (self._next + 1) % len(self._outputs)
+        return self._resize(frame[y1:y2, x1:x2], self.size, dst=out,
+                            interpolation=self.interpolation)
+
+
+# 帧源: 视频文件路径, (n, h, w, 3) uint8 RGB 数组, 或 (时间戳, 帧) 的可迭代对象
+FrameSource = Union[str, np.ndarray, Iterable[Tuple[float, np.ndarray]]]
+
+
+def iter_frame_source(source: FrameSource, size: Tuple[int, int], fps: float,
+                      start: float = 0.0, end: Optional[float] = None,
+                      filters: Sequence[str] = ()) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    把各种帧源统一为 (时间戳, RGB 帧) 序列
+
+    视频路径交给 iter_video_frames 解码 (filters 只对这种帧源有效);
+    数组按 i / fps 计算时间戳; 只产出 [start, end) 内的帧。
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield from iter_video_frames(os.fspath(source), size, fps, start=start, end=end,
+                                     filters=filters)
+        return
+    if isinstance(source, np.ndarray):
+        source = ((i / fps, frame) for i, frame in enumerate(source))
+    for t, frame in source:
+        if t < start:
+            continue
+        if end is not None and t >= end:
+            break
+        yield t, frame
+
+
+def add_stage_time(stages: dict, name: str, seconds: float) -> None:
+    """累加某个处理阶段的耗时(秒)"""
+    stages[name] = stages.get(name, 0.0) + seconds
+
+
+# 流水线渲染时各级队列的容量 (决定同时在途的帧数, 4K 下每帧约 25MB)
+RENDER_QUEUE_DEPTH = 2
+# 流水线队列的轮询间隔(秒), 用于在其他线程出错时及时退出
+_QUEUE_POLL_SECONDS = 0.1
+# 队列结束标记
+_END_OF_STREAM = object()
+
+
+def _queue_put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """阻塞放入队列 (背压); stop 被设置 (其他线程出错) 时放弃, 返回 False"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _queue_get(q: queue.Queue, stop: threading.Event):
+    """阻塞取出队列中的一项; stop 被设置时返回 _END_OF_STREAM"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _END_OF_STREAM
+
+
+def render_frames(source: FrameSource, schedule: ZoomSchedule,
+                  size: Tuple[int, int], fps: float, writer: 'FFmpegVideoWriter',
+                  start: float = 0.0, end: Optional[float] = None,
+                  profiler: Optional[Profiler] = None,
+                  quality: str = 'best',
+                  stages: Optional[dict] = None,
+                  filters: Sequence[str] = (),
+                  pipelined: Optional[bool] = None,
+                  record: Optional[Callable[[float, np.ndarray], None]] = None) -> int:
+    """
+    按缩放计划顺序渲染 [start, end) 内的帧并写入编码器
+
+    默认以三级流水线运行: 读取线程解码 → 工作线程缩放 (OpenCV 会释放 GIL)
+    → 当前线程写入编码器, 各级之间用容量为 RENDER_QUEUE_DEPTH 的队列连接,
+    下游跟不上时上游阻塞, 在途帧数和内存占用有固定上限。
+
+    Args:
+        source: 帧源 (视频路径、帧数组或 (时间戳, 帧) 序列), 见 iter_frame_source
+        schedule: 逐帧缩放计划
+        size: 画面尺寸 (w, h)
+        fps: 帧率
+        writer: 编码器
+        start: 起始时间(秒)
+        end: 结束时间(秒), None 表示到流结尾
+        profiler: 提供时每 PROGRESS_INTERVAL 帧上报一次进度 (帧率、剩余时间、编码器队列深度)
+        quality: 缩放插值质量 fast / balanced / best
+        stages: 提供时累加各阶段耗时(秒): decode / frame_transform / encode
+            (流水线模式下为各线程的忙碌时间, 彼此重叠)
+        filters: 解码端的 ffmpeg 滤镜, 见 iter_video_frames
+        pipelined: False 时在当前线程中串行处理; None 表示多核时使用流水线
+            (单核上线程切换只会增加开销)
+        record: 提供时对每个解码出的帧调用 record(时间戳, 帧) (如写入解码帧缓存),
+            在解码线程中、缩放之前调用
+
+    Returns:
+        渲染的帧数
+    """
+    if pipelined is None:
+        pipelined = (os.cpu_count() or 1) > 1
+    if not pipelined:
+        return _render_frames_serial(source, schedule, size, fps, writer, start, end,
+                                     profiler, quality, stages, filters, record)
+
+    depth = RENDER_QUEUE_DEPTH
+    # 解码缓冲区轮换使用: 读取中 1 帧 + 两级队列 + 缩放线程和写入线程各持有 1 帧
+    decode_buffers = 2 * depth + 3
+    # 缩放输出缓冲区: 缩放中 1 帧 + 写入队列 + 写入线程持有 1 帧
+    transformer = FrameTransformer(size, quality, buffers=depth + 2)
+    if isinstance(source, (str, os.PathLike)):
+        frames = iter_video_frames(os.fspath(source), size, fps, start=start, end=end,
+                                   buffers=decode_buffers, filters=filters)
+    else:
+        frames = iter_frame_source(source, size, fps, start=start, end=end)
+
+    decoded = queue.Queue(maxsize=depth)
+    transformed = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    errors = []
+    busy = {'decode': 0.0, 'frame_transform': 0.0}
+    clock = time.perf_counter
+
+    def decode_worker():
+        try:
+            iterator = iter(frames)
+            while True:
+                t_start = clock()
+                item = next(iterator, _END_OF_STREAM)
+                if record is not None and item is not _END_OF_STREAM:
+                    record(*item)
+                busy['decode'] += clock() - t_start
+                if item is _END_OF_STREAM or not _queue_put(decoded, item, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            close = getattr(frames, 'close', None)
+            if close is not None:
+                close()
+            _queue_put(decoded, _END_OF_STREAM, stop)
+
+    def transform_worker():
+        try:
+            rects = schedule.rects
+            active = schedule.active
+            while True:
+                item = _queue_get(decoded, stop)
+                if item is _END_OF_STREAM:
+                    break
+                t, frame = item
+                t_start = clock()
+                # 按真实时间戳查表
+                k = schedule.index_at(t)
+                out = transformer.transform(frame, rects[k], active[k])
+                busy['frame_transform'] += clock() - t_start
+                if not _queue_put(transformed, out, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _queue_put(transformed, _END_OF_STREAM, stop)
+
+    threads = [threading.Thread(target=decode_worker, name='rhythm-decode', daemon=True),
+               threading.Thread(target=transform_worker, name='rhythm-transform', daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    encode_time = 0.0
+    count = 0
+    try:
+        while True:
+            out = _queue_get(transformed, stop)
+            if out is _END_OF_STREAM:
+                break
+            t_start = clock()
+            writer.write(out)
+            encode_time += clock() - t_start
+
+            count += 1
+            # 上报进度
+            if profiler is not None and count % PROGRESS_INTERVAL == 0:
+                profiler.frames(count, writer.queue_depth())
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    # 最终帧数 (总数不是 PROGRESS_INTERVAL 的整数倍时循环中没有上报)
+    if profiler is not None and count % PROGRESS_INTERVAL:
+        profiler.frames(count, writer.queue_depth())
+    if stages is not None:
+        add_stage_time(stages, 'decode', busy['decode'])
+        add_stage_time(stages, 'frame_transform', busy['frame_transform'])
+        add_stage_time(stages, 'encode', encode_time)
+    return count
+
+
+def _render_frames_serial(source: FrameSource, schedule: ZoomSchedule,
+                          size: Tuple[int, int], fps: float, writer: 'FFmpegVideoWriter',
+                          start: float, end: Optional[float],
+                          profiler: Optional[Profiler], quality: str,
+                          stages: Optional[dict], filters: Sequence[str],
+                          record: Optional[Callable[[float, np.ndarray], None]] = None) -> int:
+    """render_frames 的串行版本: 解码、缩放、编码在当前线程中依次执行"""
+    transformer = FrameTransformer(size, quality)
+    rects = schedule.rects
+    active = schedule.active
+    clock = time.perf_counter
+    decode_time = transform_time = encode_time = 0.0
+    count = 0
+    # 顺序解码, 逐帧处理 (RGB, 与编码器输入格式一致, 无需色彩转换)
+    t_prev = clock()
+    for t, frame in iter_frame_source(source, size, fps, start=start, end=end,
+                                      filters=filters):
+        if record is not None:
+            record(t, frame)
+        t_decoded = clock()
+        # 按真实时间戳查表
+        k = schedule.index_at(t)
+        out = transformer.transform(frame, rects[k], active[k])
+        t_transformed = clock()
+        writer.write(out)
+        t_encoded = clock()
+
+        decode_time += t_decoded - t_prev
+        transform_time += t_transformed - t_decoded
+        encode_time += t_encoded - t_transformed
+
+        count += 1
+        # 上报进度
+        if profiler is not None and count % PROGRESS_INTERVAL == 0:
+            profiler.frames(count, writer.queue_depth())
+        t_prev = clock()
+
+    # 最终帧数 (总数不是 PROGRESS_INTERVAL 的整数倍时循环中没有上报)
+    if profiler is not None and count % PROGRESS_INTERVAL:
+        profiler.frames(count, writer.queue_depth())
+    if stages is not None:
+        add_stage_time(stages, 'decode', decode_time)
+        add_stage_time(stages, 'frame_transform', transform_time)
+        add_stage_time(stages, 'encode', encode_time)
+    return count
+
+
+def render_targets(source: FrameSource, size: Tuple[int, int], fps: float,
+                   targets: Sequence[Tuple[ZoomSchedule, Tuple[int, int], 'FFmpegVideoWriter']],
+                   start: float = 0.0, end: Optional[float] = None,
+                   profiler: Optional[Profiler] = None,
+                   quality: str = 'best',
+                   stages: Optional[dict] = None,
+                   filters: Sequence[str] = (),
+                   record: Optional[Callable[[float, np.ndarray], None]] = None) -> int:
+    """
+    一次解码, 同时渲染多个输出目标
+
+    当前线程解码并把每一帧分发给各目标的工作线程 (容量为 RENDER_QUEUE_DEPTH 的队列),
+    每个工作线程按自己的缩放计划裁剪缩放后写入自己的编码器进程, 各编码器并行编码;
+    最慢的目标阻塞解码 (背压), 在途帧数有固定上限。
+
+    Args:
+        source: 帧源, 见 iter_frame_source
+        size: 解码画面尺寸 (w, h)
+        fps: 帧率
+        targets: 每个目标的 (缩放计划, 输出尺寸, 编码器)
+        start / end / profiler / quality / filters / record: 见 render_frames
+        stages: 提供时累加各阶段耗时(秒): decode 为解码时间,
+            frame_transform / encode 为各目标线程的忙碌时间之和
+
+    Returns:
+        解码的帧数
+    """
+    depth = RENDER_QUEUE_DEPTH
+    # 解码缓冲区: 读取中 1 帧 + 队列中的帧 + 最慢的目标线程持有 1 帧
+    decode_buffers = depth + 3
+    if isinstance(source, (str, os.PathLike)):
+        frames = iter_video_frames(os.fspath(source), size, fps, start=start, end=end,
+                                   buffers=decode_buffers, filters=filters)
+    else:
+        frames = iter_frame_source(source, size, fps, start=start, end=end)
+
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=depth) for _ in targets]
+    busy = [{'frame_transform': 0.0, 'encode': 0.0} for _ in targets]
+    clock = time.perf_counter
+
+    def target_worker(index: int):
+        schedule, output_size, writer = targets[index]
+        transformer = FrameTransformer(output_size, quality)
+        timings = busy[index]
+        try:
+            while True:
+                item = _queue_get(queues[index], stop)
+                if item is _END_OF_STREAM:
+                    break
+                t, frame = item
+                t_start = clock()
+                # 按真实时间戳查表
+                k = schedule.index_at(t)
+                out = transformer.transform(frame, schedule.rects[k], schedule.active[k])
+                t_transformed = clock()
+                writer.write(out)
+                timings['frame_transform'] += t_transformed - t_start
+                timings['encode'] += clock() - t_transformed
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=target_worker, args=(index,),
+                                name=f'rhythm-target-{index}', daemon=True)
+               for index in range(len(targets))]
+    for thread in threads:
+        thread.start()
+
+    def report(done: int) -> None:
+        """上报进度 (编码器队列深度取最满的一个)"""
+        if profiler is None:
+            return
+        depths = [d for d in (writer.queue_depth() for _, _, writer in targets) if d is not None]
+        profiler.frames(done, max(depths) if depths else None)
+
+    decode_time = 0.0
+    count = 0
+    try:
+        iterator = iter(frames)
+        while not stop.is_set():
+            t_start = clock()
+            item = next(iterator, _END_OF_STREAM)
+            if record is not None and item is not _END_OF_STREAM:
+                record(*item)
+            decode_time += clock() - t_start
+            if item is _END_OF_STREAM:
+                break
+            for q in queues:
+                _queue_put(q, item, stop)
+
+            count += 1
+            if count % PROGRESS_INTERVAL == 0:
+                report(count)
+        # 正常结束时等各目标处理完队列中剩余的帧
+        for q in queues:
+            _queue_put(q, _END_OF_STREAM, stop)
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+        close = getattr(frames, 'close', None)
+        if close is not None:
+            close()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    # 最终帧数 (总数不是 PROGRESS_INTERVAL 的整数倍时循环中没有上报)
+    if count % PROGRESS_INTERVAL:
+        report(count)
+    if stages is not None:
+        add_stage_time(stages, 'decode', decode_time)
+        for name in ('frame_transform', 'encode'):
+            add_stage_time(stages, name, sum(timings[name] for timings in busy))
+    return count
+
+
+def _render_segment(job: dict) -> Tuple[int, int, dict]:
+    """进程池任务: 渲染一个时间段并编码为无音频的片段文件"""
+    stages = {}
+    video_params = job['encoder'].video_params(job['size'], job['fps'], threads=job['threads'],
+                                               container=container_for(job['output_path']))
+    if job.get('bitstream_filter'):
+        video_params += ['-bsf:v', job['bitstream_filter']]
+    source = job['video_path']
+    recorder = None
+    if job.get('cached_frames'):
+        # 从解码帧缓存的内存映射读取本段
+        source = CachedFrames(job['cached_frames']).iter_frames(job['start'], job['end'])
+    elif job.get('frame_staging'):
+        recorder = FrameRecorder(job['frame_staging'], job['index'])
+    with FFmpegVideoWriter(job['output_path'], job['size'], job['fps'],
+                           video_params=video_params) as writer:
+        count = render_frames(source, job['schedule'], job['size'], job['fps'],
+                              writer, start=job['start'], end=job['end'],
+                              quality=job['quality'], stages=stages,
+                              pipelined=job['threads'] > 1,
+                              record=recorder.write if recorder is not None else None)
+        t_flush = time.perf_counter()
+    if recorder is not None:
+        recorder.close()
+    add_stage_time(stages, 'encode', time.perf_counter() - t_flush)
+    return job['index'], count, stages
+
+
+def concat_segments(segment_paths: List[str], output_path: str, workdir: str,
+                    audio_source: Optional[str] = None,
+                    audio_codec: Optional[str] = None,
+                    encoder: Optional[EncoderSettings] = None) -> None:
+    """
+    用 concat demuxer 无损拼接视频片段 (视频流直接复制), 并混入原音轨
+
+    encoder 为片段的编码设置, 用于添加输出容器需要的封装参数
+
+    Raises:
+        RuntimeError: ffmpeg 执行失败
+    """
+    list_path = os.path.join(workdir, 'segments.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+           '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_source is not None:
+        cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a:0']
+        cmd += audio_codec_params(audio_codec, container_for(output_path))
+    cmd += ['-c:v', 'copy'] + (encoder or EncoderSettings()).container_params(container_for(output_path))
+    cmd += [output_path]
+
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"ffmpeg 拼接失败 (退出码 {result.returncode}): {message[-2000:]}")
+
+
+def render_parallel(video_path: str, output_path: str, schedule: ZoomSchedule,
+                    size: Tuple[int, int], fps: float, duration: float,
+                    workers: int, workdir: str,
+                    audio_source: Optional[str] = None,
+                    audio_codec: Optional[str] = None,
+                    quality: str = 'best',
+                    stages: Optional[dict] = None,
+                    profiler: Optional[Profiler] = None,
+                    encoder: Optional[EncoderSettings] = None,
+                    cached_frames: Optional[str] = None,
+                    frame_staging: Optional[str] = None) -> int:
+    """
+    多进程分段渲染: 按关键帧切分时间轴, 各片段在进程池中渲染编码,
+    最后无损拼接并混入音轨
+
+    各片段用相同的编码设置 (encoder, 默认 archive 档案) 编码, 编码线程数按进程数均分。
+    stages 中的 decode / frame_transform / encode 为各进程耗时之和;
+    提供 profiler 时每完成一个片段上报一次进度。
+    cached_frames 为解码帧缓存条目目录, 提供时各片段从内存映射读取而不解码;
+    frame_staging 为 FrameCache.begin 返回的暂存目录, 提供时第 i 个片段把解码帧写入第 i 段。
+
+    Returns:
+        渲染的总帧数
+    """
+    segments = plan_segments(probe_keyframes(video_path), duration, workers)
+    print(f"⚙️  使用 {workers} 个进程渲染 {len(segments)} 个片段")
+
+    # 每段从关键帧前半帧处开始读取, 保证关键帧本身落在该段内
+    half_frame = 0.5 / fps
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = []
+    for index, (start, end) in enumerate(segments):
+        jobs.append({
+            'index': index,
+            'video_path': video_path,
+            'output_path': os.path.join(workdir, f'segment_{index:04d}.mp4'),
+            'schedule': schedule,
+            'size': size,
+            'fps': fps,
+            'start': max(start - half_frame, 0.0),
+            'end': None if end is None else end - half_frame,
+            'threads': threads,
+            'quality': quality,
+            'encoder': encoder or EncoderSettings(),
+            'cached_frames': cached_frames,
+            'frame_staging': frame_staging,
+        })
+
+    counts = [0] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_segment, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            index, count, segment_stages = future.result()
+            counts[index] = count
+            if stages is not None:
+                for name, seconds in segment_stages.items():
+                    add_stage_time(stages, name, seconds)
+            print(f"   片段 {done}/{len(jobs)} 完成")
+            if profiler is not None:
+                profiler.frames(sum(counts))
+
+    print("🔊 正在拼接片段并合并音频...")
+    segment_paths = [job['output_path'] for job, count in zip(jobs, counts) if count > 0]
+    t_mux = time.perf_counter()
+    concat_segments(segment_paths, output_path, workdir,
+                    audio_source=audio_source, audio_codec=audio_codec, encoder=encoder)
+    if stages is not None:
+        add_stage_time(stages, 'mux', time.perf_counter() - t_mux)
+    return sum(counts)
+
+
+# 智能渲染时让每个关键帧都携带参数集 (SPS/PPS) 的比特流滤镜:
+# 复制的源片段和重新编码的片段参数集不同, 拼接后解码器随码流切换
+IN_BAND_PARAMETER_FILTERS = {'h264': 'h264_mp4toannexb', 'h265': 'hevc_mp4toannexb'}
+# 输出编码格式在 ffmpeg 流信息中的名称 (源视频与之相同时才能直接复制)
+SOURCE_CODEC_NAMES = {'h264': 'h264', 'h265': 'hevc', 'vp9': 'vp9'}
+
+
+def probe_closed_keyframes(video_path: str) -> np.ndarray:
+    """
+    获取可以作为切点的关键帧时间: 只保留封闭 GOP 的起点
+
+    开放 GOP (如 x265 默认的 CRA 关键帧) 的关键帧之后还有显示时间更早、参考前一个 GOP
+    的前导帧, 在这里切开会丢帧或花屏。按解码顺序读取数据包的时间戳 (只复制不解码),
+    关键帧之后、下一个关键帧之前出现显示时间早于它的包即为开放 GOP。
+
+    Returns:
+        升序排列的关键帧时间(秒); 无法与关键帧列表对应时返回空数组 (不切分)
+    """
+    keyframes = probe_keyframes(video_path)
+    cmd = [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error',
+           '-i', video_path, '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    closed = []
+    key_pts = None
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        if not line or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split(',')]
+        pts = int(fields[2])
+        # 标志只有关键帧 (0x1) 时不打印
+        flags = next((int(field[2:], 16) for field in fields[6:] if field.startswith('F=')), 0x1)
+        if flags & 0x1:
+            closed.append(True)
+            key_pts = pts
+        elif key_pts is not None and pts < key_pts:
+            closed[-1] = False
+    if len(closed) != len(keyframes):
+        return keyframes[:0]
+    return keyframes[np.array(closed, dtype=bool)]
+
+
+def plan_smart_spans(keyframes: np.ndarray, schedule: ZoomSchedule
+                     ) -> List[Tuple[float, Optional[float], bool]]:
+    """
+    按 GOP 把时间轴分成需要重新编码和可以直接复制的区段
+
+    keyframes 为可以切开的 (封闭 GOP) 关键帧。GOP 中任何一帧有缩放效果就需要重新编码,
+    相邻的同类 GOP 合并为一个区段。
+
+    Returns:
+        [(起始关键帧时间, 结束关键帧时间, 是否重新编码), ...], 最后一段结束时间为 None
+    """
+    starts = np.concatenate([[0.0], keyframes[keyframes > 0]])
+    # 帧时间加半帧容差, 避免关键帧时间戳的舍入误差把帧归到前一个 GOP
+    gop_index = np.searchsorted(starts, schedule.frame_times + 0.5 / schedule.fps,
+                                side='right') - 1
+    touched = np.zeros(len(starts), dtype=bool)
+    touched[np.unique(gop_index[schedule.active])] = True
+
+    spans = []
+    for i, start in enumerate(starts):
+        if spans and spans[-1][2] == touched[i]:
+            continue
+        spans.append([float(start), None, bool(touched[i])])
+    for current, following in zip(spans, spans[1:]):
+        current[1] = following[0]
+    return [tuple(span) for span in spans]
+
+
+def split_at_keyframes(video_path: str, times: Sequence[float], workdir: str,
+                       bitstream_filter: Optional[str] = None) -> List[str]:
+    """
+    在给定时间之后的第一个关键帧处切开视频流 (直接复制, 不解码), 返回各段 MP4 文件路径
+
+    Raises:
+        RuntimeError: ffmpeg 执行失败
+    """
+    pattern = os.path.join(workdir, 'copy_%04d.mp4')
+    cmd = [get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+           '-i', video_path, '-map', '0:v:0', '-c', 'copy']
+    if bitstream_filter:
+        cmd += ['-bsf:v', bitstream_filter]
+    cmd += ['-f', 'segment', '-segment_format', 'mp4']
+    if len(times) > 0:
+        cmd += ['-segment_times', ','.join(f'{t:.6f}' for t in times)]
+    else:
+        # 不切分, 整条流复制为一段
+        cmd += ['-segment_time', '1000000000']
+    cmd += [pattern]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"ffmpeg 切分失败 (退出码 {result.returncode}): {message[-2000:]}")
+    paths = []
+    while os.path.exists(pattern % len(paths)):
+        paths.append(pattern % len(paths))
+    return paths
+
+
+def render_smart(video_path: str, output_path: str, schedule: ZoomSchedule,
+                 size: Tuple[int, int], fps: float, duration: float,
+                 workers: int, workdir: str,
+                 encoder: EncoderSettings,
+                 audio_source: Optional[str] = None,
+                 audio_codec: Optional[str] = None,
+                 quality: str = 'best',
+                 stages: Optional[dict] = None,
+                 profiler: Optional[Profiler] = None) -> int:
+    """
+    智能渲染: 没有缩放效果的 GOP 直接复制源视频的码流, 只重新编码含缩放的区段,
+    最后无损拼接并混入音轨
+
+    源视频的编码格式必须与 encoder 一致 (由调用方检查)。复制的区段保持源视频的画质和码率,
+    重新编码的区段使用 encoder 的设置; 输出的参数集在区段之间可能变化 (随码流携带)。
+    重新编码的区段在 workers 个进程中并行渲染。
+
+    Returns:
+        输出的总帧数 (按缩放计划估计复制区段的帧数)
+    """
+    spans = plan_smart_spans(probe_closed_keyframes(video_path), schedule)
+    half_frame = 0.5 / fps
+
+    # 复制区段的帧数 (用于进度和返回值)
+    reencoded = np.array([reencode for _, _, reencode in spans])
+    frame_times = schedule.frame_times[schedule.frame_times < duration]
+    span_index = np.searchsorted([start for start, _, _ in spans],
+                                 frame_times + half_frame, side='right') - 1
+    copied_frames = int(np.count_nonzero(~reencoded[span_index]))
+    if copied_frames == 0:
+        print("⚠️  没有可以直接复制的 GOP (每个 GOP 都有缩放, 或源视频为开放 GOP), 改为普通渲染")
+        return render_parallel(video_path, output_path, schedule, size, fps, duration,
+                               workers, workdir, audio_source=audio_source,
+                               audio_codec=audio_codec, quality=quality, stages=stages,
+                               profiler=profiler, encoder=encoder)
+
+    bitstream_filter = IN_BAND_PARAMETER_FILTERS.get(encoder.codec)
+    t_copy = time.perf_counter()
+    pieces = split_at_keyframes(video_path, [start - half_frame for start, _, _ in spans[1:]],
+                                workdir, bitstream_filter)
+    if stages is not None:
+        add_stage_time(stages, 'stream_copy', time.perf_counter() - t_copy)
+    if len(pieces) != len(spans):
+        raise RuntimeError(f"关键帧切分结果与计划不一致 ({len(pieces)} / {len(spans)} 段)")
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = []
+    for index, (start, end, reencode) in enumerate(spans):
+        if not reencode:
+            continue
+        jobs.append({
+            'index': index,
+            'video_path': video_path,
+            'output_path': os.path.join(workdir, f'render_{index:04d}.mp4'),
+            'schedule': schedule,
+            'size': size,
+            'fps': fps,
+            'start': max(start - half_frame, 0.0),
+            'end': None if end is None else end - half_frame,
+            'threads': threads,
+            'quality': quality,
+            'encoder': encoder,
+            'bitstream_filter': bitstream_filter,
+        })
+    print(f"♻️  直接复制 {len(spans) - len(jobs)} 段 ({copied_frames / fps:.1f}s), "
+          f"重新编码 {len(jobs)} 段")
+
+    # 重新编码的片段替换切分结果中的对应段
+    outputs = {job['index']: job['output_path'] for job in jobs}
+    rendered = 0
+
+    def collect(result: Tuple[int, int, dict]) -> None:
+        nonlocal rendered
+        index, count, segment_stages = result
+        rendered += count
+        pieces[index] = outputs[index] if count > 0 else None
+        if stages is not None:
+            for name, seconds in segment_stages.items():
+                add_stage_time(stages, name, seconds)
+        if profiler is not None:
+            profiler.frames(copied_frames + rendered)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(_render_segment, job) for job in jobs]):
+                collect(future.result())
+    else:
+        for job in jobs:
+            collect(_render_segment(job))
+
+    print("🔊 正在拼接片段并合并音频...")
+    t_mux = time.perf_counter()
+    concat_segments([path for path in pieces if path is not None], output_path, workdir,
+                    audio_source=audio_source, audio_codec=audio_codec, encoder=encoder)
+    if stages is not None:
+        add_stage_time(stages, 'mux', time.perf_counter() - t_mux)
+    return copied_frames + rendered
+
+
+# 速度校准时试渲染的视频时长(秒)
+CALIBRATION_SECONDS = 3.0
+
+
+def available_encoders() -> set:
+    """当前 ffmpeg 支持的视频编码器名称"""
+    result = subprocess.run([get_ffmpeg_binary(), '-hide_banner', '-encoders'],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    names = set()
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith('V'):
+            names.add(parts[1])
+    return names
+
+
+def calibrate_encoder(source: FrameSource, schedule: ZoomSchedule,
+                      size: Tuple[int, int], fps: float,
+                      encoder: EncoderSettings, target_speed: float,
+                      start: float = 0.0,
+                      quality: str = 'best',
+                      filters: Sequence[str] = (),
+                      threads: Optional[int] = None) -> Tuple[EncoderSettings, dict]:
+    """
+    在一小段视频上试渲染, 选择能达到目标实时倍速的速度预设
+
+    倍速 = 视频时长 / 渲染耗时 (2.0 表示 1 秒视频 0.5 秒渲染完)。速度档位从慢到快排列,
+    速度随档位单调递增, 因此二分查找能达到目标的最慢档位 (同等质量下文件最小);
+    每次试渲染都包含解码和缩放, 编码结果输出到空设备。所有档位都达不到时使用最快档位。
+
+    Returns:
+        (选定的编码设置, {速度预设: 实测倍速})
+    """
+    presets = encoder.speed_presets
+    speeds = {}
+
+    def measure(preset: str) -> float:
+        trial = encoder.with_preset(preset)
+        params = trial.video_params(size, fps, threads=threads, container=None) + ['-f', 'null']
+        t_start = time.perf_counter()
+        with FFmpegVideoWriter(os.devnull, size, fps, video_params=params) as writer:
+            count = render_frames(source, schedule, size, fps, writer,
+                                  start=start, end=start + CALIBRATION_SECONDS,
+                                  quality=quality, filters=filters)
+        elapsed = time.perf_counter() - t_start
+        speeds[preset] = (count / fps) / elapsed if count and elapsed > 0 else 0.0
+        return speeds[preset]
+
+    low, high = 0, len(presets) - 1
+    chosen = None
+    while low <= high:
+        middle = (low + high) // 2
+        if measure(presets[middle]) >= target_speed:
+            chosen = middle
+            high = middle - 1
+        else:
+            low = middle + 1
+    if chosen is None:
+        chosen = len(presets) - 1
+    return encoder.with_preset(presets[chosen]), speeds
+
 
 def create_zoom_clip(video_path: str, beat_times: List[float],
                      zoom_min: float = 1.0, zoom_max: float = 1.3,
-                     zoom_duration: float = 0.2) -> str:
+                     zoom_duration: float = 0.2):
     """
-    创建带节奏缩放效果的视频
+    创建带节奏缩放效果的 moviepy 剪辑 (供需要在 moviepy 中继续编辑的场景使用,
+    process_video 不经过 moviepy)
 
     Args:
         video_path: 原视频路径
@@ -125,7 +2177,7 @@ def create_zoom_clip(video_path: str, beat_times: List[float],
         zoom_duration: 每次缩放的持续时间(秒)
 
     Returns:
-        输出视频路径
+        moviepy VideoClip, 失败时返回 None
     """
     from moviepy import VideoFileClip
 
@@ -134,46 +2186,32 @@ def create_zoom_clip(video_path: str, beat_times: List[float],
 
         video = VideoFileClip(video_path)
         w, h = video.size
+        fps = video.fps
+
+        # 预先计算所有帧的缩放计划, 渲染时只需查表
+        frame_times = np.arange(int(video.duration * fps) + 1) / fps
+        schedule = build_zoom_schedule(
+            frame_times, fps, beat_times, np.full(len(beat_times), zoom_max),
+            (w, h), zoom_min=zoom_min, zoom_duration=zoom_duration
+        )
 
-        # 为每个节拍创建缩放关键帧
         # 使用简单的缩放策略: 在节拍处放大,然后缩小
-        def zoom_effect(get_frame, t):
-            # 找到最近的节拍
-            if not beat_times:
-                return get_frame(t)
-
-            # 找到最近的节拍时间
-            beat_deltas = [abs(t - beat) for beat in beat_times]
-            nearest_beat_dist = min(beat_deltas)
-
-            # 如果接近节拍,应用缩放
-            if nearest_beat_dist < zoom_duration:
-                # 计算缩放因子: 节拍处最大,然后衰减
-                progress = nearest_beat_dist / zoom_duration
-                zoom_factor = zoom_max - (zoom_max - zoom_min) * progress
-            else:
-                zoom_factor = zoom_min
+        from cv2 import resize
 
-            # 应用缩放
+        def zoom_effect(get_frame, t):
             frame = get_frame(t)
-            # 计算缩放后的尺寸
-            new_w, new_h = int(w / zoom_factor), int(h / zoom_factor)
-
-            # 居中裁剪
-            x1 = (w - new_w) // 2
-            y1 = (h - new_h) // 2
-            x2 = x1 + new_w
-            y2 = y1 + new_h
+            # 查表得到当前帧的裁剪区域
+            k = schedule.index_at(t)
+            if not schedule.active[k]:
+                return frame
 
             # 裁剪并缩放回原尺寸
-            from cv2 import resize
-            cropped = frame[y1:y2, x1:x2]
-            if cropped.size == 0:
-                return frame
-            return resize(cropped, (w, h))
+            x1, y1, x2, y2 = schedule.rects[k]
+            return resize(frame[y1:y2, x1:x2], (w, h))
 
-        # 应用效果
-        result = video.fl(zoom_effect)
+        # 应用效果 (moviepy 2.x 为 transform, 1.x 为 fl)
+        apply = getattr(video, 'transform', None) or video.fl
+        result = apply(zoom_effect)
 
         print(f"✅ 运镜效果已应用")
         return result
@@ -183,192 +2221,993 @@ def create_zoom_clip(video_path: str, beat_times: List[float],
         return None
 
 
-def process_video(video_path: str, output_path: str,
+def preview_geometry(size: Tuple[int, int], fps: float) -> Tuple[Tuple[int, int], float]:
+    """
+    预览模式的画面尺寸和帧率: 高度不超过 PREVIEW_HEIGHT (保持宽高比, 取偶数),
+    帧率不超过 PREVIEW_FPS
+
+    Returns:
+        ((w, h), fps)
+    """
+    w, h = size
+    if h > PREVIEW_HEIGHT:
+        w, h = int(round(w * PREVIEW_HEIGHT / h)), PREVIEW_HEIGHT
+    w, h = max(w // 2 * 2, 2), max(h // 2 * 2, 2)
+    return (w, h), min(fps, PREVIEW_FPS)
+
+
+# 输出目标的宽高比与源画面相差不超过该比例时不裁剪 (避免取整造成的 1 像素裁边)
+ASPECT_SNAP_RATIO = 0.01
+
+
+@dataclass
+class OutputTarget:
+    """
+    多目标输出中的一个目标
+
+    Attributes:
+        path: 输出视频路径
+        aspect: 裁剪区域的宽高比 (宽/高), None 表示与源视频相同;
+            同时给出 width 和 height 时以二者之比为准
+        width: 输出宽度, None 表示按高度和宽高比推算 (都未给出时为裁剪区域的原始大小)
+        height: 输出高度, None 表示按宽度和宽高比推算
+        encoding: 编码档案, None 表示使用流水线的设置
+        codec: 编码格式, None 表示使用流水线的设置
+    """
+    path: str
+    aspect: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    encoding: Optional[str] = None
+    codec: Optional[str] = None
+
+    @staticmethod
+    def parse_aspect(value: Union[str, float]) -> float:
+        """解析宽高比: 9:16 / 9x16 / 0.5625"""
+        if isinstance(value, str):
+            match = re.fullmatch(r'\s*([\d.]+)\s*[:x/]\s*([\d.]+)\s*', value)
+            value = float(match.group(1)) / float(match.group(2)) if match else float(value)
+        if not value > 0:
+            raise ValueError(f"无效的宽高比: {value}")
+        return float(value)
+
+    @classmethod
+    def parse(cls, text: str) -> 'OutputTarget':
+        """
+        解析命令行写法: 路径[,键=值...], 键为 aspect / size / width / height / encoding / codec,
+        如 vertical.mp4,aspect=9:16,height=1920,encoding=social
+
+        Raises:
+            ValueError: 格式错误
+        """
+        path, *options = text.split(',')
+        values = {}
+        for option in options:
+            key, sep, value = option.partition('=')
+            key = key.strip()
+            if not sep or not value:
+                raise ValueError(f"输出目标参数应为 键=值: {option}")
+            if key == 'size':
+                width, sep, height = value.lower().partition('x')
+                if not sep:
+                    raise ValueError(f"输出尺寸应为 宽x高: {value}")
+                values['width'], values['height'] = width, height
+            elif key in ('aspect', 'width', 'height', 'encoding', 'codec'):
+                values[key] = value.strip()
+            else:
+                raise ValueError(f"未知的输出目标参数: {key}")
+        return cls.from_dict({'path': path, **values})
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'OutputTarget':
+        """从字典创建 (批处理清单中的写法), 键同 parse"""
+        unknown = set(data) - {'path', 'aspect', 'width', 'height', 'encoding', 'codec'}
+        if unknown:
+            raise ValueError(f"未知的输出目标参数: {', '.join(sorted(unknown))}")
+        if not data.get('path'):
+            raise ValueError("输出目标缺少路径")
+        aspect = data.get('aspect')
+        return cls(
+            path=data['path'],
+            aspect=None if aspect is None else cls.parse_aspect(aspect),
+            width=None if data.get('width') is None else int(data['width']),
+            height=None if data.get('height') is None else int(data['height']),
+            encoding=data.get('encoding'),
+            codec=data.get('codec'),
+        )
+
+    def geometry(self, size: Tuple[int, int]) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """
+        在源画面中的裁剪区域尺寸和输出尺寸
+
+        裁剪区域为源画面内符合宽高比的最大区域 (比例与源画面相差不超过 ASPECT_SNAP_RATIO
+        时取完整画面); 输出尺寸 (包括指定的宽高) 取偶数 (yuv420p 的要求)。
+
+        Returns:
+            ((cw, ch), (out_w, out_h))
+
+        Raises:
+            ValueError: 输出尺寸不合法
+        """
+        w, h = size
+        if any(value is not None and value < 2 for value in (self.width, self.height)):
+            raise ValueError(f"无效的输出尺寸: {self.width}x{self.height}")
+        aspect = self.aspect or w / h
+        if self.width and self.height:
+            aspect = self.width / self.height
+        if abs(aspect / (w / h) - 1) <= ASPECT_SNAP_RATIO:
+            # 与源画面比例几乎相同 (如 854x480 对 16:9), 不裁剪
+            crop = (w, h)
+        elif w / h > aspect:
+            crop = (min(int(round(h * aspect)), w), h)
+        else:
+            crop = (w, min(int(round(w / aspect)), h))
+
+        def even(value: float) -> int:
+            return max(int(round(value / 2)) * 2, 2)
+
+        if self.width and self.height:
+            output = (even(self.width), even(self.height))
+        elif self.width:
+            output = (even(self.width), even(self.width / aspect))
+        elif self.height:
+            output = (even(self.height * aspect), even(self.height))
+        elif crop == (w, h):
+            output = crop
+        else:
+            output = (even(crop[0]), even(crop[1]))
+        return crop, output
+
+
+class RhythmCamPipeline:
+    """
+    可复用的节奏运镜流水线: 分析 (analyze) → 规划 (plan) → 渲染 (render)
+
+    实例只保存效果和分析参数, 不保存单个视频的状态, 长期运行的服务可以保持一个
+    预热过的实例处理多个请求。出错时抛出 RhythmCamError 的子类而不是打印;
+    librosa / cv2 在首次使用时才导入 (或调用 warm_up 预先导入)。
+    """
+
+    def __init__(self,
+                 sensitivity: float = 0.5,
+                 zoom_min: float = 1.0,
+                 zoom_max: float = 1.3,
+                 zoom_duration: float = 0.2,
+                 workers: int = 1,
+                 cache_dir: Optional[str] = None,
+                 analysis_sr: int = ANALYSIS_SAMPLE_RATE,
+                 hop_length: int = ANALYSIS_HOP_LENGTH,
+                 chunked: bool = False,
+                 tempo: str = 'global',
+                 accent_zoom: bool = False,
+                 follow_subject: bool = False,
+                 quality: str = 'best',
+                 encoding: str = DEFAULT_ENCODING,
+                 codec: str = DEFAULT_CODEC,
+                 target_speed: Optional[float] = None,
+                 smart: bool = False,
+                 frame_cache: bool = False,
+                 frame_cache_bytes: int = DEFAULT_FRAME_CACHE_BYTES,
+                 verbose: bool = False):
+        """
+        Args:
+            sensitivity: 节拍检测灵敏度 (0.0-1.0)
+            zoom_min: 最小缩放比例
+            zoom_max: 最大缩放比例
+            zoom_duration: 缩放持续时间(秒)
+            workers: 并行渲染进程数, 大于 1 时按关键帧分段渲染
+            cache_dir: 节拍分析缓存目录, None 表示不使用缓存
+            analysis_sr: 节拍分析采样率
+            hop_length: 节拍分析帧移 (采样点)
+            chunked: 分块流式分析音频 (适合超长录音, 内存占用恒定)
+            tempo: 速度模式 global (整首一个速度) / adaptive (跟踪速度变化并检测小节第一拍)
+            accent_zoom: 按每个节拍的重音等级连续缩放峰值, 而不是只分重拍/弱拍两档
+            follow_subject: 跟踪画面中的运动主体, 缩放时裁剪区域跟随主体而不是固定居中
+            quality: 缩放插值质量 fast / balanced / best
+            encoding: 编码档案 archive / social / fast / draft
+            codec: 编码格式 h264 / h265 / vp9
+            target_speed: 目标实时倍速, 提供时渲染前在一小段视频上校准并选择速度预设
+            smart: 智能渲染, 没有缩放效果的 GOP 直接复制源视频码流
+            frame_cache: 使用解码帧缓存 (存放在 cache_dir 下, 未提供时为默认缓存目录),
+                同一源视频的后续渲染从内存映射读取帧而不解码
+            frame_cache_bytes: 解码帧缓存的总大小上限 (字节)
+            verbose: 是否打印处理过程
+
+        Raises:
+            InvalidParameterError: 参数不合法
+        """
+        if not 0.0 <= sensitivity <= 1.0:
+            raise InvalidParameterError(f"灵敏度必须在 0.0-1.0 之间: {sensitivity}")
+        if zoom_min <= 0 or zoom_max < zoom_min:
+            raise InvalidParameterError(f"无效的缩放范围: {zoom_min} - {zoom_max}")
+        if zoom_duration <= 0:
+            raise InvalidParameterError(f"缩放持续时间必须为正数: {zoom_duration}")
+        if quality not in QUALITY_INTERPOLATION:
+            raise InvalidParameterError(f"未知的插值质量: {quality}")
+        if tempo not in TEMPO_MODES:
+            raise InvalidParameterError(f"未知的速度模式: {tempo}")
+        if target_speed is not None and target_speed <= 0:
+            raise InvalidParameterError(f"目标倍速必须为正数: {target_speed}")
+        if frame_cache_bytes <= 0:
+            raise InvalidParameterError(f"解码帧缓存上限必须为正数: {frame_cache_bytes}")
+        try:
+            self.encoder = EncoderSettings(encoding, codec)
+        except ValueError as e:
+            raise InvalidParameterError(str(e)) from e
+        self.sensitivity = sensitivity
+        self.zoom_min = zoom_min
+        self.zoom_max = zoom_max
+        self.zoom_duration = zoom_duration
+        self.workers = max(int(workers), 1)
+        self.cache_dir = cache_dir
+        self.analysis_sr = analysis_sr
+        self.hop_length = hop_length
+        self.chunked = chunked
+        self.tempo = tempo
+        self.accent_zoom = accent_zoom
+        self.follow_subject = follow_subject
+        self.quality = quality
+        self.target_speed = target_speed
+        self.smart = smart
+        self.frame_cache = frame_cache
+        self.frame_cache_bytes = frame_cache_bytes
+        self.verbose = verbose
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def warm_up(self) -> None:
+        """预先导入 librosa / cv2, 并在一小段静音上运行一次分析 (触发 numba 编译)"""
+        import cv2  # noqa: F401
+        analyze_beats(np.zeros(self.analysis_sr, dtype=np.float32), self.analysis_sr,
+                      hop_length=self.hop_length)
+
+    def analyze(self, source: Union[str, np.ndarray], sr: Optional[int] = None,
+                profiler: Optional[Profiler] = None) -> ZoomTimeline:
+        """
+        分析音频节拍, 得到缩放时间线
+
+        Args:
+            source: 媒体文件路径, 或单声道 float 音频采样数组
+            sr: source 为数组时的采样率 (默认为 analysis_sr)
+            profiler: 提供时记录 audio_extract / beat_detection 阶段耗时
+
+        Raises:
+            MediaError: 音频解码失败
+            AnalysisError: 分析失败或没有检测到节拍
+        """
+        return self.build_timeline(self.detect_beats(source, sr, profiler))
+
+    def detect_beats(self, source: Union[str, np.ndarray], sr: Optional[int] = None,
+                     profiler: Optional[Profiler] = None) -> BeatAnalysis:
+        """
+        按实例的分析参数检测节拍, 返回未经灵敏度过滤的原始结果 (参数同 analyze)
+
+        Raises:
+            MediaError: 音频解码失败
+            AnalysisError: 分析失败
+        """
+        profiler = profiler or Profiler(verbose=False)
+        try:
+            if isinstance(source, np.ndarray):
+                y = np.asarray(source, dtype=np.float32)
+                if y.ndim != 1:
+                    raise InvalidParameterError("音频数组必须是单声道一维数组")
+                with profiler.stage('beat_detection'):
+                    analysis, cached = analyze_audio_cached(y, sr or self.analysis_sr,
+                                                            self.cache_dir, self.hop_length,
+                                                            tempo=self.tempo)
+            elif self.chunked:
+                self._log("🎵 正在分块分析音乐节奏和强度...")
+                with profiler.stage('beat_detection'):
+                    analysis, cached = analyze_media_chunked_cached(
+                        source, self.cache_dir, sr=self.analysis_sr, hop_length=self.hop_length,
+                        tempo=self.tempo)
+            else:
+                with profiler.stage('audio_extract'):
+                    self._log("📤 正在解码音频...")
+                    try:
+                        y = load_audio(source, self.analysis_sr)
+                    except RuntimeError as e:
+                        raise MediaError(f"提取音频失败: {e}") from e
+                self._log("🎵 正在分析音乐节奏和强度...")
+                with profiler.stage('beat_detection'):
+                    analysis, cached = analyze_audio_cached(y, self.analysis_sr,
+                                                            self.cache_dir, self.hop_length,
+                                                            tempo=self.tempo)
+                del y
+        except RhythmCamError:
+            raise
+        except RuntimeError as e:
+            raise MediaError(f"音频解码失败: {e}") from e
+        except Exception as e:
+            raise AnalysisError(f"节拍检测失败: {e}") from e
+        if cached:
+            self._log("   使用缓存的节拍分析结果")
+        return analysis
+
+    def build_timeline(self, analysis: BeatAnalysis) -> ZoomTimeline:
+        """
+        按灵敏度过滤节拍并计算每个节拍的峰值缩放
+
+        Raises:
+            AnalysisError: 过滤后没有节拍
+        """
+        if self.tempo == 'adaptive' or self.accent_zoom:
+            # 强度为局部重音等级, 不受单个异常响的节拍影响
+            beat_times, beat_strengths, downbeats = grade_beats(analysis, self.sensitivity)
+        else:
+            beats_with_strength = filter_beats(analysis, self.sensitivity)
+            beat_times = np.array([beat for beat, _ in beats_with_strength], dtype=np.float64)
+            beat_strengths = np.array([s for _, s in beats_with_strength], dtype=np.float64)
+            downbeats = None
+        if len(beat_times) == 0:
+            raise AnalysisError("未检测到节拍")
+
+        if self.accent_zoom:
+            beat_peaks = accent_peaks(beat_strengths, self.zoom_min, self.zoom_max, downbeats)
+        else:
+            beat_peaks = compute_beat_peaks(beat_strengths, self.zoom_min, self.zoom_max, downbeats)
+        strong_beats = int(np.sum(beat_peaks >= self.zoom_max))
+        self._log(f"✅ 检测到 {len(beat_times)} 个节拍点 (BPM: {analysis.tempo:.1f})")
+        if analysis.tempo_curve is not None and len(analysis.tempo_curve):
+            self._log(f"   速度范围: {analysis.tempo_curve.min():.1f} - "
+                      f"{analysis.tempo_curve.max():.1f} BPM, "
+                      f"小节第一拍: {int(np.sum(downbeats))} 个")
+        self._log(f"   其中重拍: {strong_beats} 个")
+
+        return ZoomTimeline(
+            beat_times=beat_times,
+            beat_strengths=beat_strengths,
+            beat_peaks=beat_peaks,
+            zoom_min=self.zoom_min,
+            zoom_duration=self.zoom_duration,
+            duration=analysis.duration,
+            downbeats=downbeats,
+        )
+
+    def plan(self, timeline: ZoomTimeline, size: Tuple[int, int], fps: float,
+             duration: Optional[float] = None,
+             track: Optional[SubjectTrack] = None,
+             crop_size: Optional[Tuple[int, int]] = None) -> ZoomSchedule:
+        """
+        根据时间线计算逐帧缩放计划
+
+        Args:
+            timeline: 缩放时间线
+            size: 画面尺寸 (w, h)
+            fps: 帧率
+            duration: 视频时长(秒), 默认为时间线记录的音频时长
+            track: 主体轨迹, 提供时裁剪区域跟随主体, None 表示居中裁剪
+            crop_size: 不缩放时的裁剪区域尺寸 (如竖屏目标的 9:16 区域), None 表示完整画面
+        """
+        duration = duration or timeline.duration
+        n_frames = max(int(np.ceil(duration * fps)), 1)
+        frame_times = np.arange(n_frames + 1) / fps
+        return build_zoom_schedule(
+            frame_times, fps,
+            timeline.beat_times, timeline.beat_peaks, size,
+            zoom_min=timeline.zoom_min, zoom_duration=timeline.zoom_duration,
+            centers=None if track is None else track.at(frame_times),
+            crop_size=crop_size
+        )
+
+    def track_subject(self, video_path: str, size: Optional[Tuple[int, int]] = None,
+                      profiler: Optional[Profiler] = None) -> SubjectTrack:
+        """
+        跟踪视频画面中的运动主体 (使用实例的缓存目录)
+
+        Args:
+            video_path: 视频路径
+            size: 画面尺寸 (w, h), 默认从视频流读取
+            profiler: 提供时记录 subject_track 阶段耗时
+
+        Raises:
+            MediaError: 视频解码失败
+        """
+        profiler = profiler or Profiler(verbose=False)
+        size = size or self._frame_size(video_path)
+        self._log("🎯 正在跟踪画面主体...")
+        with profiler.stage('subject_track'):
+            try:
+                track, cached = track_subject_cached(video_path, size, self.cache_dir)
+            except (RuntimeError, OSError) as e:
+                raise MediaError(str(e)) from e
+        if cached:
+            self._log("   使用缓存的主体跟踪结果")
+        elif len(track):
+            self._log(f"   主体中心范围: x {track.centers[:, 0].min():.2f} - "
+                      f"{track.centers[:, 0].max():.2f}, "
+                      f"y {track.centers[:, 1].min():.2f} - {track.centers[:, 1].max():.2f}")
+        return track
+
+    def transform_frames(self, frames: FrameSource, schedule: ZoomSchedule,
+                         size: Optional[Tuple[int, int]] = None) -> Iterator[np.ndarray]:
+        """
+        逐帧应用缩放, 不编码 (帧数组或内存中的帧序列)
+
+        产出的帧在取下一帧之前有效 (可能复用输出缓冲区), 需要保留时请自行复制。
+        """
+        size = size or self._frame_size(frames)
+        transformer = FrameTransformer(size, self.quality)
+        for t, frame in iter_frame_source(frames, size, schedule.fps):
+            k = schedule.index_at(t)
+            yield transformer.transform(frame, schedule.rects[k], schedule.active[k])
+
+    @staticmethod
+    def _frame_size(frames: FrameSource) -> Tuple[int, int]:
+        if isinstance(frames, np.ndarray) and frames.ndim == 4:
+            return frames.shape[2], frames.shape[1]
+        if isinstance(frames, (str, os.PathLike)):
+            size = probe_media(os.fspath(frames))['video_size']
+            if size is not None:
+                return size
+        raise InvalidParameterError("无法推断画面尺寸, 请提供 size")
+
+    def _encoder_for(self, output_path: str, preview: bool = False) -> EncoderSettings:
+        """输出使用的编码设置 (预览固定用 draft 档案), 检查容器兼容性和编码器是否可用"""
+        encoder = EncoderSettings('draft', self.encoder.codec) if preview else self.encoder
+        try:
+            encoder.check_container(container_for(output_path))
+        except ValueError as e:
+            raise InvalidParameterError(str(e)) from e
+        if encoder.encoder not in available_encoders():
+            raise RenderError(f"当前 ffmpeg 不支持 {encoder.encoder} 编码器")
+        return encoder
+
+    def render(self, frames: FrameSource, schedule: ZoomSchedule, output_path: str,
+               size: Optional[Tuple[int, int]] = None,
+               audio_source: Optional[str] = None,
+               audio_codec: Optional[str] = None,
+               start: float = 0.0,
+               end: Optional[float] = None,
+               filters: Sequence[str] = (),
+               video_params: Optional[Sequence[str]] = None,
+               quality: Optional[str] = None,
+               profiler: Optional[Profiler] = None,
+               record: Optional[Callable[[float, np.ndarray], None]] = None) -> int:
+        """
+        按缩放计划渲染帧源并编码输出 (单进程), 可同时混入音轨
+
+        Args:
+            frames: 帧源 (视频路径、(n, h, w, 3) 数组或 (时间戳, 帧) 序列)
+            schedule: 逐帧缩放计划 (帧率取自 schedule.fps)
+            output_path: 输出视频路径
+            size: 画面尺寸 (w, h), 默认从帧源推断
+            audio_source: 提供音轨的文件, None 表示无音频
+            audio_codec: 音轨的原始编码, 用于判断能否直接复制
+            start: 起始时间(秒)
+            end: 结束时间(秒), None 表示到结尾
+            filters: 解码端的 ffmpeg 滤镜 (帧源为视频路径时有效)
+            video_params: 视频编码参数, 默认按实例的编码档案和编码格式生成
+            quality: 缩放插值质量, 默认使用实例的设置
+            profiler: 提供时记录各阶段耗时并上报进度
+            record: 对每个解码出的帧调用 record(时间戳, 帧), 见 render_frames
+
+        Returns:
+            渲染的帧数
+
+        Raises:
+            RenderError: 解码或编码失败
+        """
+        size = size or self._frame_size(frames)
+        stages = profiler.stages if profiler is not None else None
+        if video_params is None:
+            video_params = self._encoder_for(output_path).video_params(
+                size, schedule.fps, container=container_for(output_path))
+        try:
+            with FFmpegVideoWriter(output_path, size, schedule.fps,
+                                   audio_source=audio_source,
+                                   audio_codec=audio_codec,
+                                   audio_start=start,
+                                   audio_duration=None if end is None else end - start,
+                                   video_params=video_params) as writer:
+                frame_count = render_frames(frames, schedule, size, schedule.fps, writer,
+                                            start=start, end=end,
+                                            profiler=profiler,
+                                            quality=quality or self.quality, stages=stages,
+                                            filters=filters, record=record)
+                self._log("🔊 正在完成编码并合并音频...")
+                t_mux = time.perf_counter()
+        except (RuntimeError, OSError) as e:
+            raise RenderError(str(e)) from e
+        if stages is not None:
+            add_stage_time(stages, 'mux', time.perf_counter() - t_mux)
+        return frame_count
+
+    def process(self, video_path: str, output_path: Optional[str],
+                preview: bool = False,
+                start: float = 0.0,
+                end: Optional[float] = None,
+                timeline: Optional[str] = None,
+                export_timeline: Optional[str] = None,
+                profile: Optional[str] = None,
+                progress: Optional[Callable[[dict], None]] = None,
+                targets: Optional[Sequence[Union[OutputTarget, dict, str]]] = None) -> dict:
+        """
+        完整处理一个视频: 分析 (或读取时间线) → 规划 → 渲染并混入原音轨
+
+        参数含义见 process_video。
+
+        Returns:
+            {'frames': 渲染帧数, 'stages': 各阶段耗时(秒), 'timeline': ZoomTimeline}
+
+        Raises:
+            MediaError / AnalysisError / RenderError / InvalidParameterError
+        """
+        if not os.path.exists(video_path):
+            raise MediaError(f"视频文件不存在: {video_path}")
+
+        outputs = self._resolve_targets(output_path, targets, preview) if targets else None
+        media = probe_media(video_path)
+        if (output_path is not None or outputs) and \
+                (media['video_size'] is None or not media['video_fps']):
+            raise MediaError("无法读取视频流信息")
+        if media['audio_codec'] is None and timeline is None:
+            # 有时间线时不分析音频, 没有音轨的视频也可以渲染 (输出不含音频)
+            raise MediaError("视频中没有音频轨道")
+        if start < 0 or (end is not None and end <= start) or \
+                (media['duration'] and start >= media['duration']):
+            raise InvalidParameterError(f"无效的时间范围: {start} - {end}")
+
+        encoder = self._encoder_for(output_path, preview) \
+            if output_path is not None and not outputs else None
+
+        profiler = Profiler(profile, progress, verbose=self.verbose)
+        try:
+            if timeline is not None:
+                # 直接使用已有的时间线, 不分析音频
+                try:
+                    zoom_timeline = ZoomTimeline.load(timeline)
+                except Exception as e:
+                    raise InvalidParameterError(f"读取时间线失败: {e}") from e
+                self._log(f"📄 使用时间线: {timeline} ({len(zoom_timeline)} 个节拍)")
+                if len(zoom_timeline) == 0:
+                    raise AnalysisError("时间线中没有节拍")
+            else:
+                zoom_timeline = self.analyze(video_path, profiler=profiler)
+
+            if export_timeline:
+                try:
+                    zoom_timeline.save(export_timeline)
+                except OSError as e:
+                    raise RhythmCamError(f"导出时间线失败: {e}") from e
+                self._log(f"📄 时间线已导出: {export_timeline}")
+            result = {'frames': 0, 'stages': profiler.stages, 'timeline': zoom_timeline}
+            if outputs:
+                result['frames'] = self._render_targets(video_path, outputs, media, zoom_timeline,
+                                                        start, end, profiler)
+                return result
+            if output_path is None:
+                return result
+
+            result['frames'] = self._render_video(video_path, output_path, media, zoom_timeline,
+                                                  encoder, preview, start, end, profiler)
+            return result
+        finally:
+            profiler.close()
+
+    def _resolve_targets(self, output_path: Optional[str],
+                         targets: Sequence[Union[OutputTarget, dict, str]],
+                         preview: bool) -> List[Tuple[OutputTarget, EncoderSettings]]:
+        """
+        检查多目标输出的参数, output_path 不为 None 时作为第一个目标 (源画面比例)
+
+        Returns:
+            [(输出目标, 编码设置), ...]
+
+        Raises:
+            InvalidParameterError: 目标参数不合法
+        """
+        if preview:
+            raise InvalidParameterError("多目标输出不支持预览模式")
+        outputs = [OutputTarget(output_path)] if output_path is not None else []
+        try:
+            for target in targets:
+                if isinstance(target, str):
+                    target = OutputTarget.parse(target)
+                elif isinstance(target, dict):
+                    target = OutputTarget.from_dict(target)
+                outputs.append(target)
+        except (ValueError, TypeError) as e:
+            raise InvalidParameterError(f"无效的输出目标: {e}") from e
+
+        paths = [os.path.abspath(target.path) for target in outputs]
+        if len(set(paths)) != len(paths):
+            raise InvalidParameterError("输出目标的路径重复")
+        resolved = []
+        for target in outputs:
+            try:
+                encoder = EncoderSettings(target.encoding or self.encoder.profile,
+                                          target.codec or self.encoder.codec)
+                encoder.check_container(container_for(target.path))
+            except ValueError as e:
+                raise InvalidParameterError(f"{target.path}: {e}") from e
+            resolved.append((target, encoder))
+        return resolved
+
+    def _open_frame_cache(self, video_path: str, size: Tuple[int, int], fps: float,
+                          duration: float, filters: Sequence[str], windowed: bool,
+                          profiler: Profiler
+                          ) -> Tuple[FrameCache, str, Optional[CachedFrames], Optional[str]]:
+        """
+        查找解码帧缓存: 命中时从内存映射读取帧; 未命中且完整渲染时开始写入
+
+        Returns:
+            (缓存, 缓存键, 命中的条目或 None, 暂存目录或 None)
+        """
+        w, h = size
+        frame_cache = FrameCache(self.cache_dir or default_cache_dir(), self.frame_cache_bytes)
+        with profiler.stage('frame_cache'):
+            try:
+                cache_key = frame_cache.make_key(video_path, size, filters)
+            except OSError as e:
+                raise MediaError(f"读取视频文件失败: {e}") from e
+            cached_frames = frame_cache.get(cache_key)
+        staging = None
+        if cached_frames is not None:
+            self._log(f"🗃️  使用缓存的解码帧 ({len(cached_frames)} 帧, "
+                      f"{cached_frames.nbytes / 1024 ** 3:.1f} GB)")
+        elif not windowed:
+            entry_bytes = max(int(np.ceil(duration * fps)), 1) * w * h * 3
+            staging = frame_cache.begin(cache_key, entry_bytes)
+            if staging is None:
+                self._log(f"⚠️  解码帧 (约 {entry_bytes / 1024 ** 3:.1f} GB) 超过缓存上限"
+                          f"或正由其他进程写入, 本次不写入缓存")
+            else:
+                self._log(f"🗃️  渲染时同时写入解码帧缓存 (约 {entry_bytes / 1024 ** 3:.1f} GB)")
+        return frame_cache, cache_key, cached_frames, staging
+
+    def _render_targets(self, video_path: str,
+                        outputs: List[Tuple[OutputTarget, EncoderSettings]], media: dict,
+                        zoom_timeline: ZoomTimeline, start: float, end: Optional[float],
+                        profiler: Profiler) -> int:
+        """
+        process 的多目标渲染: 只解码一次, 每个目标按自己的裁剪区域和输出尺寸计算缩放,
+        各自的编码器进程并行编码并混入原音轨
+        """
+        w, h = media['video_size']
+        fps = media['video_fps']
+        self._log(f"🎬 正在渲染 {len(outputs)} 个输出...")
+        try:
+            import cv2  # noqa: F401
+        except ImportError as e:
+            raise RenderError("需要安装 cv2 (opencv-python): pip install opencv-python") from e
+        skipped = [name for name, enabled in (('分段并行', self.workers > 1),
+                                              ('智能渲染', self.smart),
+                                              ('编码速度校准', self.target_speed)) if enabled]
+        if skipped:
+            self._log(f"⚠️  多目标输出只解码一次, 不使用: {', '.join(skipped)}")
+
+        video_duration = media['duration'] or zoom_timeline.duration
+        expected_frames = max(int(np.ceil(video_duration * fps)), 1)
+        windowed = start > 0 or end is not None
+        if windowed:
+            window_end = min(end, video_duration) if end is not None else video_duration
+            expected_frames = max(int(np.ceil((window_end - start) * fps)), 1)
+            self._log(f"✂️  只渲染 {start:.2f}s - {window_end:.2f}s")
+
+        # 主体轨迹为归一化坐标, 所有目标共用
+        track = self.track_subject(video_path, (w, h), profiler) if self.follow_subject else None
+        plans = []
+        for target, encoder in outputs:
+            try:
+                crop, output_size = target.geometry((w, h))
+            except ValueError as e:
+                raise InvalidParameterError(f"{target.path}: {e}") from e
+            schedule = self.plan(zoom_timeline, (w, h), fps, video_duration, track=track,
+                                 crop_size=crop)
+            if output_size != (w, h):
+                # 输出尺寸与源画面不同, 每一帧都要缩放
+                schedule.active[:] = True
+            plans.append((target, encoder, schedule, output_size))
+            self._log(f"   {target.path}: 裁剪 {crop[0]}x{crop[1]} → {output_size[0]}x{output_size[1]}, "
+                      f"{encoder.describe()}")
+
+        frame_cache = cache_key = cached_frames = staging = None
+        if self.frame_cache:
+            frame_cache, cache_key, cached_frames, staging = self._open_frame_cache(
+                video_path, (w, h), fps, video_duration, (), windowed, profiler)
+        profiler.begin_frames(expected_frames)
+
+        source = video_path
+        if cached_frames is not None:
+            source = cached_frames.iter_frames(start, end)
+        audio_source = self._audio_source(video_path, media)
+        recorder = FrameRecorder(staging, 0) if staging is not None else None
+        try:
+            try:
+                with contextlib.ExitStack() as writers:
+                    jobs = []
+                    for target, encoder, schedule, output_size in plans:
+                        writer = writers.enter_context(FFmpegVideoWriter(
+                            target.path, output_size, fps,
+                            audio_source=audio_source, audio_codec=media['audio_codec'],
+                            audio_start=start,
+                            audio_duration=None if end is None else end - start,
+                            video_params=encoder.video_params(
+                                output_size, fps, container=container_for(target.path))))
+                        jobs.append((schedule, output_size, writer))
+                    frame_count = render_targets(
+                        source, (w, h), fps, jobs, start=start, end=end, profiler=profiler,
+                        quality=self.quality, stages=profiler.stages,
+                        record=recorder.write if recorder is not None else None)
+                    self._log("🔊 正在完成编码并合并音频...")
+                    t_mux = time.perf_counter()
+            finally:
+                if recorder is not None:
+                    recorder.close()
+        except BaseException as e:
+            if staging is not None:
+                frame_cache.abort(staging)
+            if isinstance(e, (RuntimeError, OSError)):
+                raise RenderError(str(e)) from e
+            raise
+        add_stage_time(profiler.stages, 'mux', time.perf_counter() - t_mux)
+        if staging is not None and frame_cache.commit(cache_key, staging, (w, h)):
+            self._log("🗃️  解码帧已写入缓存")
+        for target, _, _, _ in plans:
+            self._log(f"📁 输出文件: {target.path}")
+        return frame_count
+
+    def _audio_source(self, video_path: str, media: dict) -> Optional[str]:
+        """混入输出的音轨来源: 原视频; 没有音轨时 (只能按时间线渲染) 为 None"""
+        if media['audio_codec'] is None:
+            self._log("⚠️  视频中没有音频轨道, 输出不含音频")
+            return None
+        return video_path
+
+    def _render_video(self, video_path: str, output_path: str, media: dict,
+                      zoom_timeline: ZoomTimeline, encoder: EncoderSettings, preview: bool,
+                      start: float, end: Optional[float], profiler: Profiler) -> int:
+        """process 的渲染部分: 选择画面参数、规划、校准编码速度, 单进程、分段并行或智能渲染"""
+        self._log("🎬 正在渲染最终视频...")
+        w, h = media['video_size']
+        fps = media['video_fps']
+        filters = []
+        quality = self.quality
+        if preview:
+            # 在解码端缩小画面、降低帧率, 后续所有处理都在小尺寸上进行
+            (w, h), fps = preview_geometry((w, h), fps)
+            filters = [f'scale={w}:{h}', f'fps={fps:g}']
+            quality = 'fast'
+            self._log(f"👀 预览模式: {w}x{h} @ {fps:g}fps")
+
+        try:
+            import cv2  # noqa: F401
+        except ImportError as e:
+            raise RenderError("需要安装 cv2 (opencv-python): pip install opencv-python") from e
+
+        # 预先计算所有帧的缩放计划 (按视频流时长估计帧数, 实际帧数以解码为准)
+        video_duration = media['duration'] or zoom_timeline.duration
+        expected_frames = max(int(np.ceil(video_duration * fps)), 1)
+        # 主体轨迹为归一化坐标, 在原视频上跟踪, 预览时同样适用
+        track = self.track_subject(video_path, media['video_size'], profiler) \
+            if self.follow_subject else None
+        schedule = self.plan(zoom_timeline, (w, h), fps, video_duration, track=track)
+
+        # 原视频的压缩音轨直接混入输出, 不经过中间文件
+        workers = self.workers
+        windowed = start > 0 or end is not None
+        if windowed:
+            window_end = min(end, video_duration) if end is not None else video_duration
+            expected_frames = max(int(np.ceil((window_end - start) * fps)), 1)
+            self._log(f"✂️  只渲染 {start:.2f}s - {window_end:.2f}s")
+        if workers > 1 and (preview or windowed):
+            self._log("⚠️  预览或指定时间范围时使用单进程渲染")
+            workers = 1
+        smart = self.smart
+        if smart and (preview or windowed):
+            self._log("⚠️  预览或指定时间范围时不使用智能渲染")
+            smart = False
+        elif smart and media['video_codec'] != SOURCE_CODEC_NAMES[encoder.codec]:
+            self._log(f"⚠️  源视频编码 ({media['video_codec']}) 与输出编码 ({encoder.codec}) "
+                      f"不同, 无法直接复制, 不使用智能渲染")
+            smart = False
+
+        if self.target_speed:
+            # 多进程时每个进程只需达到目标倍速的 1/workers
+            threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+            calibration_start = min(start, max(video_duration - CALIBRATION_SECONDS, 0.0))
+            self._log(f"⏱️  正在校准编码速度 (目标 {self.target_speed:g}x 实时)...")
+            with profiler.stage('calibrate'):
+                try:
+                    encoder, speeds = calibrate_encoder(
+                        video_path, schedule, (w, h), fps, encoder, self.target_speed / workers,
+                        start=calibration_start, quality=quality, filters=filters, threads=threads
+                    )
+                except (RuntimeError, OSError) as e:
+                    raise RenderError(f"编码速度校准失败: {e}") from e
+            for preset, speed in speeds.items():
+                self._log(f"   {preset}: {speed * workers:.2f}x")
+            if speeds[encoder.effective_preset] * workers < self.target_speed:
+                self._log("⚠️  最快的速度预设也达不到目标倍速")
+        self._log(f"🎞️  编码: {encoder.describe()}")
+
+        audio_source = self._audio_source(video_path, media)
+        frame_cache = cache_key = cached_frames = staging = None
+        if self.frame_cache and smart:
+            self._log("⚠️  智能渲染只解码含缩放的区段, 不使用解码帧缓存")
+        elif self.frame_cache:
+            frame_cache, cache_key, cached_frames, staging = self._open_frame_cache(
+                video_path, (w, h), fps, video_duration, filters, windowed, profiler)
+        profiler.begin_frames(expected_frames)
+
+        if smart:
+            # 无缩放的 GOP 直接复制源码流, 只重新编码含缩放的区段
+            with tempfile.TemporaryDirectory() as tmpdir:
+                try:
+                    return render_smart(
+                        video_path, output_path, schedule, (w, h), fps, video_duration,
+                        workers, tmpdir, encoder,
+                        audio_source=audio_source, audio_codec=media['audio_codec'],
+                        quality=quality, stages=profiler.stages, profiler=profiler
+                    )
+                except (RuntimeError, OSError) as e:
+                    raise RenderError(str(e)) from e
+
+        try:
+            if workers > 1:
+                # 多进程分段渲染后无损拼接
+                with tempfile.TemporaryDirectory() as tmpdir:
+                    try:
+                        count = render_parallel(
+                            video_path, output_path, schedule, (w, h), fps, video_duration,
+                            workers, tmpdir, audio_source=audio_source,
+                            audio_codec=media['audio_codec'],
+                            quality=quality, stages=profiler.stages, profiler=profiler,
+                            encoder=encoder,
+                            cached_frames=(cached_frames.directory
+                                           if cached_frames is not None else None),
+                            frame_staging=staging
+                        )
+                    except (RuntimeError, OSError) as e:
+                        raise RenderError(str(e)) from e
+            else:
+                # 帧直接送入最终编码器, 同时混入原视频音轨
+                source = video_path
+                recorder = FrameRecorder(staging, 0) if staging is not None else None
+                if cached_frames is not None:
+                    source, filters = cached_frames.iter_frames(start, end), ()
+                try:
+                    count = self.render(source, schedule, output_path, size=(w, h),
+                                        audio_source=audio_source, audio_codec=media['audio_codec'],
+                                        start=start, end=end, filters=filters,
+                                        video_params=encoder.video_params(
+                                            (w, h), fps, container=container_for(output_path)),
+                                        quality=quality, profiler=profiler,
+                                        record=recorder.write if recorder is not None else None)
+                finally:
+                    if recorder is not None:
+                        recorder.close()
+        except BaseException:
+            if staging is not None:
+                frame_cache.abort(staging)
+            raise
+        if staging is not None and frame_cache.commit(cache_key, staging, (w, h)):
+            self._log("🗃️  解码帧已写入缓存")
+        return count
+
+
+def process_video(video_path: str, output_path: Optional[str],
                   sensitivity: float = 0.5,
                   zoom_min: float = 1.0,
                   zoom_max: float = 1.3,
-                  zoom_duration: float = 0.2) -> bool:
+                  zoom_duration: float = 0.2,
+                  workers: int = 1,
+                  cache_dir: Optional[str] = None,
+                  analysis_sr: int = ANALYSIS_SAMPLE_RATE,
+                  hop_length: int = ANALYSIS_HOP_LENGTH,
+                  chunked: bool = False,
+                  tempo: str = 'global',
+                  accent_zoom: bool = False,
+                  follow_subject: bool = False,
+                  quality: str = 'best',
+                  encoding: str = DEFAULT_ENCODING,
+                  codec: str = DEFAULT_CODEC,
+                  target_speed: Optional[float] = None,
+                  smart: bool = False,
+                  frame_cache: bool = False,
+                  frame_cache_bytes: int = DEFAULT_FRAME_CACHE_BYTES,
+                  preview: bool = False,
+                  start: float = 0.0,
+                  end: Optional[float] = None,
+                  timeline: Optional[str] = None,
+                  export_timeline: Optional[str] = None,
+                  profile: Optional[str] = None,
+                  progress: Optional[Callable[[dict], None]] = None,
+                  targets: Optional[Sequence[Union[OutputTarget, dict, str]]] = None,
+                  stats: Optional[dict] = None) -> bool:
     """
-    处理视频的主函数
+    处理视频的主函数 (RhythmCamPipeline 的命令行封装: 打印处理过程, 出错时打印原因并返回 False)
 
     Args:
         video_path: 输入视频路径
-        output_path: 输出视频路径
+        output_path: 输出视频路径, None 表示只分析 (配合 export_timeline 使用)
         sensitivity: 节拍检测灵敏度 (0.0-1.0)
         zoom_min: 最小缩放比例
         zoom_max: 最大缩放比例
         zoom_duration: 缩放持续时间(秒)
+        workers: 并行渲染进程数, 大于 1 时按关键帧分段渲染
+        cache_dir: 节拍分析缓存目录, None 表示不使用缓存
+        analysis_sr: 节拍分析采样率
+        hop_length: 节拍分析帧移 (采样点)
+        chunked: 分块流式分析音频 (适合超长录音, 内存占用恒定)
+        tempo: 速度模式 global (默认, 整首一个速度) / adaptive (跟踪速度变化并检测小节第一拍,
+            小节第一拍总是按重拍缩放)
+        accent_zoom: 按每个节拍在前后 32 拍内的重音等级连续缩放峰值
+        follow_subject: 在低帧率缩小画面上用帧差跟踪运动主体 (如偏离画面中心的舞者),
+            缩放时裁剪区域平滑地跟随主体; 跟踪结果按视频文件内容缓存
+        quality: 缩放插值质量 fast / balanced / best
+        encoding: 编码档案 archive (默认) / social / fast / draft
+        codec: 编码格式 h264 (默认) / h265 / vp9; 输出为 .webm 时需要 vp9
+        target_speed: 目标实时倍速, 提供时在一小段视频上试渲染, 选择能达到该倍速的
+            最慢速度预设 (覆盖编码档案的默认预设)
+        smart: 智能渲染, 按 GOP 找出没有缩放效果的区段直接复制源视频码流, 只重新编码含缩放的区段
+            (源视频编码须与 codec 相同; 预览或指定时间范围时不生效)
+        frame_cache: 解码帧缓存, 以源视频内容为键把解码后的原始帧存放在缓存目录下,
+            同一源视频的后续渲染 (不同缩放参数、编码档案) 以内存映射读取而不再解码;
+            只有完整渲染 (不指定时间范围) 时写入, 预览使用单独的缩小画面条目; 与 smart 互斥
+        frame_cache_bytes: 解码帧缓存的总大小上限 (字节), 超过时淘汰最久未使用的条目
+        preview: 预览模式, 以低分辨率、低帧率解码并用最快预设编码, 用于快速调参
+        start: 只渲染该时间(秒)之后的部分
+        end: 只渲染该时间(秒)之前的部分, None 表示到结尾
+            (节拍仍按整条音轨分析, 保证与完整渲染的效果一致)
+        timeline: 时间线文件 (.json / .npz), 提供时跳过音频分析,
+            sensitivity / zoom_* 参数以时间线中的值为准; 此时视频可以没有音轨 (输出不含音频)
+        export_timeline: 把分析得到的时间线保存到该路径 (.json / .npz)
+        profile: 性能剖析输出路径, .jsonl 为逐行事件, 其他扩展名为 Chrome Trace JSON
+        progress: 进度回调, 依次收到 stage_start / progress / summary 事件字典,
+            可用于把处理进度上报给外部调度系统
+        targets: 多目标输出, 每项为 OutputTarget、字典 (键同 OutputTarget 的属性) 或命令行写法
+            "路径,aspect=9:16,height=1920,encoding=social"; 提供时只解码、分析一次,
+            每个目标按自己的裁剪比例和尺寸计算缩放, 多个编码器并行编码;
+            output_path 不为 None 时作为第一个目标 (源画面比例)。
+            不支持预览模式, 也不使用 workers / smart / target_speed
+        stats: 提供时写入运行统计: 'frames' 帧数, 'stages' 各阶段耗时(秒)
+            (audio_extract / beat_detection / subject_track / frame_cache / decode / frame_transform /
+            encode / mux)
 
     Returns:
         是否成功
     """
-    from moviepy import VideoFileClip
-
-    # 验证输入
-    if not os.path.exists(video_path):
-        print(f"❌ 视频文件不存在: {video_path}")
+    try:
+        pipeline = RhythmCamPipeline(
+            sensitivity=sensitivity, zoom_min=zoom_min, zoom_max=zoom_max,
+            zoom_duration=zoom_duration, workers=workers, cache_dir=cache_dir,
+            analysis_sr=analysis_sr, hop_length=hop_length, chunked=chunked,
+            tempo=tempo, accent_zoom=accent_zoom, follow_subject=follow_subject,
+            quality=quality, encoding=encoding,
+            codec=codec, target_speed=target_speed, smart=smart, frame_cache=frame_cache,
+            frame_cache_bytes=frame_cache_bytes, verbose=True,
+        )
+        result = pipeline.process(video_path, output_path, preview=preview, start=start, end=end,
+                                  timeline=timeline, export_timeline=export_timeline,
+                                  profile=profile, progress=progress, targets=targets)
+    except RhythmCamError as e:
+        print(f"❌ {e}")
+        return False
+    except Exception as e:
+        print(f"❌ 处理失败: {e}")
+        import traceback
+        traceback.print_exc()
         return False
 
-    # 创建临时目录
-    with tempfile.TemporaryDirectory() as tmpdir:
-        audio_path = os.path.join(tmpdir, "audio.wav")
-
-        # 步骤1: 提取音频
-        if not extract_audio(video_path, audio_path):
-            return False
-
-        # 步骤2: 检测节拍（带强度）
-        beats_with_strength, duration = detect_beats_with_strength(audio_path, sensitivity)
-        if not beats_with_strength:
-            print("❌ 未检测到节拍")
-            return False
-
-        # 步骤3: 应用缩放效果
-        try:
-            print("🎬 正在渲染最终视频...")
-
-            video = VideoFileClip(video_path)
-            original_audio = video.audio
-            w, h = video.size
-            fps = video.fps
-
-            # 使用 cv2 进行更高效的处理
-            try:
-                import cv2
-            except ImportError:
-                print("❌ 需要安装 cv2 (opencv-python)")
-                print("  pip install opencv-python")
-                return False
-
-            # 创建临时无音频视频文件
-            temp_video_no_audio = os.path.join(tmpdir, "temp_no_audio.mp4")
-
-            # 使用 H.264 编码器，设置高质量参数
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            # 提高编码质量
-            out = cv2.VideoWriter(temp_video_no_audio, fourcc, fps, (w, h),
-                                 [cv2.VIDEOWRITER_PROP_QUALITY, 95])
-
-            # 逐帧处理
-            total_frames = int(duration * fps)
-            for i in range(total_frames):
-                t = i / fps
-
-                # 获取原始帧（保持原始色彩空间）
-                frame = video.get_frame(t)
-
-                # 计算缩放因子 - 基于节拍强度
-                if beats_with_strength:
-                    # 找到最近的节拍及其强度
-                    min_dist = float('inf')
-                    nearest_strength = 0.0
-
-                    for beat_time, beat_strength in beats_with_strength:
-                        dist = abs(t - beat_time)
-                        if dist < min_dist:
-                            min_dist = dist
-                            nearest_strength = beat_strength
-
-                    if min_dist < zoom_duration:
-                        # 根据强度动态调整缩放幅度
-                        # 重拍（强度>0.6）: zoom_min 到 zoom_max
-                        # 弱拍（强度<=0.6）: zoom_min 到 (zoom_min + zoom_max) / 2
-                        if nearest_strength > 0.6:
-                            # 重拍 - 更大的缩放幅度
-                            max_zoom = zoom_max
-                        else:
-                            # 弱拍 - 较小的缩放幅度
-                            max_zoom = zoom_min + (zoom_max - zoom_min) * 0.6
-
-                        progress = min_dist / zoom_duration
-                        zoom_factor = max_zoom - (max_zoom - zoom_min) * progress
-                    else:
-                        zoom_factor = zoom_min
-                else:
-                    zoom_factor = zoom_min
-
-                # 应用缩放
-                if zoom_factor > zoom_min * 1.01:  # 稍微大于min才应用缩放
-                    new_w, new_h = int(w / zoom_factor), int(h / zoom_factor)
-                    x1 = (w - new_w) // 2
-                    y1 = (h - new_h) // 2
-                    x2 = x1 + new_w
-                    y2 = y1 + new_h
-
-                    # 保持色彩空间：RGB -> BGR (OpenCV格式)
-                    frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    cropped = frame_bgr[y1:y2, x1:x2]
-                    # 使用 LANCZOS 插值获得更好的缩放质量
-                    frame = cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LANCZOS4)
-                else:
-                    # 保持原色彩
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-                out.write(frame)
-
-                # 显示进度
-                if i % 30 == 0:
-                    print(f"   进度: {i/total_frames*100:.1f}%")
-
-            out.release()
-
-            # 如果有音频，先保存到临时文件
-            temp_audio_path = None
-            if original_audio is not None:
-                print("🔊 正在保存音频...")
-                temp_audio_path = os.path.join(tmpdir, "temp_audio.wav")
-                original_audio.write_audiofile(temp_audio_path)
-                # 关闭原始音频和视频以释放资源
-                original_audio.close()
-                original_audio = None
-            video.close()
-
-            # 添加音频到视频
-            print("🔊 正在合并音频和视频...")
-            video_processed = VideoFileClip(temp_video_no_audio)
-
-            if temp_audio_path is not None:
-                from moviepy import AudioFileClip
-                audio_final = AudioFileClip(temp_audio_path)
-                final_video = video_processed.with_audio(audio_final)
-            else:
-                final_video = video_processed
-
-            # 使用高质量参数输出
-            final_video.write_videofile(
-                output_path,
-                codec='libx264',
-                audio_codec='aac',
-                bitrate='12000k',  # 更高比特率保证质量
-                preset='slow',  # 使用慢速预设获得更好的压缩
-                ffmpeg_params=['-crf', '18',  # CRF 18 为高质量
-                               '-pix_fmt', 'yuv420p',  # 标准像素格式
-                               '-colorspace', 'bt709',  # 保持色彩空间
-                               '-movflags', '+faststart']  # 优化网络播放
-            )
-
-            video_processed.close()
-            if temp_audio_path is not None:
-                audio_final.close()
-            final_video.close()
-
-            print(f"✅ 视频处理完成!")
+    if stats is not None:
+        stats['frames'] = result['frames']
+        stats['stages'] = result['stages']
+    if targets or output_path is not None:
+        print(f"   共处理 {result['frames']} 帧")
+        print("✅ 视频处理完成!")
+        # 多目标输出时各目标的输出文件已由流水线逐个列出
+        if output_path is not None and not targets:
             print(f"📁 输出文件: {output_path}")
-            return True
-
-        except Exception as e:
-            print(f"❌ 处理失败: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+    return True
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description='为舞蹈视频添加跟随音乐节奏的缩放运镜效果'
-    )
-    parser.add_argument('video', help='输入视频文件路径')
-    parser.add_argument('-o', '--output', help='输出视频路径 (默认: output_rhythm.mp4)')
+def add_render_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加与单个视频处理参数对应的命令行选项 (rhythm_cam.py 与 batch.py 共用)"""
     parser.add_argument('-s', '--sensitivity', type=float, default=0.5,
                        help='节拍检测灵敏度 (0.0-1.0, 默认: 0.5)')
     parser.add_argument('--zoom-min', type=float, default=1.0,
@@ -377,29 +3216,119 @@ def main():
                        help='最大缩放比例 (默认: 1.3)')
     parser.add_argument('--zoom-duration', type=float, default=0.2,
                        help='缩放持续时间(秒) (默认: 0.2)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='并行渲染进程数, 按关键帧分段渲染后无损拼接 (默认: 1)')
+    parser.add_argument('--cache-dir', default=None,
+                       help='节拍分析缓存目录 (默认: ~/.cache/video-rhythm-cam)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='不读写节拍分析缓存')
+    parser.add_argument('--analysis-sr', type=int, default=ANALYSIS_SAMPLE_RATE,
+                       help=f'节拍分析采样率, 越低越快 (默认: {ANALYSIS_SAMPLE_RATE})')
+    parser.add_argument('--hop-length', type=int, default=ANALYSIS_HOP_LENGTH,
+                       help=f'节拍分析帧移(采样点), 越大越快但定位越粗 (默认: {ANALYSIS_HOP_LENGTH})')
+    parser.add_argument('--tempo', choices=TEMPO_MODES, default='global',
+                       help='速度模式: global (整首一个速度, 默认) / adaptive '
+                            '(跟踪速度变化并检测小节第一拍, 适合速度漂移的 DJ 混音)')
+    parser.add_argument('--accent-zoom', action='store_true',
+                       help='按每个节拍的局部重音等级连续缩放峰值 (小节第一拍最大)')
+    parser.add_argument('--follow-subject', action='store_true',
+                       help='跟踪画面中的运动主体, 缩放时裁剪区域跟随主体而不是固定居中')
+    parser.add_argument('--quality', choices=sorted(QUALITY_INTERPOLATION), default='best',
+                       help='缩放插值质量: fast (双线性) / balanced (双三次) / best (Lanczos, 默认)')
+    parser.add_argument('--encoding', choices=list(ENCODING_PROFILES), default=DEFAULT_ENCODING,
+                       help=f'编码档案 (默认: {DEFAULT_ENCODING}): ' + '; '.join(
+                           f'{name} {profile.description}' for name, profile in ENCODING_PROFILES.items()))
+    parser.add_argument('--codec', choices=list(CODEC_ENCODERS), default=DEFAULT_CODEC,
+                       help=f'编码格式 (默认: {DEFAULT_CODEC}); .webm 输出需要 vp9')
+    parser.add_argument('--target-speed', type=float, default=None,
+                       help='目标实时倍速 (如 2 表示渲染耗时为视频时长的一半), '
+                            '先在一小段视频上校准再选择速度预设')
+    parser.add_argument('--smart', action='store_true',
+                       help='智能渲染: 没有缩放效果的 GOP 直接复制源视频码流, 只重新编码含缩放的区段')
+    parser.add_argument('--frame-cache', action='store_true',
+                       help='缓存解码后的原始帧 (在缓存目录下), 同一源视频的后续渲染以内存映射读取, 不再解码')
+    parser.add_argument('--frame-cache-size', type=float,
+                       default=DEFAULT_FRAME_CACHE_BYTES / 1024 ** 3,
+                       help=f'解码帧缓存上限(GB) (默认: {DEFAULT_FRAME_CACHE_BYTES // 1024 ** 3})')
+    parser.add_argument('--chunked', action='store_true',
+                       help='分块流式分析音频, 内存占用与时长无关 (适合数小时的录音)')
+    parser.add_argument('--preview', action='store_true',
+                       help=f'预览模式: {PREVIEW_HEIGHT}p、最高 {PREVIEW_FPS:g}fps、最快编码, 用于快速调参')
+    parser.add_argument('--start', type=float, default=0.0,
+                       help='只渲染该时间(秒)之后的部分 (默认: 0)')
+    parser.add_argument('--end', type=float, default=None,
+                       help='只渲染该时间(秒)之前的部分 (默认: 到结尾)')
+
+
+def render_kwargs(args: argparse.Namespace) -> dict:
+    """把 add_render_arguments 解析出的选项转换为 process_video 的关键字参数"""
+    return {
+        'sensitivity': args.sensitivity,
+        'zoom_min': args.zoom_min,
+        'zoom_max': args.zoom_max,
+        'zoom_duration': args.zoom_duration,
+        'workers': args.workers,
+        'cache_dir': None if args.no_cache else (args.cache_dir or default_cache_dir()),
+        'analysis_sr': args.analysis_sr,
+        'hop_length': args.hop_length,
+        'chunked': args.chunked,
+        'tempo': args.tempo,
+        'accent_zoom': args.accent_zoom,
+        'follow_subject': args.follow_subject,
+        'quality': args.quality,
+        'encoding': args.encoding,
+        'codec': args.codec,
+        'target_speed': args.target_speed,
+        'smart': args.smart,
+        'frame_cache': args.frame_cache,
+        'frame_cache_bytes': int(args.frame_cache_size * 1024 ** 3),
+        'preview': args.preview,
+        'start': args.start,
+        'end': args.end,
+    }
+
+
+def default_output_path(video_path: str, preview: bool = False) -> str:
+    """默认输出路径: <原文件名>_rhythm.mp4 (预览模式为 <原文件名>_preview.mp4)"""
+    base, _ = os.path.splitext(video_path)
+    return f"{base}_preview.mp4" if preview else f"{base}_rhythm.mp4"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='为舞蹈视频添加跟随音乐节奏的缩放运镜效果'
+    )
+    parser.add_argument('video', help='输入视频文件路径')
+    parser.add_argument('-o', '--output',
+                       help='输出视频路径 (默认: <输入文件名>_rhythm.mp4, 预览时为 _preview.mp4)')
+    parser.add_argument('--export-timeline',
+                       help='把节拍/缩放时间线导出为 .json 或 .npz; 未指定 -o 时只分析不渲染')
+    parser.add_argument('--timeline',
+                       help='使用已有的时间线文件渲染, 跳过音频分析')
+    parser.add_argument('--profile',
+                       help='写出性能剖析: .jsonl 为逐行事件, 其他扩展名为 Chrome Trace (chrome://tracing)')
+    parser.add_argument('--target', action='append', default=[], metavar='PATH[,KEY=VALUE...]',
+                       help='附加输出目标, 可重复; 键: aspect (如 9:16) / size (如 1280x720) / '
+                            'width / height / encoding / codec。所有目标只解码、分析一次, '
+                            '并行编码; 未指定 -o 时只输出这些目标')
+    add_render_arguments(parser)
 
     args = parser.parse_args()
 
     # 检查依赖
-    if not check_dependencies():
+    if not check_dependencies(analysis=args.timeline is None):
         sys.exit(1)
 
     # 设置输出路径
-    if args.output:
-        output_path = args.output
-    else:
-        base, _ = os.path.splitext(args.video)
-        output_path = f"{base}_rhythm.mp4"
+    output_path = args.output or default_output_path(args.video, args.preview)
+    if (args.export_timeline or args.target) and not args.output:
+        output_path = None
 
     # 处理视频
-    success = process_video(
-        args.video,
-        output_path,
-        sensitivity=args.sensitivity,
-        zoom_min=args.zoom_min,
-        zoom_max=args.zoom_max,
-        zoom_duration=args.zoom_duration
-    )
+    success = process_video(args.video, output_path,
+                            timeline=args.timeline, export_timeline=args.export_timeline,
+                            profile=args.profile, targets=args.target,
+                            **render_kwargs(args))
 
     sys.exit(0 if success else 1)
 
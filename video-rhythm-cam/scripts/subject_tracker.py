@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+画面主体跟踪
+在低帧率、缩小的灰度帧上做帧差, 取运动能量的加权质心作为主体位置,
+时间平滑后插值到每个渲染帧, 缩放时把裁剪区域移向主体而不是固定居中
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+# 跟踪帧率: 舞者位置变化远慢于视频帧率, 每秒几帧足够
+TRACK_FPS = 5.0
+# 跟踪画面宽度(像素), 高度按原画面比例取偶数
+TRACK_WIDTH = 160
+# 灰度差低于该值视为噪声 (压缩噪点、轻微闪烁)
+MOTION_THRESHOLD = 12
+# 运动像素占比低于该值时认为没有可靠的主体, 沿用上一个可靠位置
+MIN_MOTION_FRACTION = 0.004
+# 时间平滑的高斯核标准差(秒), 越大镜头移动越平缓
+SMOOTHING_SECONDS = 0.6
+
+
+def track_size(size: Tuple[int, int], width: int = TRACK_WIDTH) -> Tuple[int, int]:
+    """跟踪画面尺寸 (w, h): 宽度不超过 width, 保持比例, 均为偶数"""
+    w, h = size
+    tw = max(min(width, w) // 2 * 2, 2)
+    th = max(int(round(h * tw / w / 2)) * 2, 2)
+    return tw, th
+
+
+def motion_center(prev: np.ndarray, frame: np.ndarray) -> Tuple[float, float, float]:
+    """
+    两帧灰度图之间运动能量的加权质心
+
+    Args:
+        prev: 上一帧, (h, w) uint8
+        frame: 当前帧, (h, w) uint8
+
+    Returns:
+        (cx, cy, fraction): 归一化质心坐标 (0-1) 与运动像素占比
+    """
+    diff = np.abs(frame.astype(np.int16) - prev.astype(np.int16))
+    diff[diff < MOTION_THRESHOLD] = 0
+    moving = np.count_nonzero(diff)
+    if moving == 0:
+        return 0.5, 0.5, 0.0
+    h, w = diff.shape
+    energy = diff.astype(np.float32)
+    total = float(energy.sum())
+    # 行、列投影上的加权平均, 取像素中心
+    cx = float(energy.sum(axis=0) @ (np.arange(w) + 0.5)) / total / w
+    cy = float(energy.sum(axis=1) @ (np.arange(h) + 0.5)) / total / h
+    return cx, cy, moving / diff.size
+
+
+def _gaussian_smooth(values: np.ndarray, sigma: float) -> np.ndarray:
+    """沿第 0 维做高斯平滑, 两端按边缘值延拓"""
+    if sigma <= 0 or len(values) < 2:
+        return values
+    radius = max(int(np.ceil(3 * sigma)), 1)
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+    padded = np.pad(values, ((radius, radius), (0, 0)), mode='edge')
+    return np.stack([np.convolve(padded[:, k], kernel, mode='valid')
+                     for k in range(values.shape[1])], axis=1)
+
+
+@dataclass
+class SubjectTrack:
+    """
+    主体位置轨迹
+
+    Attributes:
+        times: 采样时间(秒), shape (n,)
+        centers: 平滑后的归一化主体中心 (cx, cy), shape (n, 2)
+        confidence: 每个采样的运动像素占比, shape (n,)
+    """
+    times: np.ndarray
+    centers: np.ndarray
+    confidence: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def at(self, frame_times: np.ndarray) -> np.ndarray:
+        """线性插值到给定时间点, 返回 (len(frame_times), 2); 没有采样时全部居中"""
+        t = np.asarray(frame_times, dtype=np.float64)
+        if len(self.times) == 0:
+            return np.full((len(t), 2), 0.5)
+        return np.stack([np.interp(t, self.times, self.centers[:, k]) for k in range(2)], axis=1)
+
+    def to_dict(self) -> dict:
+        return {'times': self.times, 'centers': self.centers, 'confidence': self.confidence}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SubjectTrack':
+        return cls(
+            times=np.asarray(data['times'], dtype=np.float64),
+            centers=np.asarray(data['centers'], dtype=np.float64).reshape(-1, 2),
+            confidence=np.asarray(data['confidence'], dtype=np.float64),
+        )
+
+
+class MotionTracker:
+    """
+    流式主体跟踪: 逐帧送入按 fps 等间隔采样的灰度图, 最后得到平滑的轨迹
+
+    只保留上一帧和每帧三个数, 内存与视频时长基本无关。
+    """
+
+    def __init__(self, fps: float = TRACK_FPS, smoothing: float = SMOOTHING_SECONDS):
+        """
+        Args:
+            fps: 送入帧的采样率
+            smoothing: 时间平滑的高斯核标准差(秒)
+        """
+        self.fps = fps
+        self.smoothing = smoothing
+        self._prev: Optional[np.ndarray] = None
+        self._samples: List[Tuple[float, float, float]] = []
+
+    def update(self, frame: np.ndarray) -> None:
+        """送入下一帧 (h, w) uint8 灰度图 (只在调用期间读取, 可复用缓冲区)"""
+        if self._prev is not None:
+            self._samples.append(motion_center(self._prev, frame))
+            self._prev[...] = frame
+        else:
+            self._prev = frame.copy()
+
+    def finish(self) -> SubjectTrack:
+        """
+        生成轨迹: 运动不足的采样沿用上一个可靠位置 (开头之前用第一个可靠位置,
+        全程都不可靠时居中), 再做时间平滑
+        """
+        n = len(self._samples)
+        samples = np.array(self._samples, dtype=np.float64).reshape(n, 3)
+        # 第 i 个采样是第 i 帧与第 i+1 帧之间的运动
+        times = (np.arange(n) + 0.5) / self.fps
+        confidence = samples[:, 2]
+        reliable = confidence >= MIN_MOTION_FRACTION
+        if not np.any(reliable):
+            return SubjectTrack(times, np.full((n, 2), 0.5), confidence)
+
+        # 向前填充: 每个采样取不晚于它的最后一个可靠采样, 之前没有则取第一个
+        last = np.maximum.accumulate(np.where(reliable, np.arange(n), -1))
+        last[last < 0] = np.argmax(reliable)
+        centers = _gaussian_smooth(samples[last, :2], self.smoothing * self.fps)
+        return SubjectTrack(times, centers, confidence)
@@ -0,0 +1,6 @@
+"""测试公共设置: 脚本之间直接按文件名导入, 把 scripts 目录加入搜索路径"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
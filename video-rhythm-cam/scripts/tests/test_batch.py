@@ -0,0 +1,82 @@
+"""批量模式: 跳过已是最新的输出"""
+
+import os
+
+import pytest
+
+from batch import is_up_to_date, outcome, task_outputs
+
+
+def _touch(path, mtime):
+    with open(path, 'a'):
+        pass
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def task(tmp_path):
+    video = _touch(tmp_path / 'a.mp4', 1000)
+    output = _touch(tmp_path / 'a_rhythm.mp4', 2000)
+    return {'video': video, 'output': output, 'params': {'zoom_max': 1.3}}
+
+
+def _previous(task, **changes):
+    record = dict({'output': task['output'], 'params': dict(task['params']), 'status': 'ok'},
+                  **changes)
+    return {task['output']: record}
+
+
+def test_up_to_date(task):
+    assert is_up_to_date(task, _previous(task))
+
+
+def test_stale_or_missing_output(task):
+    os.utime(task['output'], (500, 500))
+    assert not is_up_to_date(task, _previous(task))
+    os.remove(task['output'])
+    assert not is_up_to_date(task, _previous(task))
+
+
+def test_previous_run_must_match(task):
+    assert not is_up_to_date(task, {})
+    assert not is_up_to_date(task, _previous(task, status='failed'))
+    assert not is_up_to_date(task, _previous(task, params={'zoom_max': 1.5}))
+
+
+def test_target_outputs_are_checked(task, tmp_path):
+    vertical = _touch(tmp_path / 'a_9x16.mp4', 2000)
+    square = str(tmp_path / 'a_1x1.mp4')
+    task['params']['targets'] = [f'{vertical},aspect=9:16,height=1920',
+                                 {'path': square, 'aspect': '1:1'}]
+    assert task_outputs(task) == [task['output'], vertical, square]
+    # 第二个输出目标不存在
+    assert not is_up_to_date(task, _previous(task))
+    _touch(square, 2000)
+    assert is_up_to_date(task, _previous(task))
+    # 输出目标比源视频旧
+    os.utime(vertical, (500, 500))
+    assert not is_up_to_date(task, _previous(task))
+
+
+def test_exported_timeline_is_checked(task, tmp_path):
+    task['params']['export_timeline'] = str(tmp_path / 'a.beats.json')
+    assert not is_up_to_date(task, _previous(task))
+    _touch(task['params']['export_timeline'], 2000)
+    assert is_up_to_date(task, _previous(task))
+
+
+def test_timeline_input_is_checked(task, tmp_path):
+    task['params']['timeline'] = _touch(tmp_path / 'edited.json', 3000)
+    assert not is_up_to_date(task, _previous(task))
+
+
+def test_invalid_target_is_not_up_to_date(task):
+    task['params']['targets'] = ['out.mp4,bogus=1']
+    assert not is_up_to_date(task, _previous(task))
+
+
+def test_skipped_record_keeps_previous_status(task):
+    record = dict(_previous(task)[task['output']], skipped=True)
+    assert outcome(record) == 'skipped'
+    assert is_up_to_date(task, {task['output']: record})
@@ -0,0 +1,67 @@
+"""节拍缓存: 缓存键规则和按最近使用时间淘汰"""
+
+import os
+
+import numpy as np
+
+from beat_cache import BeatCache
+
+
+def _entry(value):
+    return {'beat_times': np.full(1000, value, dtype=np.float64)}
+
+
+def test_key_depends_on_audio_rate_and_params():
+    y = np.random.default_rng(0).standard_normal(22050).astype(np.float32)
+    key = BeatCache.make_key(y, 22050, {'hop': 512})
+    assert key == BeatCache.make_key(y.astype(np.float64), 22050, {'hop': 512})
+    assert key != BeatCache.make_key(y[:-1], 22050, {'hop': 512})
+    assert key != BeatCache.make_key(y, 44100, {'hop': 512})
+    assert key != BeatCache.make_key(y, 22050, {'hop': 256})
+
+
+def test_incremental_key_matches():
+    y = np.random.default_rng(1).standard_normal(10000).astype(np.float32)
+    hasher = BeatCache.key_hasher(22050, {'a': 1, 'b': 2})
+    for block in np.array_split(y, 7):
+        hasher.update(block.data)
+    # 参数字典的顺序不影响键
+    assert hasher.hexdigest() == BeatCache.make_key(y, 22050, {'b': 2, 'a': 1})
+
+
+def test_file_key_follows_content(tmp_path):
+    path = tmp_path / 'a.mp4'
+    path.write_bytes(b'first')
+    key = BeatCache.make_file_key(str(path), {})
+    path.write_bytes(b'second')
+    os.utime(path, ns=(0, 10 ** 9))
+    assert BeatCache.make_file_key(str(path), {}) != key
+
+
+def test_round_trip_and_corrupt_entry(tmp_path):
+    cache = BeatCache(str(tmp_path))
+    assert cache.get('missing') is None
+    cache.put('a', _entry(1.0))
+    np.testing.assert_array_equal(cache.get('a')['beat_times'], _entry(1.0)['beat_times'])
+
+    with open(cache._path('a'), 'wb') as f:
+        f.write(b'not an npz')
+    assert cache.get('a') is None
+    assert not os.path.exists(cache._path('a'))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = BeatCache(str(tmp_path))
+    cache.put('a', _entry(1.0))
+    entry_bytes = os.path.getsize(cache._path('a'))
+    cache.max_bytes = entry_bytes * 2 + entry_bytes // 2
+
+    cache.put('b', _entry(2.0))
+    os.utime(cache._path('a'), (1000, 1000))
+    os.utime(cache._path('b'), (2000, 2000))
+    # 读取 a 刷新其使用时间, 写入 c 超出上限时淘汰的是 b
+    assert cache.get('a') is not None
+    cache.put('c', _entry(3.0))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
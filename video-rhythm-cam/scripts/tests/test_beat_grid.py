@@ -0,0 +1,43 @@
+"""自适应节拍网格的回归测试 (合成音轨, 已知节拍真值)"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('librosa')
+
+from evaluate_beats import beat_f_measure
+from generate_test_video import create_test_track, load_ground_truth
+from rhythm_cam import analyze_beats_adaptive, load_audio
+
+SR = 22050
+
+
+@pytest.fixture(scope='module')
+def track_120(tmp_path_factory):
+    """120 BPM, 4/4, 带反拍的 30 秒合成音轨"""
+    audio_path = str(tmp_path_factory.mktemp('tracks') / 'bpm120.wav')
+    beats_path = create_test_track(audio_path, duration=30, bpm=120)
+    y = load_audio(audio_path, SR)
+    return y, load_ground_truth(beats_path)
+
+
+@pytest.mark.parametrize('hop_length', [512, 1024])
+def test_offbeats_do_not_double_the_tempo(track_120, hop_length):
+    """反拍不应让速度锁定到 240 BPM; 非默认帧移下节拍位置不应整体偏移"""
+    y, truth = track_120
+    analysis = analyze_beats_adaptive(y, SR, hop_length=hop_length)
+
+    assert analysis.tempo == pytest.approx(120, rel=0.03)
+    assert np.all(np.abs(analysis.tempo_curve - 120) < 6)
+    assert beat_f_measure(analysis.beat_times, truth['times'])['f_measure'] > 0.95
+
+
+
+@pytest.mark.parametrize('hop_length', [256, 512, 1024])
+def test_downbeats_follow_the_bar(track_120, hop_length):
+    """第三拍 (重音 0.8) 只比第一拍 (1.0) 略轻, 小节第一拍仍应对齐真值"""
+    y, truth = track_120
+    analysis = analyze_beats_adaptive(y, SR, hop_length=hop_length)
+    detected = analysis.beat_times[analysis.downbeats]
+    reference = truth['times'][truth['downbeats']]
+    assert beat_f_measure(detected, reference)['f_measure'] > 0.9
@@ -0,0 +1,51 @@
+"""节拍 F 值的匹配规则"""
+
+import numpy as np
+import pytest
+
+from evaluate_beats import MATCH_TOLERANCE, beat_f_measure
+
+REFERENCE = np.array([1.0, 2.0, 3.0, 4.0])
+
+
+def test_perfect_match():
+    result = beat_f_measure(REFERENCE + 0.03, REFERENCE)
+    assert result['f_measure'] == result['precision'] == result['recall'] == 1.0
+    assert result['matches'].tolist() == [[0, 0], [1, 1], [2, 2], [3, 3]]
+
+
+def test_tolerance_boundary():
+    detected = np.array([1.0 + MATCH_TOLERANCE - 0.001, 2.0 - MATCH_TOLERANCE - 0.001])
+    result = beat_f_measure(detected, REFERENCE)
+    assert result['matches'].tolist() == [[0, 0]]
+    assert result['precision'] == 0.5
+    assert result['recall'] == 0.25
+    assert result['f_measure'] == pytest.approx(2 * 0.5 * 0.25 / 0.75)
+
+
+def test_duplicate_detections_match_once():
+    # 同一真值节拍附近的两个检测只算一次命中, 保留误差较小者
+    result = beat_f_measure(np.array([1.05, 1.01, 3.0]), REFERENCE)
+    assert result['matches'].tolist() == [[1, 0], [2, 2]]
+    assert result['precision'] == pytest.approx(2 / 3)
+    assert result['recall'] == 0.5
+
+
+def test_detection_matches_nearest_reference():
+    # 1.52 在容差内且离 2.0 比离 1.0 近, 与 1.96 争同一个真值节拍, 由误差较小的 1.96 取得
+    result = beat_f_measure(np.array([1.52, 1.96]), REFERENCE, tolerance=0.5)
+    assert result['matches'].tolist() == [[1, 1]]
+
+
+def test_double_tempo_halves_precision():
+    detected = np.arange(1.0, 4.01, 0.5)
+    result = beat_f_measure(detected, REFERENCE)
+    assert result['recall'] == 1.0
+    assert result['precision'] == pytest.approx(4 / 7)
+
+
+def test_empty():
+    for detected, reference in [([], REFERENCE), (REFERENCE, [])]:
+        result = beat_f_measure(np.array(detected), np.array(reference))
+        assert result['f_measure'] == 0.0
+        assert result['matches'].shape == (0, 2)
@@ -0,0 +1,122 @@
+"""Profiler 汇总 (帧数与帧率) 和基准测试/评测共用的辅助函数"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmark import parse_list
+from profiler import PROGRESS_INTERVAL, Profiler, run_isolated
+from rhythm_cam import build_zoom_schedule, render_frames, render_targets
+
+
+class FakeWriter:
+    """只计数的编码器替身"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+    def queue_depth(self):
+        return None
+
+
+def _schedule(n, fps, size):
+    times = np.arange(n) / fps
+    return build_zoom_schedule(times, fps, [0.5], [1.3], size)
+
+
+def _summary(path):
+    with open(path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    return [e for e in events if e['type'] == 'summary'][-1]
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+@pytest.mark.parametrize('n', [PROGRESS_INTERVAL * 2 + 15, 7])
+def test_render_frames_reports_final_count(tmp_path, pipelined, n):
+    """总帧数不是 PROGRESS_INTERVAL 的整数倍 (或不足一个间隔) 时汇总仍为实际帧数"""
+    fps, size = 30.0, (64, 36)
+    frames = np.zeros((n, size[1], size[0], 3), dtype=np.uint8)
+    profile = str(tmp_path / 'p.jsonl')
+    profiler = Profiler(profile, verbose=False)
+    profiler.begin_frames(n)
+    writer = FakeWriter()
+    count = render_frames(frames, _schedule(n, fps, size), size, fps, writer,
+                          profiler=profiler, pipelined=pipelined)
+    profiler.close()
+
+    assert count == writer.frames == n
+    summary = _summary(profile)
+    assert summary['frames'] == n
+    assert summary['fps'] > 0
+
+
+def test_render_targets_reports_final_count(tmp_path):
+    n, fps, size = 40, 30.0, (64, 36)
+    frames = np.zeros((n, size[1], size[0], 3), dtype=np.uint8)
+    profile = str(tmp_path / 'p.jsonl')
+    profiler = Profiler(profile, verbose=False)
+    profiler.begin_frames(n)
+    writers = [FakeWriter(), FakeWriter()]
+    targets = [(_schedule(n, fps, size), size, writer) for writer in writers]
+    assert render_targets(frames, size, fps, targets, profiler=profiler) == n
+    profiler.close()
+    assert [w.frames for w in writers] == [n, n]
+    assert _summary(profile)['frames'] == n
+
+
+def test_summary_fps_excludes_time_after_last_report():
+    """帧率按最后一次上报的时刻计算, 不含之后的混流等阶段"""
+    now = [0.0]
+    profiler = Profiler(verbose=False)
+    profiler._clock = lambda: now[0]
+    profiler.begin_frames(75)
+    now[0] = 2.0
+    profiler.frames(60)
+    now[0] = 2.5
+    profiler.frames(75)
+    # 混流
+    now[0] = 10.0
+    summary = profiler.summary()
+    assert summary['frames'] == 75
+    assert summary['fps'] == pytest.approx(30.0)
+
+
+def test_summary_without_frames():
+    summary = Profiler(verbose=False).summary()
+    assert summary['frames'] == 0
+    assert summary['fps'] == 0.0
+
+
+def _child_pid(job):
+    return {'pid': os.getpid(), 'value': job['value'] * 2}
+
+
+def _child_fails(job):
+    raise RuntimeError(job['message'])
+
+
+def _child_crashes(job):
+    os._exit(3)
+
+
+def test_run_isolated_runs_in_a_fresh_process():
+    result = run_isolated(_child_pid, {'value': 21})
+    assert result['value'] == 42
+    assert result['pid'] != os.getpid()
+
+
+def test_run_isolated_reports_errors():
+    assert run_isolated(_child_fails, {'message': '坏参数'}) == {'error': 'RuntimeError: 坏参数'}
+    assert 'error' in run_isolated(_child_crashes, {})
+
+
+def test_parse_list():
+    assert parse_list('720p, 1080p,,') == ['720p', '1080p']
+    assert parse_list('512,1024', int) == [512, 1024]
+    with pytest.raises(ValueError):
+        parse_list('10,x', float)
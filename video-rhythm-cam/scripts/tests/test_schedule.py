@@ -0,0 +1,60 @@
+"""向量化缩放计划与逐帧查找最近节拍的结果一致"""
+
+import numpy as np
+import pytest
+
+from rhythm_cam import ZOOM_APPLY_RATIO, build_zoom_schedule
+
+
+def _reference_zoom(t, beats, peaks, zoom_min, zoom_duration):
+    """逐帧扫描所有节拍的原始算法 (距离相同时取较早的节拍)"""
+    best, best_dist = None, None
+    for beat, peak in sorted(zip(beats, peaks), key=lambda bp: bp[0]):
+        dist = abs(t - beat)
+        if best_dist is None or dist < best_dist:
+            best, best_dist = peak, dist
+    if best is None or best_dist >= zoom_duration:
+        return zoom_min
+    return best - (best - zoom_min) * best_dist / zoom_duration
+
+
+@pytest.mark.parametrize('zoom_min', [1.0, 1.1])
+def test_matches_per_frame_scan(zoom_min):
+    rng = np.random.default_rng(0)
+    fps, size, zoom_duration = 30.0, (320, 180), 0.2
+    times = np.arange(300) / fps
+    # 未排序的节拍, 含相距很近的两拍
+    beats = np.concatenate([rng.uniform(0, 10, 20), [4.0, 4.05]])
+    peaks = rng.uniform(zoom_min + 0.1, zoom_min + 0.5, len(beats))
+
+    schedule = build_zoom_schedule(times, fps, beats, peaks, size,
+                                   zoom_min=zoom_min, zoom_duration=zoom_duration)
+    expected = [_reference_zoom(t, beats, peaks, zoom_min, zoom_duration) for t in times]
+
+    assert len(schedule) == len(times)
+    np.testing.assert_allclose(schedule.zoom, expected)
+    np.testing.assert_array_equal(schedule.active, schedule.zoom > zoom_min * ZOOM_APPLY_RATIO)
+
+
+def test_tie_takes_earlier_beat():
+    # t=0.5 与两个节拍等距, 应取较早节拍 (峰值 1.4)
+    schedule = build_zoom_schedule([0.5], 30.0, [0.6, 0.4], [1.2, 1.4], (100, 100),
+                                   zoom_duration=0.2)
+    assert schedule.zoom[0] == pytest.approx(1.4 - 0.4 * 0.5)
+
+
+def test_centered_rects():
+    w, h = 320, 180
+    schedule = build_zoom_schedule([0.0, 1.0], 30.0, [0.0], [1.25], (w, h))
+    x1, y1, x2, y2 = schedule.rects[0]
+    assert (x2 - x1, y2 - y1) == (int(w / 1.25), int(h / 1.25))
+    assert (x1, y1) == ((w - (x2 - x1)) // 2, (h - (y2 - y1)) // 2)
+    # 没有缩放的帧保留完整画面, 不需要处理
+    assert list(schedule.rects[1]) == [0, 0, w, h]
+    assert list(schedule.active) == [True, False]
+
+
+def test_no_beats():
+    schedule = build_zoom_schedule(np.arange(10) / 30.0, 30.0, [], [], (64, 36))
+    assert np.all(schedule.zoom == 1.0)
+    assert not schedule.active.any()
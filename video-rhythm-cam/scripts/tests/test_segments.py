@@ -0,0 +1,62 @@
+"""按关键帧 (GOP) 切分时间轴: 并行渲染的片段和智能渲染的复制/重新编码区段"""
+
+import numpy as np
+
+from rhythm_cam import build_zoom_schedule, plan_segments, plan_smart_spans
+
+# 每 2 秒一个关键帧的 10 秒视频
+KEYFRAMES = np.arange(0.0, 10.0, 2.0)
+
+
+def test_segments_snap_to_keyframes():
+    segments = plan_segments(KEYFRAMES, 10.0, 3)
+    # 目标边界 3.33 / 6.67 落到最近的关键帧 4 / 6
+    assert segments == [(0.0, 4.0), (4.0, 6.0), (6.0, None)]
+
+
+def test_segments_cover_timeline_without_gaps():
+    keyframes = np.sort(np.random.default_rng(1).uniform(0, 60, 40))
+    segments = plan_segments(keyframes, 60.0, 8)
+    assert segments[0][0] == 0.0 and segments[-1][1] is None
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start and end in keyframes
+
+
+def test_segments_merge_duplicate_bounds():
+    # 关键帧太少时多个目标落在同一关键帧, 不产生空片段
+    assert plan_segments(np.array([0.0, 5.0]), 10.0, 4) == [(0.0, 5.0), (5.0, None)]
+
+
+def test_single_segment():
+    assert plan_segments(KEYFRAMES, 10.0, 1) == [(0.0, None)]
+    # 只有第 0 秒一个关键帧时无法切分
+    assert plan_segments(np.array([0.0]), 10.0, 4) == [(0.0, None)]
+
+
+def _schedule(beats, zoom_duration=0.2, duration=10.0, fps=30.0):
+    times = np.arange(int(duration * fps)) / fps
+    return build_zoom_schedule(times, fps, beats, [1.3] * len(beats), (64, 36),
+                               zoom_duration=zoom_duration)
+
+
+def test_smart_spans_reencode_touched_gops():
+    spans = plan_smart_spans(KEYFRAMES, _schedule([5.0]))
+    assert spans == [(0.0, 4.0, False), (4.0, 6.0, True), (6.0, None, False)]
+
+
+def test_smart_spans_merge_adjacent_gops():
+    # 跨越关键帧的缩放让前后两个 GOP 都重新编码, 合并为一个区段
+    spans = plan_smart_spans(KEYFRAMES, _schedule([4.0, 8.5]))
+    assert spans == [(0.0, 2.0, False), (2.0, 6.0, True), (6.0, 8.0, False), (8.0, None, True)]
+
+
+def test_smart_spans_keyframe_rounding():
+    # 关键帧时间戳略晚于帧时间时, 该帧仍属于以这个关键帧开始的 GOP
+    keyframes = np.concatenate([[0.0], KEYFRAMES[1:] + 0.0004])
+    spans = plan_smart_spans(keyframes, _schedule([4.0], zoom_duration=0.02))
+    assert spans == [(0.0, 4.0004, False), (4.0004, 6.0004, True), (6.0004, None, False)]
+
+
+def test_smart_spans_untouched_or_without_keyframes():
+    assert plan_smart_spans(KEYFRAMES, _schedule([])) == [(0.0, None, False)]
+    assert plan_smart_spans(np.array([0.0]), _schedule([5.0])) == [(0.0, None, True)]
@@ -0,0 +1,73 @@
+"""缩放时间线在 JSON 和 .npz 之间保存、读取"""
+
+import json
+
+import numpy as np
+import pytest
+
+from rhythm_cam import TIMELINE_VERSION, ZoomTimeline
+
+
+def _timeline(downbeats=True):
+    return ZoomTimeline(
+        beat_times=np.array([0.5, 1.0, 1.5, 2.0]),
+        beat_strengths=np.array([1.0, 0.25, 0.75, 0.5]),
+        beat_peaks=np.array([1.3, 1.12, 1.25, 1.18]),
+        zoom_min=1.0,
+        zoom_duration=0.2,
+        duration=2.5,
+        downbeats=np.array([True, False, False, False]) if downbeats else None,
+    )
+
+
+def _assert_same(a, b):
+    for name in ('beat_times', 'beat_strengths', 'beat_peaks'):
+        np.testing.assert_allclose(getattr(a, name), getattr(b, name))
+    assert (a.zoom_min, a.zoom_duration, a.duration) == (b.zoom_min, b.zoom_duration, b.duration)
+    if a.downbeats is None:
+        assert b.downbeats is None
+    else:
+        np.testing.assert_array_equal(a.downbeats, b.downbeats)
+
+
+@pytest.mark.parametrize('downbeats', [True, False])
+@pytest.mark.parametrize('first, second', [('.json', '.npz'), ('.npz', '.json')])
+def test_round_trip(tmp_path, first, second, downbeats):
+    original = _timeline(downbeats)
+    original.save(str(tmp_path / f'a{first}'))
+    loaded = ZoomTimeline.load(str(tmp_path / f'a{first}'))
+    loaded.save(str(tmp_path / f'b{second}'))
+    _assert_same(original, ZoomTimeline.load(str(tmp_path / f'b{second}')))
+
+
+def test_json_one_beat_per_line(tmp_path):
+    path = tmp_path / 'a.json'
+    _timeline().save(str(path))
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert sum('"time"' in line for line in lines) == 4
+    assert json.loads(path.read_text(encoding='utf-8'))['version'] == TIMELINE_VERSION
+
+
+def test_hand_edited_json(tmp_path):
+    # 手写的时间线: 节拍无序, 省略 strength 和文件头字段
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps({'beats': [{'time': 2.0, 'zoom': 1.2},
+                                          {'time': 1.0, 'zoom': 1.4, 'strength': 0.5}]}))
+    timeline = ZoomTimeline.load(str(path))
+    np.testing.assert_allclose(timeline.beat_times, [1.0, 2.0])
+    np.testing.assert_allclose(timeline.beat_peaks, [1.4, 1.2])
+    np.testing.assert_allclose(timeline.beat_strengths, [0.5, 1.0])
+    assert timeline.downbeats is None
+    assert (timeline.zoom_min, timeline.zoom_duration, timeline.duration) == (1.0, 0.2, 2.0)
+
+
+@pytest.mark.parametrize('content', [
+    {'beats': [{'time': 1.0}]},
+    {'beats': [{'time': 1.0, 'zoom': 0}]},
+    {'version': TIMELINE_VERSION + 1, 'beats': [{'time': 1.0, 'zoom': 1.2}]},
+])
+def test_invalid_json(tmp_path, content):
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps(content))
+    with pytest.raises(ValueError):
+        ZoomTimeline.load(str(path))